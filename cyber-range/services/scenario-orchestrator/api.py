@@ -1,22 +1,37 @@
 """
 FastAPI REST Layer - Production Architecture (Redis/Celery)
 """
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List, Optional
 import logging
 import json
 import uuid 
 import sys
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-from database import Database
-from tasks import deploy_lab, destroy_lab
-from config import validate_config 
+from database import Database, AsyncDatabase
+from tasks import (release_capacity, dispatch_destroys, queue_keys, QUEUES,
+                   PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+from scheduler import get_scheduler, QuotaExceeded
+from scenario_registry import get_registry
+from config import validate_config, API_DB_THREADS, API_DISPATCH_THREADS, CELERY_BROKER_URL
+import events
+import metrics
+import timeline
 
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("API")
 
+# Before the first query records anything
+metrics.clear_stale()
+
 try:
     validate_config()
     logger.info("✅ Configuration validation passed")
@@ -26,20 +41,85 @@ except ValueError as e:
     sys.exit(1)
 
 app = FastAPI(title="Cyber Range Orchestrator")
-db = Database()
+db = AsyncDatabase(Database(), max_workers=API_DB_THREADS)
+scheduler = get_scheduler()
+scenarios = get_registry()
+event_hub = events.EventHub()
+live_metrics = metrics.LiveCollector(Database(), {q: queue_keys(q) for q in QUEUES}, CELERY_BROKER_URL)
+
+# Celery's publish and the Redis event publish are blocking: keep them off the loop
+dispatch_executor = ThreadPoolExecutor(max_workers=API_DISPATCH_THREADS, thread_name_prefix="dispatch")
+
+async def _dispatch(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(dispatch_executor, functools.partial(fn, *args, **kwargs))
 
 class DeployRequest(BaseModel):
     scenario: str       # Frontend sends "scenario"
     instance_id: str    # Frontend sends "instance_id" (User's Friendly Name)
+    ttl_hours: Optional[float] = Field(None, ge=0)   # Lifetime once active (0 = never expires)
+
+MAX_BATCH_SIZE = 200
+
+class BatchDeployRequest(BaseModel):
+    scenario: str
+    count: Optional[int] = Field(None, ge=1, le=MAX_BATCH_SIZE)   # Either a count...
+    names: Optional[List[str]] = None                            # ...or explicit friendly names
+    prefix: str = "lab"                                          # Name prefix used with `count`
+    variables: Dict[str, str] = {}                               # Applied to every lab
+    lab_variables: Dict[str, Dict[str, str]] = {}                # Per friendly name overrides
+    ttl_hours: Optional[float] = Field(None, ge=0)               # Default: the scenario's duration
+
+    @model_validator(mode="after")
+    def _check_labs(self):
+        if (self.count is None) == (self.names is None):
+            raise ValueError("Provide exactly one of 'count' or 'names'")
+        if self.names is not None:
+            if not 1 <= len(self.names) <= MAX_BATCH_SIZE:
+                raise ValueError(f"'names' must contain 1-{MAX_BATCH_SIZE} entries")
+            if len(set(self.names)) != len(self.names):
+                raise ValueError("'names' must be unique")
+        return self
+
+    def lab_names(self) -> List[str]:
+        return self.names or [f"{self.prefix}-{n:02d}" for n in range(1, self.count + 1)]
+
+def _split(value: Optional[str]):
+    """Comma-separated query parameter -> list (None when absent)"""
+    if not value:
+        return None
+    return [v.strip() for v in value.split(",") if v.strip()]
 
 @app.get("/deployments")
-def list_deployments():
-    """List all labs from SQLite"""
-    deployments_list = db.list_deployments()
+async def list_deployments(
+    response: Response,
+    status: Optional[str] = Query(None, description="Comma-separated statuses, e.g. active,deploying"),
+    scenario: Optional[str] = None,
+    user_id: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page")
+):
+    """List labs from SQLite (newest first, filtered and keyset-paginated)"""
+    try:
+        deployments_list = await db.list_deployments(
+            statuses=_split(status),
+            scenario=scenario,
+            user_id=user_id,
+            fields=_split(fields),
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if limit and len(deployments_list) == limit:
+        response.headers["X-Next-Cursor"] = Database.encode_cursor(deployments_list[-1])
+
     results = {}
     for d in deployments_list:
         # SQLite stores JSON as string; parse it back to a dictionary
-        if isinstance(d['outputs'], str):
+        if isinstance(d.get('outputs'), str):
             try:
                 d['outputs'] = json.loads(d['outputs'])
             except:
@@ -47,9 +127,34 @@ def list_deployments():
         results[d['id']] = d
     return results
 
+@app.get("/deployments/{instance_id}/timeline")
+async def deployment_timeline(instance_id: str):
+    """Timestamped phases and sub-events of one lab, with seconds spent per phase"""
+    found = await db.get_timeline(instance_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Instance not found")
+    return timeline.describe(*found)
+
+@app.get("/scenarios")
+async def list_scenarios():
+    """Deployable scenarios (and rejected templates with the reason), served from memory"""
+    return scenarios.summaries()
+
+async def _admission_request(scenario: str, variables: dict, priority: int, ttl_hours: float = None) -> dict:
+    """Resources/variables stored with a queued lab (quota lookups may hit OpenStack)"""
+    if scenarios.get(scenario) is None:
+        invalid = scenarios.error(scenario)
+        raise HTTPException(status_code=422 if invalid else 404,
+                            detail=f"Scenario '{scenario}' is invalid: {invalid}" if invalid
+                                   else f"Scenario '{scenario}' not found")
+    try:
+        return await _dispatch(scheduler.request, scenario, variables, priority, ttl_hours)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.post("/deploy")
 async def deploy(req: DeployRequest):
-    """Queue deployment via Celery with Unique UUID"""
+    """Queue deployment via Celery with Unique UUID (held while the quota can't fit it)"""
     
     # 1. Generate a Unique ID for the System (Primary Key)
     # (prevents collisions for same instanec name)
@@ -60,49 +165,177 @@ async def deploy(req: DeployRequest):
 
     logger.info(f"Queuing deploy for {friendly_name} (System ID: {system_id})")
 
-    # 3. Create 'Pending' record in DB
+    # 3. Create 'Queued' record in DB with the resources it will reserve
     # id = UUID, user_id = Friendly Name
-    db.create_deployment(system_id, friendly_name, req.scenario)
-
-    # 4. Dispatch Async Task using the UUID
-    deploy_lab.delay(
-        instance_id=system_id, 
-        scenario_name=req.scenario, 
-        user_id=friendly_name,
-        variables={}
+    request = await _admission_request(req.scenario, {}, PRIORITY_INTERACTIVE, req.ttl_hours)
+    await db.create_deployment(system_id, friendly_name, req.scenario, status="queued", request=request)
+
+    # 4. Dispatch whatever fits the quota now (this lab, unless earlier ones are waiting)
+    admitted = await _dispatch(release_capacity)
+
+    return {"status": "accepted", "instance_id": system_id, "queued": system_id not in admitted}
+
+@app.post("/deploy/batch")
+async def deploy_batch(req: BatchDeployRequest):
+    """Queue a whole class: one multi-row insert, then dispatch as many labs as the quota fits"""
+    batch_id = str(uuid.uuid4())
+    labs = [(str(uuid.uuid4()), name) for name in req.lab_names()]
+
+    logger.info(f"Queuing batch {batch_id}: {len(labs)} x {req.scenario}")
+
+    request = await _admission_request(req.scenario, {}, PRIORITY_BATCH, req.ttl_hours)
+    await db.create_deployments(
+        [(system_id, name, req.scenario,
+          {**request, "variables": {**req.variables, **req.lab_variables.get(name, {})}})
+         for system_id, name in labs],
+        batch_id=batch_id,
+        status="queued"
     )
-    
-    return {"status": "accepted", "instance_id": system_id}
+
+    admitted = set(await _dispatch(release_capacity))
+
+    return {
+        "status": "accepted",
+        "batch_id": batch_id,
+        "queued": sum(1 for system_id, _ in labs if system_id not in admitted),
+        "instances": [{"instance_id": system_id, "user_id": name} for system_id, name in labs]
+    }
+
+@app.get("/capacity")
+async def capacity():
+    """Quota limits, resources reserved by live labs and the number of held deploys"""
+    return await _dispatch(scheduler.snapshot)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape: phase/task/DB histograms of every process, queue depth, labs by status"""
+    if not metrics.available():
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+    body, content_type = await _dispatch(metrics.render, live_metrics)
+    return Response(content=body, media_type=content_type)
+
+@app.get("/deploy/batch/{batch_id}")
+async def batch_status(batch_id: str):
+    """Aggregate status of a batch (counts per status, mean progress, member labs)"""
+    batch = await db.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
 
 @app.delete("/destroy/{instance_id}")
 async def destroy(instance_id: str):
     """Queue destruction via Celery"""
-    if not db.get_deployment(instance_id):
+    if not await db.get_deployment(instance_id):
         raise HTTPException(status_code=404, detail="Instance not found")
+
+    # Never admitted: nothing exists in the cloud, just take it out of the queue
+    if await db.cancel_queued(instance_id):
+        await _dispatch(events.publish, instance_id, status="destroyed")
+        await _dispatch(release_capacity)   # It may have been holding up the labs behind it
+        return {"status": "cancelled"}
     
     logger.info(f"Queuing destroy for {instance_id}")
     
-    db.update_deployment(instance_id, status="destroying")
-    destroy_lab.delay(instance_id)
+    await db.update_deployment(instance_id, status="destroying")
+    # A student waiting on their own lab goes ahead of reaper and bulk destroys
+    await _dispatch(dispatch_destroys, [instance_id], priority=PRIORITY_INTERACTIVE)
     
     return {"status": "accepted"}
 
+# Labs in other statuses are mid-operation (or gone) and are left alone
+BULK_DESTROY_STATUSES = ("queued", "active", "failed", "error_destroying")
+
+@app.delete("/destroy")
+async def destroy_bulk(
+    status: Optional[str] = Query(None, description="Comma-separated statuses (default: all destroyable)"),
+    scenario: Optional[str] = None,
+    user_id: Optional[str] = None,
+    older_than_hours: Optional[float] = Query(None, ge=0, description="Only labs created before now - N hours")
+):
+    """Destroy every lab matching the filters (at least one filter is required)"""
+    if not (status or scenario or user_id or older_than_hours is not None):
+        raise HTTPException(status_code=400, detail="Refusing to destroy every lab: give at least one filter")
+
+    statuses = _split(status) or list(BULK_DESTROY_STATUSES)
+    invalid = set(statuses) - set(BULK_DESTROY_STATUSES)
+    if invalid:
+        raise HTTPException(status_code=400,
+                            detail=f"Cannot bulk destroy labs in status {', '.join(sorted(invalid))} "
+                                   f"(allowed: {', '.join(BULK_DESTROY_STATUSES)})")
+
+    created_before = datetime.now() - timedelta(hours=older_than_hours) if older_than_hours is not None else None
+    to_destroy, cancelled = await db.claim_for_destroy(
+        statuses, scenario=scenario, user_id=user_id, created_before=created_before
+    )
+    logger.info(f"Bulk destroy: {len(to_destroy)} to destroy, {len(cancelled)} queued cancelled")
+
+    await _dispatch(dispatch_destroys, to_destroy)
+    for instance_id in cancelled:
+        await _dispatch(events.publish, instance_id, status="destroyed")
+    if cancelled:
+        await _dispatch(release_capacity)
+
+    return {"status": "accepted", "destroying": to_destroy, "cancelled": cancelled}
+
 @app.get("/status/{instance_id}")
-def get_status(instance_id: str):
+async def get_status(instance_id: str):
     """Get status from SQLite"""
-    data = db.get_deployment(instance_id)
+    data = await db.get_deployment(instance_id)
     if not data:
         raise HTTPException(status_code=404, detail="Instance not found")
-    
+    return _decode_row(data)
+
+def _decode_row(data: dict) -> dict:
+    """Parse the JSON columns of a deployment row (the timeline has its own endpoint)"""
+    data.pop("timeline", None)
     outputs = data.get("outputs", {})
     if isinstance(outputs, str):
         try:
             data["outputs"] = json.loads(outputs)
         except:
             data["outputs"] = {}
+
+    detail = data.get("progress_detail")
+    if isinstance(detail, str):
+        try:
+            data["progress_detail"] = json.loads(detail)
+        except:
+            data["progress_detail"] = {}
             
     return data
 
+@app.get("/events/{instance_id}")
+async def deployment_events(instance_id: str, request: Request):
+    """
+    Server-Sent Events stream of status/progress changes for one lab.
+    The first event is the current row; later ones are pushed by the workers.
+    """
+    if not await db.get_deployment(instance_id):
+        raise HTTPException(status_code=404, detail="Instance not found")
+
+    async def snapshot():
+        return events.format_sse(_decode_row(await db.get_deployment(instance_id) or {"id": instance_id}))
+
+    async def stream():
+        # Subscribe before reading the snapshot so no change slips in between
+        async with event_hub.subscribe(instance_id) as queue:
+            yield await snapshot()
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=events.KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                # The hub (re)subscribed: changes may have been missed meanwhile
+                yield await snapshot() if event is events.RESYNC else events.format_sse(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
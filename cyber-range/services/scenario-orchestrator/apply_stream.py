@@ -0,0 +1,195 @@
+"""
+Apply Stream - Live parsing of `tofu apply -json` output
+Reads the machine-readable UI line by line while the apply runs, tracks
+per-resource start/complete/error events and reports a progress percentage.
+Only per-resource state and a short tail of diagnostics are kept, so memory
+stays flat no matter how long the apply takes.
+"""
+import json
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ApplyProgress:
+    """Aggregated state of a running apply, built from -json events"""
+
+    def __init__(self):
+        self.planned = 0
+        self.resources = {}               # addr -> {"action", "state", "elapsed"}
+        self.errors = deque(maxlen=5)     # last error diagnostics
+        self.tail = deque(maxlen=20)      # last non-JSON lines (stderr, crashes)
+        self.last_event = None
+        self.finished = []                # (time, addr, state, elapsed) not yet handed out, see drain()
+
+    @property
+    def completed(self) -> int:
+        return sum(1 for r in self.resources.values() if r["state"] == "complete")
+
+    @property
+    def errored(self) -> int:
+        return sum(1 for r in self.resources.values() if r["state"] == "errored")
+
+    @property
+    def percent(self) -> int:
+        total = max(self.planned, len(self.resources))
+        if not total:
+            return 0
+        # Never report 100% before the process has actually exited
+        return min(99, int(self.completed * 100 / total))
+
+    def handle_line(self, line: str) -> bool:
+        """Consume one output line. Returns True when progress changed."""
+        line = line.strip()
+        if not line:
+            return False
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.tail.append(line)
+            return False
+        if not isinstance(event, dict):
+            return False
+        return self.handle_event(event)
+
+    def handle_event(self, event: dict) -> bool:
+        kind = event.get("type")
+        hook = event.get("hook") or {}
+        addr = (hook.get("resource") or {}).get("addr")
+
+        if kind == "planned_change":
+            change = event.get("change") or {}
+            if change.get("action") not in (None, "noop", "read"):
+                self.planned += 1
+            return False
+
+        if kind == "change_summary":
+            changes = event.get("changes") or {}
+            if changes.get("operation") == "plan":
+                self.planned = changes.get("add", 0) + changes.get("change", 0) + changes.get("remove", 0)
+                return True
+            return False
+
+        if kind == "apply_start" and addr:
+            self.resources[addr] = {"action": hook.get("action"), "state": "started", "elapsed": None}
+            self.last_event = f"{hook.get('action', 'apply')} {addr}"
+            return True
+
+        if kind == "apply_complete" and addr:
+            entry = self.resources.setdefault(addr, {"action": hook.get("action"), "state": "started", "elapsed": None})
+            entry["state"] = "complete"
+            entry["elapsed"] = hook.get("elapsed_seconds")
+            self.finished.append((time.time(), addr, "complete", entry["elapsed"]))
+            self.last_event = f"completed {addr}"
+            return True
+
+        if kind == "apply_errored" and addr:
+            entry = self.resources.setdefault(addr, {"action": hook.get("action"), "state": "started", "elapsed": None})
+            entry["state"] = "errored"
+            self.finished.append((time.time(), addr, "errored", None))
+            self.last_event = f"errored {addr}"
+            return True
+
+        if kind == "diagnostic" and event.get("@level") == "error":
+            diag = event.get("diagnostic") or {}
+            self.errors.append(f"{diag.get('summary', '')}: {diag.get('detail', '')}".strip(": "))
+            return False
+
+        return False
+
+    def summary(self) -> dict:
+        """Compact snapshot stored alongside the deployment row"""
+        return {
+            "completed": self.completed,
+            "total": max(self.planned, len(self.resources)),
+            "errored": self.errored,
+            "in_progress": sorted(a for a, r in self.resources.items() if r["state"] == "started")[:10],
+            "last_event": self.last_event,
+        }
+
+    def drain(self) -> list:
+        """Resources completed or errored since the last call"""
+        finished, self.finished = self.finished, []
+        return finished
+
+    def error_message(self, limit: int = 2000) -> str:
+        message = "\n".join(list(self.errors) or list(self.tail))
+        return message[-limit:] if message else "Unknown error"
+
+
+def stream_apply(cmd: list, cwd, env: dict, timeout: int,
+                 on_progress: Optional[Callable[[int, dict], None]] = None,
+                 flush_interval: float = 2.0,
+                 on_resources: Optional[Callable[[list], None]] = None):
+    """
+    Run an apply command and parse its -json output as it arrives.
+
+    on_progress(percent, summary) is called at most once per flush_interval
+    seconds (batched writes), plus once at the end. on_resources(finished)
+    gets the (time, addr, state, elapsed) of resources finished since its
+    last call, at the same moments. Returns (returncode, ApplyProgress).
+    Raises subprocess.TimeoutExpired if the process exceeds `timeout`.
+    """
+    progress = ApplyProgress()
+
+    def _notify(percent):
+        try:
+            if on_progress:
+                on_progress(percent, progress.summary())
+            finished = progress.drain()
+            if on_resources and finished:
+                on_resources(finished)
+        except Exception as e:
+            # Progress reporting must never break the apply itself
+            logger.warning(f"Progress callback failed: {e}")
+
+    process = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    )
+
+    timed_out = threading.Event()
+
+    def _kill():
+        timed_out.set()
+        process.kill()
+
+    watchdog = threading.Timer(timeout, _kill)
+    watchdog.daemon = True
+    watchdog.start()
+
+    last_flush = 0.0
+    dirty = False
+    try:
+        for line in process.stdout:
+            dirty = progress.handle_line(line) or dirty
+            now = time.monotonic()
+            if dirty and (on_progress or on_resources) and now - last_flush >= flush_interval:
+                _notify(progress.percent)
+                last_flush = now
+                dirty = False
+        process.wait()
+    finally:
+        watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+
+    if on_progress or on_resources:
+        _notify(100 if process.returncode == 0 else progress.percent)
+
+    return process.returncode, progress
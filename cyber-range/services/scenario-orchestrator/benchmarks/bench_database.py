@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: SQLite access in database.Database
+
+Compares the old connect-per-call pattern (default rollback journal) with the
+pooled per-thread WAL connections, for /status-style reads alone and with a
+concurrent writer simulating the Celery worker.
+
+Usage:
+  python benchmarks/bench_database.py [--seconds 3] [--readers 4]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+TMP_DIR = tempfile.mkdtemp(prefix="cyberguard-bench-")
+os.environ["DATABASE_PATH"] = str(Path(TMP_DIR) / "pooled.db")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import Database  # noqa: E402
+
+LEGACY_PATH = str(Path(TMP_DIR) / "legacy.db")
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS deployments (
+        id TEXT PRIMARY KEY, user_id TEXT, scenario TEXT, status TEXT,
+        created_at TIMESTAMP, updated_at TIMESTAMP, outputs TEXT, error TEXT
+    )
+'''
+
+
+class LegacyDatabase:
+    """The previous access pattern: a brand-new connection for every call"""
+
+    def __init__(self):
+        with sqlite3.connect(LEGACY_PATH) as conn:
+            conn.execute(SCHEMA)
+
+    def _get_connection(self):
+        conn = sqlite3.connect(LEGACY_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_deployment(self, deployment_id, user_id, scenario):
+        with self._get_connection() as conn:
+            conn.execute(
+                "INSERT INTO deployments (id, user_id, scenario, status, created_at, updated_at, outputs) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (deployment_id, user_id, scenario, 'pending', datetime.now(), datetime.now(), '{}')
+            )
+
+    def update_deployment(self, deployment_id, status=None):
+        with self._get_connection() as conn:
+            conn.execute("UPDATE deployments SET status = ?, updated_at = ? WHERE id = ?",
+                         (status, datetime.now(), deployment_id))
+
+    def get_deployment(self, deployment_id):
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT * FROM deployments WHERE id = ?", (deployment_id,)).fetchone()
+            return dict(row) if row else None
+
+
+def run(db, ids, seconds, readers, with_writer):
+    stop = threading.Event()
+    counts = [0] * readers
+    writes = [0]
+
+    def reader(slot):
+        i = 0
+        while not stop.is_set():
+            db.get_deployment(ids[i % len(ids)])
+            counts[slot] += 1
+            i += 1
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            db.update_deployment(ids[i % len(ids)], status="deploying" if i % 2 else "active")
+            writes[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds, writes[0] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    for label, db in [("legacy", LegacyDatabase()), ("pooled", Database())]:
+        ids = [str(uuid.uuid4()) for _ in range(args.rows)]
+        for i, deployment_id in enumerate(ids):
+            db.create_deployment(deployment_id, f"lab-{i}", "basic_pentest")
+        results[label] = {
+            "read_only": run(db, ids, args.seconds, args.readers, with_writer=False),
+            "with_writer": run(db, ids, args.seconds, args.readers, with_writer=True),
+        }
+
+    print(f"{'mode':<8} {'reads/s':>12} {'reads/s (+writer)':>18} {'writes/s':>10}")
+    for label, r in results.items():
+        print(f"{label:<8} {r['read_only'][0]:>12.0f} {r['with_writer'][0]:>18.0f} {r['with_writer'][1]:>10.0f}")
+    legacy, pooled = results["legacy"], results["pooled"]
+    print(f"\nread speedup: {pooled['read_only'][0] / legacy['read_only'][0]:.1f}x, "
+          f"under write load: {pooled['with_writer'][0] / max(legacy['with_writer'][0], 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
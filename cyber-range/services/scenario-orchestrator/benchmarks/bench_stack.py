@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: a simulated class against the API, the workers and the web UI
+
+Every student opens the lobby and deploys a lab at the start of class (arrivals
+spread over --burst seconds), watches it from the dashboard (polling
+/api/poll every --poll seconds), works in it for --session seconds and then
+destroys it. Lab phases are timed from the API's SSE stream, which the
+workers publish to as each transition happens.
+
+Reported, and written to --json for comparing revisions:
+  - p50/p95/p99 latency per endpoint (API and web UI)
+  - queue wait (submit -> deploying), admission wait for labs held by the
+    quota (submit -> pending), apply time (deploying -> active), deploy wall
+    time (submit -> active), destroy queue wait and destroy wall time
+    (request -> destroyed)
+  - DB ops/sec per Database method, summed over the API and every worker
+    process, from the API's GET /metrics (needs prometheus_client and a
+    PROMETHEUS_MULTIPROC_DIR shared by the services; --spawn sets it)
+  - deploy/destroy worker utilisation: busy time / (processes x elapsed),
+    plus the peak number of labs in each phase at once
+
+--spawn starts the stack itself in MOCK_MODE against the tofu simulator, with
+its own database, runs and cache directories (needs a Redis at --redis; use a
+spare database index, the worker queues are purged on start):
+
+  python benchmarks/bench_stack.py --spawn --students 60 --deploy-workers 3 --json before.json
+
+Otherwise point it at services that are already running:
+
+  python benchmarks/bench_stack.py --api http://localhost:8000 --webui http://localhost:5000 \\
+      --deploy-workers 3 --destroy-workers 2
+
+The same --seed gives the same student schedule (and, with --spawn, the same
+simulated latencies), so two revisions can be compared run for run. Raise
+--time-scale for closer-to-real deploy times, lower it for quicker runs.
+
+Stdlib only, apart from what the spawned services themselves need.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlparse
+
+from load_api import Client, percentile
+
+ORCHESTRATOR_DIR = Path(__file__).resolve().parent.parent
+WEBUI_DIR = ORCHESTRATOR_DIR.parent.parent / "webui"
+
+DONE_DEPLOYING = ("active", "failed")
+DONE_DESTROYING = ("destroyed", "error_destroying")
+
+
+class Recorder:
+    """Request samples and per-lab status timelines, shared by every student thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []        # (endpoint, seconds, http status)
+        self.labs = {}           # instance_id -> {"submitted", "queued", "destroy_requested", "destroy_started",
+                                 #                 "seen": {status: first seen}}
+
+    def request(self, client, name, method, path, body=None):
+        latency, status, data = client.request(method, path, body)
+        with self._lock:
+            self.samples.append((name, latency, status))
+        return status, data
+
+    def saw(self, instance_id, status, when=None):
+        when = when or time.time()
+        with self._lock:
+            seen = self.labs[instance_id]["seen"]
+            if status not in seen or when < seen[status]:
+                seen[status] = when
+
+
+def watch_events(api_url, instance_id, recorder, stop):
+    """Follow /events/<id> and record when each status first shows up"""
+    parsed = urlparse(api_url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+    try:
+        conn.request("GET", f"/events/{instance_id}", headers={"Accept": "text/event-stream"})
+        resp = conn.getresponse()
+        if resp.status != 200:
+            return
+        while not stop.is_set():
+            line = resp.readline()
+            if not line:
+                return
+            if not line.startswith(b"data:"):
+                continue
+            status = json.loads(line[5:]).get("status")
+            if status:
+                recorder.saw(instance_id, status)
+                if status == "destroying":
+                    # Published by the API on request, then again by the worker when it starts
+                    recorder.labs[instance_id]["destroy_started"] = time.time()
+                if status in DONE_DESTROYING:
+                    return
+    except (OSError, http.client.HTTPException, ValueError):
+        pass      # The dashboard polls still record transitions, just less precisely
+    finally:
+        conn.close()
+
+
+def student(n, args, recorder, stop):
+    api = Client(args.api)
+    webui = Client(args.webui) if args.webui else None
+    instance_id = None
+
+    def poll():
+        if webui:
+            status, data = recorder.request(webui, "webui GET /api/poll", "GET", f"/api/poll/{instance_id}")
+        else:
+            status, data = recorder.request(api, "GET /status", "GET", f"/status/{instance_id}")
+        state = json.loads(data).get("status") if status == 200 else None
+        if state:
+            recorder.saw(instance_id, state)
+        return state
+
+    def wait_for(states, timeout):
+        deadline = time.time() + timeout
+        state = poll()
+        while state not in states and time.time() < deadline and not stop.is_set():
+            time.sleep(args.poll)
+            state = poll()
+        return state
+
+    if webui:
+        recorder.request(webui, "webui GET /", "GET", "/")
+    submitted = time.time()
+    status, data = recorder.request(api, "POST /deploy", "POST", "/deploy",
+                                    {"scenario": args.scenario, "instance_id": f"{args.run_id}-student-{n:03d}"})
+    if status != 200:
+        return
+    body = json.loads(data)
+    instance_id = body["instance_id"]
+    with recorder._lock:
+        recorder.labs[instance_id] = {"submitted": submitted, "queued": body.get("queued", False), "seen": {}}
+    threading.Thread(target=watch_events, args=(args.api, instance_id, recorder, stop), daemon=True).start()
+
+    if webui:
+        recorder.request(webui, "webui GET /dashboard", "GET", f"/dashboard/{instance_id}")
+    if wait_for(DONE_DEPLOYING, args.deploy_timeout) is None or stop.is_set():
+        return
+
+    # Working in the lab: the dashboard keeps polling
+    session_end = time.time() + args.session
+    while time.time() < session_end and not stop.is_set():
+        time.sleep(args.poll)
+        poll()
+
+    with recorder._lock:
+        recorder.labs[instance_id]["destroy_requested"] = time.time()
+    if webui:
+        recorder.request(webui, "webui POST /api/destroy", "POST", f"/api/destroy/{instance_id}")
+    else:
+        recorder.request(api, "DELETE /destroy", "DELETE", f"/destroy/{instance_id}")
+    wait_for(DONE_DESTROYING, args.deploy_timeout)
+
+
+def spawn_stack(args, workdir):
+    """Start API, deploy/destroy workers and web UI in MOCK_MODE; returns the processes"""
+    env = dict(
+        os.environ,
+        MOCK_MODE="true", MOCK_BACKEND="sim",
+        SIM_TIME_SCALE=str(args.time_scale), SIM_SEED=str(args.seed),
+        CELERY_BROKER_URL=args.redis, CELERY_RESULT_BACKEND=args.redis,
+        DATA_DIR=str(workdir / "data"), DATABASE_PATH=str(workdir / "data" / "deployments.db"),
+        RUNS_DIR=str(workdir / "runs"), CACHE_DIR=str(workdir / "cache"),
+        PROMETHEUS_MULTIPROC_DIR=str(workdir / "metrics"),
+        ORCHESTRATOR_URL=args.api, PYTHONUNBUFFERED="1",
+    )
+    api_port = str(urlparse(args.api).port)
+    commands = {
+        "api": ([sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", api_port,
+                 "--log-level", "warning"], ORCHESTRATOR_DIR),
+        "deploy-worker": ([sys.executable, "-m", "celery", "-A", "tasks", "worker", "-Q", "deploy", "--purge",
+                           f"--concurrency={args.deploy_workers}",
+                           f"--hostname=bench-deploy-{args.run_id}@%h", "--loglevel=warning"], ORCHESTRATOR_DIR),
+        "destroy-worker": ([sys.executable, "-m", "celery", "-A", "tasks", "worker", "-Q", "destroy", "--purge",
+                            f"--concurrency={args.destroy_workers}",
+                            f"--hostname=bench-destroy-{args.run_id}@%h", "--loglevel=warning"], ORCHESTRATOR_DIR),
+    }
+    if args.webui:
+        env["WEBUI_BIND"] = f"127.0.0.1:{urlparse(args.webui).port}"
+        commands["webui"] = ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], WEBUI_DIR)
+    processes = {}
+    for name, (command, cwd) in commands.items():
+        log = open(workdir / f"{name}.log", "w")
+        processes[name] = subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                           start_new_session=True)
+
+    for name, url, path in (("api", args.api, "/scenarios"), ("webui", args.webui, "/")):
+        if not url:
+            continue
+        client = Client(url)
+        deadline = time.time() + 30
+        while client.request("GET", path)[1] != 200:
+            if time.time() > deadline or processes[name].poll() is not None:
+                stop_stack(processes)
+                raise SystemExit(f"{name} did not come up, see {workdir / (name + '.log')}")
+            time.sleep(0.5)
+    # Celery needs a moment after the API is up to register its consumers
+    time.sleep(args.warmup)
+    exited = [name for name, proc in processes.items() if proc.poll() is not None]
+    if exited:
+        # e.g. a port still held by an earlier run answered the health check
+        stop_stack(processes)
+        raise SystemExit(f"{', '.join(exited)} exited on start, see the logs in {workdir}")
+    return processes
+
+
+def stop_stack(processes):
+    for proc in processes.values():
+        if proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGTERM)
+    for proc in processes.values():
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+DB_METRIC = "cyberguard_db_query_seconds"
+
+
+def read_db_stats(api):
+    """Database calls of every service process, from the API's /metrics: {method: [calls, seconds]}"""
+    _, status, data = Client(api).request("GET", "/metrics")
+    stats = {}
+    if status != 200:
+        return stats
+    for line in data.decode().splitlines():
+        if not line.startswith(DB_METRIC):
+            continue
+        name, _, value = line.rpartition(" ")
+        field = {f"{DB_METRIC}_count": 0, f"{DB_METRIC}_sum": 1}.get(name.split("{")[0])
+        if field is None or 'method="' not in name:
+            continue
+        method = name.split('method="', 1)[1].split('"', 1)[0]
+        stats.setdefault(method, [0, 0.0])[field] = float(value)
+    return stats
+
+
+def summary(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def busy(intervals, processes, elapsed):
+    """Utilisation of a worker pool from the (start, end) of each task it ran"""
+    total = sum(end - start for start, end in intervals)
+    # Sweep for the largest number of tasks in flight at once
+    peak = running = 0
+    for _, delta in sorted([(s, 1) for s, _ in intervals] + [(e, -1) for _, e in intervals]):
+        running += delta
+        peak = max(peak, running)
+    return {
+        "processes": processes,
+        "tasks": len(intervals),
+        "busy_s": round(total, 3),
+        "utilisation": round(total / (processes * elapsed), 3) if processes and elapsed else None,
+        "peak_in_flight": peak,
+    }
+
+
+def analyse(args, recorder, started, finished, db_before, db_after):
+    elapsed = finished - started
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json",)},
+        "revision": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ORCHESTRATOR_DIR,
+                                   capture_output=True, text=True).stdout.strip() or None,
+        "elapsed_s": round(elapsed, 3),
+        "endpoints": {},
+        "labs": {},
+        "phases_s": {},
+        "workers": {},
+        "db": None,
+    }
+
+    for name in sorted({s[0] for s in recorder.samples}):
+        latencies = [s[1] * 1000 for s in recorder.samples if s[0] == name]
+        results["endpoints"][name] = {
+            "count": len(latencies),
+            "errors": sum(1 for s in recorder.samples if s[0] == name and s[2] != 200),
+            "mean_ms": round(statistics.mean(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+
+    phases = {"queue_wait": [], "admission_wait": [], "apply": [], "deploy_wall": [],
+              "destroy_queue_wait": [], "destroy_wall": []}
+    deploys, destroys = [], []
+    outcome = {"submitted": len(recorder.labs), "active": 0, "failed": 0, "destroyed": 0, "unfinished": 0}
+    for lab in recorder.labs.values():
+        seen, submitted = lab["seen"], lab["submitted"]
+        if "deploying" in seen:
+            phases["queue_wait"].append(seen["deploying"] - submitted)
+        if lab["queued"] and "pending" in seen:
+            phases["admission_wait"].append(seen["pending"] - submitted)
+        if "active" in seen:
+            outcome["active"] += 1
+            phases["deploy_wall"].append(seen["active"] - submitted)
+        elif "failed" in seen:
+            outcome["failed"] += 1
+        else:
+            outcome["unfinished"] += 1
+        done = min((seen[s] for s in DONE_DEPLOYING if s in seen), default=None)
+        if "deploying" in seen and done:
+            phases["apply"].append(done - seen["deploying"])
+            deploys.append((seen["deploying"], done))
+        gone = min((seen[s] for s in DONE_DESTROYING if s in seen), default=None)
+        if "destroyed" in seen:
+            outcome["destroyed"] += 1
+        if lab.get("destroy_requested") and gone:
+            started = lab.get("destroy_started", lab["destroy_requested"])
+            phases["destroy_queue_wait"].append(started - lab["destroy_requested"])
+            phases["destroy_wall"].append(gone - lab["destroy_requested"])
+            destroys.append((started, gone))
+    results["labs"] = outcome
+    results["phases_s"] = {name: summary(values) for name, values in phases.items()}
+    results["workers"] = {
+        "deploy": busy(deploys, args.deploy_workers, elapsed),
+        "destroy": busy(destroys, args.destroy_workers, elapsed),
+    }
+
+    if db_after:
+        methods = {}
+        for method, (calls, seconds) in db_after.items():
+            base_calls, base_seconds = db_before.get(method, (0, 0.0))
+            methods[method] = [int(calls - base_calls), seconds - base_seconds]
+        total = sum(calls for calls, _ in methods.values())
+        results["db"] = {
+            "ops": total,
+            "ops_per_s": round(total / elapsed, 1),
+            "methods": {
+                method: {"calls": calls, "ops_per_s": round(calls / elapsed, 2),
+                         "mean_ms": round(seconds / calls * 1000, 3) if calls else None}
+                for method, (calls, seconds) in sorted(methods.items(), key=lambda m: -m[1][0]) if calls
+            },
+        }
+    return results
+
+
+def report(results):
+    labs = results["labs"]
+    print(f"{labs['submitted']} labs in {results['elapsed_s']}s: {labs['active']} active, {labs['failed']} failed, "
+          f"{labs['destroyed']} destroyed, {labs['unfinished']} unfinished")
+    print(f"\n{'endpoint':<26} {'count':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results["endpoints"].items():
+        print(f"{name:<26} {r['count']:>6} {r['errors']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+    print(f"\n{'phase (s)':<26} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, r in results["phases_s"].items():
+        if r["count"]:
+            print(f"{name:<26} {r['count']:>6} {r['p50']:>9} {r['p95']:>9} {r['p99']:>9} {r['max']:>9}")
+    print(f"\n{'workers':<26} {'procs':>6} {'tasks':>6} {'busy s':>9} {'util':>6} {'peak':>5}")
+    for name, r in results["workers"].items():
+        print(f"{name:<26} {r['processes']:>6} {r['tasks']:>6} {r['busy_s']:>9} "
+              f"{r['utilisation'] if r['utilisation'] is not None else '-':>6} {r['peak_in_flight']:>5}")
+    if results["db"]:
+        db = results["db"]
+        print(f"\nDB: {db['ops']} ops ({db['ops_per_s']} ops/s)")
+        for method, r in db["methods"].items():
+            print(f"  {method:<24} {r['calls']:>6} {r['ops_per_s']:>8}/s {r['mean_ms']:>8} ms")
+    else:
+        print("\nDB: no counters (GET /metrics needs prometheus_client and PROMETHEUS_MULTIPROC_DIR)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://127.0.0.1:8000")
+    parser.add_argument("--webui", default="http://127.0.0.1:5000", help="Empty to poll the API directly")
+    parser.add_argument("--spawn", action="store_true", help="Start the stack in MOCK_MODE for the run")
+    parser.add_argument("--redis", default="redis://localhost:6379/15", help="Broker for --spawn")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--burst", type=float, default=10.0, help="Seconds over which students arrive")
+    parser.add_argument("--session", type=float, default=20.0, help="Seconds each student keeps the lab")
+    parser.add_argument("--poll", type=float, default=2.0, help="Dashboard poll interval in seconds")
+    parser.add_argument("--scenario", default="basic_pentest")
+    parser.add_argument("--deploy-workers", type=int, default=3, help="Processes on the deploy queue")
+    parser.add_argument("--destroy-workers", type=int, default=2, help="Processes on the destroy queue")
+    parser.add_argument("--time-scale", type=float, default=0.02, help="SIM_TIME_SCALE for --spawn")
+    parser.add_argument("--deploy-timeout", type=float, default=600.0)
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds to let spawned workers connect")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="Keep the --spawn work directory and logs")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+    args.run_id = f"bench-{uuid.uuid4().hex[:6]}"
+
+    # Tear a spawned stack down on `kill` / `timeout` too, not just Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+
+    processes, workdir = {}, None
+    if args.spawn:
+        workdir = Path(tempfile.mkdtemp(prefix="cyberguard-stack-"))
+        processes = spawn_stack(args, workdir)
+        print(f"Stack running from {workdir}")
+
+    recorder = Recorder()
+    stop = threading.Event()
+    rng = random.Random(args.seed)
+    arrivals = sorted(rng.uniform(0, args.burst) for _ in range(args.students))
+    db_before = read_db_stats(args.api)
+
+    try:
+        started = time.time()
+        threads = []
+        for n, offset in enumerate(arrivals):
+            time.sleep(max(0.0, started + offset - time.time()))
+            thread = threading.Thread(target=student, args=(n, args, recorder, stop), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        finished = time.time()
+    except KeyboardInterrupt:
+        stop.set()
+        finished = time.time()
+    finally:
+        stop.set()
+        db_after = read_db_stats(args.api)
+        if processes:
+            stop_stack(processes)
+            if args.keep:
+                print(f"Logs and database kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    results = analyse(args, recorder, started, finished, db_before, db_after)
+    report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
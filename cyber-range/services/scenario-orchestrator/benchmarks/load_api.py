@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Load test: concurrent request latency against a running orchestrator API
+
+Fires a mix of GET /status, GET /deployments and POST /deploy at a fixed
+concurrency and reports p50/p95/p99 latency per endpoint. Run it against a
+single uvicorn worker in MOCK_MODE to see head-of-line blocking, e.g.:
+
+  MOCK_MODE=true uvicorn api:app --port 8000 --workers 1
+  python benchmarks/load_api.py --url http://localhost:8000 --concurrency 64 --requests 4000
+
+Compare two revisions by running it on each (git stash / checkout) with the
+same parameters; --json writes the results for later diffing.
+
+Stdlib only, so it runs anywhere the API is reachable.
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Client:
+    """One keep-alive connection per worker thread"""
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            return time.perf_counter() - start, 0, None
+        return time.perf_counter() - start, status, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--deploy-ratio", type=float, default=0.05, help="Share of POST /deploy requests")
+    parser.add_argument("--list-ratio", type=float, default=0.15, help="Share of GET /deployments requests")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    client = Client(args.url)
+
+    # Seed a few labs so /status has something to read
+    ids = []
+    for n in range(10):
+        _, status, data = client.request("POST", "/deploy", {"scenario": "basic_pentest", "instance_id": f"load-seed-{n}"})
+        if status == 200:
+            ids.append(json.loads(data)["instance_id"])
+    if not ids:
+        raise SystemExit(f"Could not create seed deployments at {args.url}")
+
+    def one(n):
+        roll = random.random()
+        if roll < args.deploy_ratio:
+            name = "POST /deploy"
+            latency, status, _ = client.request("POST", "/deploy", {"scenario": "basic_pentest", "instance_id": f"load-{n}"})
+        elif roll < args.deploy_ratio + args.list_ratio:
+            name = "GET /deployments"
+            latency, status, _ = client.request("GET", "/deployments?fields=id,user_id,status,scenario&limit=100")
+        else:
+            name = "GET /status"
+            latency, status, _ = client.request("GET", f"/status/{random.choice(ids)}")
+        return name, latency, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        samples = list(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    results = {"url": args.url, "concurrency": args.concurrency, "requests": args.requests,
+               "elapsed_s": round(elapsed, 3), "rps": round(args.requests / elapsed, 1), "endpoints": {}}
+    for name in sorted({s[0] for s in samples}):
+        latencies = [s[1] * 1000 for s in samples if s[0] == name]
+        errors = sum(1 for s in samples if s[0] == name and s[2] != 200)
+        results["endpoints"][name] = {
+            "count": len(latencies),
+            "errors": errors,
+            "mean_ms": round(statistics.mean(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+
+    print(f"{args.requests} requests in {elapsed:.2f}s ({results['rps']} req/s, concurrency {args.concurrency})")
+    print(f"{'endpoint':<20} {'count':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results["endpoints"].items():
+        print(f"{name:<20} {r['count']:>6} {r['errors']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,14 @@ Simple CLI entry point for scenario orchestrator
 Usage:
   python cli.py deploy <scenario>    - Deploy a scenario
   python cli.py destroy              - Destroy infrastructure
-  python cli.py status               - Show current outputs
+  python cli.py status [instance_id] - Show the outputs of one lab (default: every lab)
 """
 
 import sys
 import argparse
 import logging
+import subprocess
+from config import RUNS_DIR
 from orchestrator import Orchestrator
 
 logging.basicConfig(
@@ -28,13 +30,16 @@ Examples:
   python cli.py deploy advanced_multi_team
   python cli.py destroy
   python cli.py status
+  python cli.py status <instance_id> --show-sensitive
         """
     )
 
     parser.add_argument('command', choices=['deploy', 'destroy', 'status'],
                         help='Command to execute')
     parser.add_argument('scenario', nargs='?', default=None,
-                        help='Scenario name (required for deploy)')
+                        help='Scenario name (required for deploy) or instance id (limits status to one lab)')
+    parser.add_argument('--show-sensitive', action='store_true',
+                        help='Print sensitive outputs (e.g. SOC credentials) in status')
 
     args = parser.parse_args()
 
@@ -68,15 +73,26 @@ Examples:
 
         elif args.command == 'status':
             print("\n📊 Current infrastructure status")
-            try:
-                outputs = orch._get_outputs()
-                if outputs:
-                    for key, value in outputs.items():
-                        print(f"  {key}: {value}")
-                else:
-                    print("  No active infrastructure found")
-            except Exception as e:
-                print(f"  Error reading status: {e}")
+            # Read from each workspace's state file: no tofu process per lab
+            if args.scenario:
+                work_dirs = [RUNS_DIR / args.scenario]
+            else:
+                work_dirs = sorted(p for p in RUNS_DIR.iterdir() if (p / "terraform.tfstate").exists())
+            if not work_dirs:
+                print("  No active infrastructure found")
+            for work_dir in work_dirs:
+                print(f"\n  {work_dir.name}")
+                try:
+                    outputs = orch._get_outputs(work_dir, redact=not args.show_sensitive)
+                except FileNotFoundError:
+                    print("    No state found (not deployed)")
+                    continue
+                except (ValueError, subprocess.SubprocessError) as e:
+                    print(f"    Error reading outputs: {e}")
+                    continue
+                for key, output in outputs.items():
+                    value = "<sensitive>" if output["sensitive"] and not args.show_sensitive else output["value"]
+                    print(f"    {key}: {value}")
 
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -12,7 +12,7 @@ if IN_DOCKER:
     # Docker paths (absolute)
     BASE_DIR = Path("/app")
     CYBER_RANGE_DIR = BASE_DIR
-    TEMPLATES_DIR = BASE_DIR / "orchestrator" / "templates"
+    TEMPLATES_DIR = BASE_DIR / "templates"  # The image copies scenario-orchestrator/ to /app
     BASE_TERRAFORM_TEMPLATE = BASE_DIR / "terraform"
 else:
     # Local development paths (relative)
@@ -59,14 +59,63 @@ DATABASE_PATH = os.getenv("DATABASE_PATH", str(DATA_DIR / "deployments.db"))
 
 # TERRAFORM CONFIGURATION
 TF_PLUGIN_CACHE_DIR = os.getenv("TF_PLUGIN_CACHE_DIR", str(CACHE_DIR / "terraform-plugins"))
+# Initialized .terraform trees keyed by a hash of the .tf files + lock file
+TF_INIT_CACHE_DIR = os.getenv("TF_INIT_CACHE_DIR", str(CACHE_DIR / "terraform-init"))
+
+# tofu executable; with MOCK_MODE the simulator (sim_tofu.py) stands in for it unless
+# MOCK_BACKEND=fixed (canned outputs after a fixed delay, no workspace at all)
+TOFU_BIN = os.getenv("TOFU_BIN", "tofu")
+MOCK_BACKEND = os.getenv("MOCK_BACKEND", "sim").lower()
+
+# Pre-initialized workspaces kept warm by each worker (0 disables the pool)
+WORKSPACE_POOL_SIZE = int(os.getenv("WORKSPACE_POOL_SIZE", "2"))
+WORKSPACE_POOL_REFILL_INTERVAL = int(os.getenv("WORKSPACE_POOL_REFILL_INTERVAL", "30"))
+
+# IMAGE CATALOG (local index of Glance, shared with vulnhub-importer)
+IMAGE_CATALOG_PATH = os.getenv("IMAGE_CATALOG_PATH", str(CACHE_DIR / "glance-index.json"))
+# Seconds before the index is re-synced from Glance (incrementally)
+IMAGE_CATALOG_TTL = int(os.getenv("IMAGE_CATALOG_TTL", "300"))
+# Last random image handed to each user, so nobody gets the same one twice in a row
+IMAGE_PICKS_PATH = os.getenv("IMAGE_PICKS_PATH", str(CACHE_DIR / "image-picks.json"))
+
+# ADMISSION (deploys are held, not failed, when the project quota can't fit them)
+# "static": limits below (unset = unlimited); "openstack": Nova/Cinder/Neutron quotas
+QUOTA_SOURCE = os.getenv("QUOTA_SOURCE", "static").lower()
+# JSON, e.g. {"floating_ips": 10, "cores": 40, "ram_mb": 102400, "volumes": 20, "gigabytes": 1000}
+QUOTA_LIMITS = os.getenv("QUOTA_LIMITS", "")
+# JSON flavor sizes for scenarios that name a flavor, e.g. {"t3.small": {"vcpus": 2, "ram_mb": 2048}}
+QUOTA_FLAVORS = os.getenv("QUOTA_FLAVORS", "")
+# Seconds the OpenStack quota/flavor lookups are cached
+QUOTA_REFRESH_SECONDS = int(os.getenv("QUOTA_REFRESH_SECONDS", "300"))
+
+# SCENARIOS
+# Seconds between checks of templates/ for added or changed scenario files
+SCENARIO_RELOAD_SECONDS = float(os.getenv("SCENARIO_RELOAD_SECONDS", "2"))
+
+# LAB EXPIRY
+# Lifetime of a lab once active when neither the deploy request (ttl_hours) nor
+# the scenario (metadata.estimated_duration_hours) sets one; 0 = never expires
+LAB_TTL_HOURS = float(os.getenv("LAB_TTL_HOURS", "8"))
+# How often the reaper looks for expired labs, and how many it claims per run
+# (their destroys then run DESTROY_CONCURRENCY at a time on the destroy queue)
+REAPER_INTERVAL_SECONDS = int(os.getenv("REAPER_INTERVAL_SECONDS", "300"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "10"))
 
 # API CONFIGURATION
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 DEBUG_MODE = os.getenv("DEBUG_MODE", "False").lower() == "true"
+# Dedicated thread pools keeping SQLite and broker I/O off the event loop
+API_DB_THREADS = int(os.getenv("API_DB_THREADS", "8"))
+API_DISPATCH_THREADS = int(os.getenv("API_DISPATCH_THREADS", "8"))
 
 # WORKER CONFIGURATION
-WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "3"))
+# Processes per queue, passed to each worker as --concurrency (see docker-compose.yml)
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "3"))         # deploy queue
+DESTROY_CONCURRENCY = int(os.getenv("DESTROY_CONCURRENCY", "2"))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "1"))
+# Redis redelivers unacked tasks after this; must exceed the longest deploy (30 min)
+CELERY_VISIBILITY_TIMEOUT = int(os.getenv("CELERY_VISIBILITY_TIMEOUT", "7200"))
 WORKER_LOG_LEVEL = os.getenv("WORKER_LOG_LEVEL", "INFO")
 
 # VALIDATION
@@ -88,7 +137,7 @@ def validate_config():
         if not OS_AUTH_URL:
             errors.append("OS_AUTH_URL is required (set MOCK_MODE=true to skip)")
     else:
-        warnings.append("Running in MOCK_MODE - no real infrastructure will be created")
+        warnings.append(f"Running in MOCK_MODE ({MOCK_BACKEND} backend) - no real infrastructure will be created")
     
     # Check code directories exist
     for dir_name, dir_path in [
@@ -107,8 +156,9 @@ def validate_config():
         dir_path.mkdir(parents=True, exist_ok=True)
         print(f"✅ Directory ready: {dir_path}")
     
-    # Ensure plugin cache subdir exists
+    # Ensure plugin and init cache subdirs exist
     Path(TF_PLUGIN_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    Path(TF_INIT_CACHE_DIR).mkdir(parents=True, exist_ok=True)
     
     # Print warnings
     for warning in warnings:
@@ -1,18 +1,76 @@
 import sqlite3
 import json
 import os
+import base64
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from threading import Lock
+from threading import Lock, local
 from pathlib import Path
 
+import metrics
+import timeline
+
 # Use absolute path to ensure DB is found
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "../../data")
 DB_PATH = os.getenv("DATABASE_PATH", str(Path(__file__).parent.parent.parent / "data" / "deployments.db"))
 
+# Connection tuning (API and worker share the file over a volume)
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE = 256
+
+def _counted(method):
+    """Time every call of a Database method into the cyberguard_db_query_seconds histogram"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.DB_QUERY_SECONDS.labels(method=name).observe(time.perf_counter() - start)
+
+    return wrapper
+
+# Append a JSON array of entries to the timeline column without reading it back:
+# "[a]" + "[b, c]" -> "[a,b, c]" (the column is NULL or a non-empty array)
+_TIMELINE_APPEND = "timeline = COALESCE(substr(timeline, 1, length(timeline) - 1) || ',', '[') || substr(?, 2)"
+
 class Database:
     _instance = None
     _lock = Lock()
+    _local = local()
+
+    # Columns added after the first release: (name, DDL) applied with ALTER TABLE
+    _MIGRATIONS = [
+        ("progress", "progress INTEGER DEFAULT 0"),
+        ("progress_detail", "progress_detail TEXT"),
+        ("batch_id", "batch_id TEXT"),
+        ("request", "request TEXT"),
+        ("expires_at", "expires_at TIMESTAMP"),
+        ("timeline", "timeline TEXT"),
+    ]
+
+    # Secondary indexes backing the filtered, newest-first listing
+    _INDEXES = [
+        "CREATE INDEX IF NOT EXISTS idx_deployments_created ON deployments (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_deployments_status ON deployments (status, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_deployments_scenario ON deployments (scenario, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_deployments_user ON deployments (user_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_deployments_batch ON deployments (batch_id)",
+        "CREATE INDEX IF NOT EXISTS idx_deployments_expiry ON deployments (status, expires_at)",
+    ]
+
+    # Columns that may be requested through field projection
+    COLUMNS = (
+        "id", "user_id", "scenario", "status", "created_at", "updated_at",
+        "outputs", "error", "progress", "progress_detail", "batch_id", "request",
+        "expires_at",
+    )
 
     def __new__(cls):
         if cls._instance is None:
@@ -23,8 +81,27 @@ class Database:
         return cls._instance
 
     def _get_connection(self):
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        conn.row_factory = sqlite3.Row  
+        """
+        Persistent connection per thread (and per process, so forked Celery
+        workers never inherit the parent's handle). Statements are prepared once
+        and reused from the per-connection statement cache.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                DB_PATH,
+                check_same_thread=False,
+                timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                cached_statements=DB_STATEMENT_CACHE
+            )
+            conn.row_factory = sqlite3.Row
+            # WAL: writers (worker) no longer block readers (API)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
         return conn
 
     def _init_db(self):
@@ -44,30 +121,150 @@ class Database:
                     error TEXT
                 )
             ''')
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(deployments)")}
+            for column, ddl in self._MIGRATIONS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE deployments ADD COLUMN {ddl}")
+            for ddl in self._INDEXES:
+                conn.execute(ddl)
             conn.commit()
 
-    def create_deployment(self, deployment_id, user_id, scenario):
+    @_counted
+    def create_deployment(self, deployment_id, user_id, scenario, status='pending', request=None):
+        """request: what is needed to dispatch it later (variables, priority, resources)"""
         with self._get_connection() as conn:
             conn.execute('''
-                INSERT INTO deployments (id, user_id, scenario, status, created_at, updated_at, outputs)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (deployment_id, user_id, scenario, 'pending', datetime.now(), datetime.now(), '{}'))
+                INSERT INTO deployments (id, user_id, scenario, status, created_at, updated_at, outputs, request, timeline)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (deployment_id, user_id, scenario, status, datetime.now(), datetime.now(), '{}',
+                  json.dumps(request) if request is not None else None,
+                  json.dumps([timeline.entry(status)])))
             conn.commit()
         return deployment_id
 
-    def update_deployment(self, deployment_id, status=None, outputs=None, error=None):
+    @_counted
+    def create_deployments(self, rows, batch_id=None, status='pending'):
+        """
+        Insert many deployments in a single transaction.
+        rows: iterable of (deployment_id, user_id, scenario, request)
+        """
+        now = datetime.now()
+        events = json.dumps([timeline.entry(status)])
+        with self._get_connection() as conn:
+            conn.executemany('''
+                INSERT INTO deployments (id, user_id, scenario, status, created_at, updated_at, outputs, batch_id, request, timeline)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(d_id, user_id, scenario, status, now, now, '{}', batch_id,
+                   json.dumps(request) if request is not None else None, events)
+                  for d_id, user_id, scenario, request in rows])
+            conn.commit()
+
+    @_counted
+    def cancel_queued(self, deployment_id):
+        """Drop a deployment that was never admitted; False if it already left the queue"""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                f"UPDATE deployments SET status = 'destroyed', updated_at = ?, {_TIMELINE_APPEND} "
+                "WHERE id = ? AND status = 'queued'",
+                (datetime.now(), json.dumps([timeline.entry("destroyed")]), deployment_id))
+            conn.commit()
+        return cursor.rowcount == 1
+
+    @staticmethod
+    def _sum_resources(conn, statuses):
+        """Total of the `resources` reserved by deployments in the given statuses"""
+        totals = {}
+        query = f"SELECT request FROM deployments WHERE status IN ({', '.join('?' * len(statuses))})"
+        for row in conn.execute(query, list(statuses)):
+            resources = json.loads(row["request"] or "{}").get("resources", {})
+            for name, amount in resources.items():
+                totals[name] = totals.get(name, 0) + amount
+        return totals
+
+    @_counted
+    def reserved_resources(self, statuses):
+        """(reserved totals, number of queued deployments)"""
+        with self._get_connection() as conn:
+            totals = self._sum_resources(conn, statuses)
+            queued = conn.execute("SELECT COUNT(*) FROM deployments WHERE status = 'queued'").fetchone()[0]
+        return totals, queued
+
+    @_counted
+    def admit_queued(self, limits, holding_statuses):
+        """
+        Atomically promote queued deployments to pending, oldest first, for as
+        long as their resources fit next to what `holding_statuses` already
+        reserve (limits: name -> max, missing = unlimited). Strict arrival
+        order: a large request is never overtaken and starved by small ones.
+        Returns the admitted rows.
+        """
+        with self._get_connection() as conn:
+            # IMMEDIATE: API processes and workers admit concurrently; only one may decide at a time
+            conn.execute("BEGIN IMMEDIATE")
+            reserved = self._sum_resources(conn, holding_statuses)
+            admitted = []
+            queued = conn.execute(
+                "SELECT id, user_id, scenario, request FROM deployments WHERE status = 'queued' ORDER BY created_at, id"
+            ).fetchall()
+            for row in queued:
+                need = json.loads(row["request"] or "{}").get("resources", {})
+                if any(name in limits and reserved.get(name, 0) + amount > limits[name]
+                       for name, amount in need.items()):
+                    break
+                for name, amount in need.items():
+                    reserved[name] = reserved.get(name, 0) + amount
+                admitted.append(dict(row))
+
+            now = datetime.now()
+            events = json.dumps([timeline.entry("pending")])
+            conn.executemany(f"UPDATE deployments SET status = 'pending', updated_at = ?, {_TIMELINE_APPEND} WHERE id = ?",
+                             [(now, events, row["id"]) for row in admitted])
+            conn.commit()
+        return admitted
+
+    @_counted
+    def get_batch(self, batch_id):
+        """Aggregate status of a batch: counts per status, mean progress and member labs"""
+        with self._get_connection() as conn:
+            rows = conn.execute(
+                "SELECT id, user_id, status, progress FROM deployments WHERE batch_id = ? ORDER BY user_id",
+                (batch_id,)
+            ).fetchall()
+        if not rows:
+            return None
+
+        counts = {}
+        for row in rows:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        return {
+            "batch_id": batch_id,
+            "total": len(rows),
+            "counts": counts,
+            "progress": round(sum(row["progress"] or 0 for row in rows) / len(rows)),
+            "labs": [dict(row) for row in rows],
+        }
+
+    @_counted
+    def update_deployment(self, deployment_id, status=None, outputs=None, error=None, expires_at=None,
+                          detail=None):
+        """A status change is also appended to the timeline (with `detail`, if given)"""
         updates = ["updated_at = ?"]
         params = [datetime.now()]
 
         if status:
             updates.append("status = ?")
             params.append(status)
+            updates.append(_TIMELINE_APPEND)
+            params.append(json.dumps([timeline.entry(status, detail)]))
         if outputs is not None:
             updates.append("outputs = ?")
             params.append(json.dumps(outputs))
         if error is not None:
             updates.append("error = ?")
             params.append(error)
+        if expires_at is not None:
+            updates.append("expires_at = ?")
+            params.append(expires_at)
 
         params.append(deployment_id)
         query = f"UPDATE deployments SET {', '.join(updates)} WHERE id = ?"
@@ -76,6 +273,37 @@ class Database:
             conn.execute(query, params)
             conn.commit()
 
+    @_counted
+    def update_progress(self, deployment_id, progress, detail=None):
+        """Store apply progress (percentage + compact per-resource summary)"""
+        with self._get_connection() as conn:
+            conn.execute(
+                "UPDATE deployments SET progress = ?, progress_detail = ?, updated_at = ? WHERE id = ?",
+                (progress, json.dumps(detail or {}), datetime.now(), deployment_id)
+            )
+            conn.commit()
+
+    @_counted
+    def add_events(self, deployment_id, entries):
+        """Append timeline entries (see timeline.entry) in a single write"""
+        if not entries:
+            return
+        with self._get_connection() as conn:
+            conn.execute(f"UPDATE deployments SET {_TIMELINE_APPEND} WHERE id = ?",
+                         (json.dumps(entries), deployment_id))
+            conn.commit()
+
+    @_counted
+    def get_timeline(self, deployment_id):
+        """(row with id/scenario/status, timeline entries) or None"""
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT id, scenario, status, timeline FROM deployments WHERE id = ?",
+                               (deployment_id,)).fetchone()
+        if not row:
+            return None
+        return dict(row), json.loads(row["timeline"] or "[]")
+
+    @_counted
     def get_deployment(self, deployment_id):
         with self._get_connection() as conn:
             cursor = conn.execute("SELECT * FROM deployments WHERE id = ?", (deployment_id,))
@@ -84,12 +312,142 @@ class Database:
                 return dict(row)
         return None
 
-    def list_deployments(self):
+    @_counted
+    def count_labs(self):
+        """(status, scenario, count) for every lab that is not destroyed"""
+        with self._get_connection() as conn:
+            return conn.execute(
+                "SELECT status, scenario, COUNT(*) FROM deployments WHERE status != 'destroyed' "
+                "GROUP BY status, scenario"
+            ).fetchall()
+
+    @_counted
+    def list_deployments(self, statuses=None, scenario=None, user_id=None,
+                         fields=None, limit=None, cursor=None):
+        """
+        List deployments newest first, optionally filtered and paginated.
+
+        Pagination is keyset-based on (created_at, id): pass the cursor built
+        from the last row of the previous page (see encode_cursor).
+        Raises ValueError for unknown fields or a malformed cursor.
+        """
+        columns = list(fields or self.COLUMNS)
+        unknown = set(columns) - set(self.COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        # Keyset columns are always returned so the caller can build the next cursor
+        for key in ("id", "created_at"):
+            if key not in columns:
+                columns.append(key)
+
+        where, params = [], []
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if scenario:
+            where.append("scenario = ?")
+            params.append(scenario)
+        if user_id:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if cursor:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(self.decode_cursor(cursor))
+
+        query = f"SELECT {', '.join(columns)} FROM deployments"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
         with self._get_connection() as conn:
-            cursor = conn.execute("SELECT * FROM deployments ORDER BY created_at DESC")
+            cursor = conn.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def encode_cursor(row):
+        raw = json.dumps([str(row["created_at"]), row["id"]])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, deployment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except Exception:
+            raise ValueError("Invalid cursor")
+        return created_at, deployment_id
+
+    @_counted
+    def claim_for_destroy(self, statuses, scenario=None, user_id=None, created_before=None,
+                          expired_before=None, limit=None):
+        """
+        Atomically take matching labs out of circulation for a bulk destroy.
+        Queued labs never reached the cloud and go straight to 'destroyed';
+        the rest are marked 'destroying' and returned for dispatch (oldest first).
+        Returns (to_destroy, cancelled) id lists.
+        """
+        where = [f"status IN ({', '.join('?' * len(statuses))})"]
+        params = list(statuses)
+        if scenario:
+            where.append("scenario = ?")
+            params.append(scenario)
+        if user_id:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if created_before:
+            where.append("created_at < ?")
+            params.append(created_before)
+        if expired_before:
+            where.append("expires_at <= ?")
+            params.append(expired_before)
+        query = f"SELECT id, status FROM deployments WHERE {' AND '.join(where)} ORDER BY created_at, id"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        now = datetime.now()
+        destroyed = json.dumps([timeline.entry("destroyed")])
+        destroying = json.dumps([timeline.entry("destroying")])
+        with self._get_connection() as conn:
+            # IMMEDIATE: the reaper and the API must never both claim the same lab
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(query, params).fetchall()
+            cancelled = [row["id"] for row in rows if row["status"] == "queued"]
+            to_destroy = [row["id"] for row in rows if row["status"] != "queued"]
+            conn.executemany(f"UPDATE deployments SET status = 'destroyed', updated_at = ?, {_TIMELINE_APPEND} WHERE id = ?",
+                             [(now, destroyed, d_id) for d_id in cancelled])
+            conn.executemany(f"UPDATE deployments SET status = 'destroying', updated_at = ?, {_TIMELINE_APPEND} WHERE id = ?",
+                             [(now, destroying, d_id) for d_id in to_destroy])
+            conn.commit()
+        return to_destroy, cancelled
+
+    @_counted
     def delete_deployment(self, deployment_id):
         with self._get_connection() as conn:
             conn.execute("DELETE FROM deployments WHERE id = ?", (deployment_id,))
-            conn.commit()
\ No newline at end of file
+            conn.commit()
+
+class AsyncDatabase:
+    """
+    Awaitable facade over Database for the FastAPI event loop.
+    Every call runs on a dedicated thread pool (each thread keeps its own
+    pooled connection), so SQLite I/O never blocks the loop and never competes
+    with Starlette's default threadpool.
+    """
+
+    def __init__(self, db: Database = None, max_workers: int = 8):
+        self._db = db or Database()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    def __getattr__(self, name):
+        method = getattr(self._db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+        return call
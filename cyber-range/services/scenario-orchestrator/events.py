@@ -0,0 +1,157 @@
+"""
+Deployment Events - Redis pub/sub fan-out for live status updates
+Workers publish every status/progress change; the API keeps ONE pattern
+subscription per process and fans messages out to the SSE clients watching
+each deployment, so the dashboard no longer polls.
+"""
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from config import CELERY_BROKER_URL
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:
+    redis = None
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "cyberguard:deployment:"
+KEEPALIVE_SECONDS = 15.0
+SUBSCRIBE_WAIT_SECONDS = 5.0
+
+# Queued to every subscriber when the hub (re)subscribes: events published
+# while it was not subscribed are lost, so the stream must re-read the row
+RESYNC = object()
+
+_publisher = None
+_publisher_pid = None
+
+
+def _channel(instance_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{instance_id}"
+
+
+def publish(instance_id: str, **fields):
+    """Best-effort publish of a deployment change (never raises)"""
+    global _publisher, _publisher_pid
+    if redis is None:
+        return
+    try:
+        if _publisher is None or _publisher_pid != os.getpid():
+            _publisher = redis.Redis.from_url(CELERY_BROKER_URL)
+            _publisher_pid = os.getpid()
+        payload = {"id": instance_id, **{k: v for k, v in fields.items() if v is not None}}
+        _publisher.publish(_channel(instance_id), json.dumps(payload, default=str))
+    except Exception as e:
+        logger.warning(f"[{instance_id}] Could not publish status event: {e}")
+
+
+class EventHub:
+    """Single Redis subscription per API process, fanned out to local queues"""
+
+    def __init__(self, url: str = CELERY_BROKER_URL):
+        self.url = url
+        self._subscribers = {}   # instance_id -> set of asyncio.Queue
+        self._task = None
+        self._subscribed = None  # asyncio.Event, set while the subscription is confirmed live
+
+    def _ensure_started(self):
+        if self._subscribed is None:
+            self._subscribed = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            client = aioredis.from_url(self.url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                # psubscribe only sends the command: wait for Redis to confirm it
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "psubscribe":
+                        break
+                logger.info("Event hub subscribed to deployment events")
+                self._subscribed.set()
+                self._resync()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message:
+                        self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event hub connection lost ({e}), reconnecting...")
+                await asyncio.sleep(2)
+            finally:
+                self._subscribed.clear()
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+
+    def _resync(self):
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._put(queue, RESYNC)
+
+    @staticmethod
+    def _put(queue, event):
+        if queue.full():
+            # Slow client: drop the oldest update, the newest one wins
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def _dispatch(self, message):
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        instance_id = channel[len(CHANNEL_PREFIX):]
+        try:
+            event = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        for queue in self._subscribers.get(instance_id, ()):
+            self._put(queue, event)
+
+    @asynccontextmanager
+    async def subscribe(self, instance_id: str):
+        """
+        Yields an asyncio.Queue receiving events for one deployment, once the
+        Redis subscription is live (or after SUBSCRIBE_WAIT_SECONDS if Redis is
+        down). RESYNC in the queue means events may have been missed.
+        """
+        if aioredis is None:
+            raise RuntimeError("redis library required for live events")
+        self._ensure_started()
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), SUBSCRIBE_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            # Go on with the snapshot; the hub queues RESYNC once it gets through
+            pass
+        queue = asyncio.Queue(maxsize=100)
+        self._subscribers.setdefault(instance_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            watchers = self._subscribers.get(instance_id)
+            if watchers is not None:
+                watchers.discard(queue)
+                if not watchers:
+                    del self._subscribers[instance_id]
+
+
+def format_sse(data: dict, event: str = None) -> str:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,182 @@
+"""
+Image Selector - Resolves the `vulnhub-random` placeholder to a real image
+Draws a victim image for a scenario from the local image catalog index,
+weighted per image, by difficulty, in O(1) (alias tables rebuilt only when
+the catalog changes). The catalog is re-synced from Glance at most once per
+IMAGE_CATALOG_TTL, so a deploy normally costs no cloud round-trip at all.
+The last image handed to each user is remembered so nobody gets the same
+target twice in a row.
+"""
+import fcntl
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import (
+    IMAGE_CATALOG_PATH, IMAGE_CATALOG_TTL, IMAGE_PICKS_PATH,
+    OS_AUTH_URL, OS_USERNAME, OS_PASSWORD, OS_PROJECT_ID, OS_REGION_NAME,
+    OS_USER_DOMAIN_NAME, OS_PROJECT_DOMAIN_NAME
+)
+from image_catalog import ImageCatalog
+
+try:
+    import openstack
+except ImportError:
+    openstack = None
+
+logger = logging.getLogger(__name__)
+
+RANDOM_IMAGE = "vulnhub-random"
+WEIGHT_PROPERTY = "vulnhub_weight"      # Optional per-image weight (default 1, 0 = never picked)
+
+
+class AliasTable:
+    """Vose's alias method: O(n) build, O(1) weighted draw"""
+
+    def __init__(self, items: List[str], weights: List[float]):
+        n = len(items)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        small = [i for i, w in enumerate(scaled) if w < 1]
+        large = [i for i, w in enumerate(scaled) if w >= 1]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s], self.alias[s] = scaled[s], l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        self.items = items
+        self.distinct = len(set(items))
+
+    def draw(self, rng: random.Random) -> str:
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+
+def _weight(entry: dict) -> float:
+    """Pick weight of an image; 0 (or negative) excludes it, an unparsable value counts as 1"""
+    try:
+        return max(float(entry["properties"].get(WEIGHT_PROPERTY, 1)), 0.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class ImageSelector:
+    """Weighted, per-user non-repeating random picks from the image catalog"""
+
+    def __init__(self, catalog: ImageCatalog = None, picks_path: str = IMAGE_PICKS_PATH,
+                 ttl: int = IMAGE_CATALOG_TTL):
+        self.catalog = catalog or ImageCatalog(self._connect(), IMAGE_CATALOG_PATH)
+        self.picks_path = Path(picks_path)
+        self.ttl = ttl
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+        self._tables: Dict[str, AliasTable] = {}
+        self._tables_version = None
+        self._synced = 0.0
+
+    @staticmethod
+    def _connect():
+        """Glance connection for catalog syncs; None means: use the index file as is"""
+        if openstack is None or not OS_AUTH_URL:
+            return None
+        try:
+            return openstack.connect(
+                auth_url=OS_AUTH_URL,
+                username=OS_USERNAME,
+                password=OS_PASSWORD,
+                project_id=OS_PROJECT_ID,
+                region_name=OS_REGION_NAME,
+                user_domain_name=OS_USER_DOMAIN_NAME,
+                project_domain_name=OS_PROJECT_DOMAIN_NAME,
+            )
+        except Exception as e:
+            logger.warning(f"No OpenStack connection for the image catalog: {e}")
+            return None
+
+    def warm(self):
+        """Sync the catalog ahead of the first deploy (best effort)"""
+        self._ensure_fresh()
+
+    def _ensure_fresh(self):
+        self.catalog.reload_if_changed()
+        if self.catalog.conn is None or time.monotonic() - self._synced < self.ttl:
+            return
+        try:
+            self.catalog.refresh()
+        except Exception as e:
+            logger.warning(f"Image catalog sync failed, using the cached index: {e}")
+        self._synced = time.monotonic()
+
+    def _table(self, key: str) -> Optional[AliasTable]:
+        """Alias table for one difficulty ('*' = every catalog image), rebuilt on catalog change"""
+        if self._tables_version != self.catalog.version:
+            self._tables, self._tables_version = {}, self.catalog.version
+        if key not in self._tables:
+            if key == "*":
+                ids = [i for d in self.catalog.difficulties() for i in self.catalog.by_difficulty(d)]
+            else:
+                ids = list(self.catalog.by_difficulty(key))
+            weighted = [(e["name"], _weight(e)) for e in (self.catalog.get(i) for i in ids)]
+            weighted = [(name, weight) for name, weight in weighted if weight > 0]
+            if ids and not weighted:
+                raise RuntimeError(f"No '{RANDOM_IMAGE}' candidates: every {'' if key == '*' else key + ' '}"
+                                   f"image in the catalog has {WEIGHT_PROPERTY}=0")
+            self._tables[key] = AliasTable([n for n, _ in weighted], [w for _, w in weighted]) if weighted else None
+        return self._tables[key]
+
+    def resolve(self, image: str, difficulty: str = None, user_id: str = None) -> str:
+        """Concrete image name for `image` (unchanged unless it is the random placeholder)"""
+        if image != RANDOM_IMAGE:
+            return image
+
+        with self._lock:
+            self._ensure_fresh()
+            table = (self._table(difficulty) if difficulty else None) or self._table("*")
+            if table is None:
+                raise RuntimeError(f"No '{RANDOM_IMAGE}' candidates: no images tagged cyber_range_image=true "
+                                   f"in the catalog (run vulnhub-importer/auto_catalog.py)")
+            if difficulty and table is self._tables.get("*"):
+                logger.warning(f"No {difficulty} images in the catalog, picking from all difficulties")
+
+            with self._picks() as picks:
+                last = picks.get(user_id) if user_id else None
+                choice = table.draw(self._rng)
+                # Redraw on a repeat; with a single candidate a repeat is unavoidable
+                if table.distinct > 1:
+                    for _ in range(16):
+                        if choice != last:
+                            break
+                        choice = table.draw(self._rng)
+                    else:
+                        choice = next(item for item in table.items if item != last)
+                if user_id:
+                    picks[user_id] = choice
+
+        logger.info(f"Resolved {RANDOM_IMAGE} ({difficulty or 'any'}) to '{choice}' for user {user_id}")
+        return choice
+
+    @contextmanager
+    def _picks(self):
+        """Last pick per user, read-modify-written under an exclusive file lock"""
+        self.picks_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.picks_path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    picks = json.loads(f.read() or "{}")
+                except ValueError:
+                    picks = {}
+                yield picks
+                f.seek(0)
+                f.truncate()
+                json.dump(picks, f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,102 @@
+"""
+Init Cache - Content-hashed `tofu init` results
+Snapshots the `.terraform` tree and `.terraform.lock.hcl` of an initialized
+workspace, keyed by a hash of its `.tf` files and lock file. Workspaces with the
+same key get the snapshot materialized instead of running `tofu init` again.
+
+Provider binaries are never duplicated: with TF_PLUGIN_CACHE_DIR set they are
+symlinks into the plugin cache (kept as symlinks), otherwise they are hardlinked.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = ".terraform.lock.hcl"
+
+
+def _link_or_copy(src, dst):
+    """Hardlink when possible (same filesystem), copy otherwise"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class InitCache:
+    """Store of initialized `.terraform` trees keyed by configuration hash"""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, work_dir: Path) -> str:
+        """Hash of every .tf file plus the dependency lock file"""
+        digest = hashlib.sha256()
+        files = sorted(Path(work_dir).glob("*.tf"))
+        lock = Path(work_dir) / LOCK_FILE
+        if lock.exists():
+            files.append(lock)
+        for path in files:
+            digest.update(path.name.encode())
+            digest.update(b"\0")
+            digest.update(path.read_bytes())
+        return digest.hexdigest()[:16]
+
+    @contextmanager
+    def lock(self, key: str):
+        """Serialize inits for the same key (the plugin cache is not safe for concurrent installs)"""
+        with open(self.cache_dir / f"{key}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def restore(self, work_dir: Path, key: str = None) -> bool:
+        """Materialize a cached init into work_dir. Returns False on a cache miss."""
+        key = key or self.key(work_dir)
+        entry = self.cache_dir / key
+        if not (entry / ".terraform").is_dir():
+            return False
+
+        target = Path(work_dir) / ".terraform"
+        if target.exists():
+            shutil.rmtree(target)
+
+        # Providers are large and immutable: link them. Everything else (backend
+        # state, module manifests) is tiny and may be rewritten, so copy it.
+        shutil.copytree(entry / ".terraform", target, symlinks=True,
+                        ignore=shutil.ignore_patterns("providers"))
+        if (entry / ".terraform" / "providers").exists():
+            shutil.copytree(entry / ".terraform" / "providers", target / "providers",
+                            symlinks=True, copy_function=_link_or_copy)
+        if (entry / LOCK_FILE).exists():
+            shutil.copy2(entry / LOCK_FILE, Path(work_dir) / LOCK_FILE)
+        return True
+
+    def store(self, work_dir: Path, key: str):
+        """Snapshot an initialized workspace under `key` (atomic, first writer wins)"""
+        entry = self.cache_dir / key
+        if entry.exists() or not (Path(work_dir) / ".terraform").is_dir():
+            return
+
+        staging = self.cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copytree(Path(work_dir) / ".terraform", staging / ".terraform",
+                            symlinks=True, copy_function=_link_or_copy)
+            if (Path(work_dir) / LOCK_FILE).exists():
+                shutil.copy2(Path(work_dir) / LOCK_FILE, staging / LOCK_FILE)
+            os.rename(staging, entry)
+            logger.info(f"Init cache: stored {key}")
+        except OSError as e:
+            logger.warning(f"Init cache: could not store {key}: {e}")
+        finally:
+            if staging.exists():
+                shutil.rmtree(staging, ignore_errors=True)
@@ -0,0 +1,189 @@
+"""
+Metrics - Prometheus instrumentation for the API and the workers
+Every process records into prometheus_client's multiprocess directory
+(PROMETHEUS_MULTIPROC_DIR, a tmpfs volume shared by the API and worker
+containers), and `GET /metrics` on the API adds them all up together with
+values read at scrape time: Celery queue depth from Redis and labs by status
+and scenario from SQLite. Without prometheus_client every metric is a no-op.
+
+Files are named after host and pid (containers share the directory, not a PID
+namespace). Each container removes its previous run's files when it starts
+(clear_stale), and exited worker processes are marked dead.
+"""
+import glob
+import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    # Must exist before the first value is recorded
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+# "_" separates the parts of a metrics file name
+HOST = socket.gethostname().replace("_", "-")
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Histogram, multiprocess, values
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+
+def _process_id(pid: int = None) -> str:
+    return f"{HOST}-{pid or os.getpid()}"
+
+
+if prometheus_client and MULTIPROC_DIR:
+    # Chosen before the first metric below is created
+    values.ValueClass = values.MultiProcessValue(process_identifier=_process_id)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Deploys take up to 30 minutes; database calls should stay in the millisecond range
+PHASE_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, 1200, 1800, 3600)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, amount):
+        pass
+
+
+def _histogram(name: str, documentation: str, labels: List[str], buckets: tuple):
+    if prometheus_client is None:
+        return _Noop()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+
+PHASE_SECONDS = _histogram(
+    "cyberguard_phase_seconds",
+    "Time spent in each orchestrator phase (prepare, init, apply, output, destroy)",
+    ["phase"], PHASE_BUCKETS)
+TASK_SECONDS = _histogram(
+    "cyberguard_task_seconds",
+    "Celery task runtime by outcome (ok, failed = returned an error, error = raised)",
+    ["task", "outcome"], PHASE_BUCKETS)
+DB_QUERY_SECONDS = _histogram(
+    "cyberguard_db_query_seconds",
+    "Latency of each Database method, including waits for the SQLite write lock",
+    ["method"], DB_BUCKETS)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe how long the block took (also when it raises)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def available() -> bool:
+    return prometheus_client is not None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def clear_stale():
+    """
+    Remove this host's metric files left by earlier runs of the container:
+    those of dead pids and of our own pid (reused after a restart). Call it at
+    startup before anything is recorded; live siblings keep their files.
+    """
+    if not MULTIPROC_DIR:
+        return
+    prefix = f"_{HOST}-"
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, f"*{prefix}*.db")):
+        pid = path[path.rindex(prefix) + len(prefix):-len(".db")]
+        if pid.isdigit() and (int(pid) == os.getpid() or not _alive(int(pid))):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def mark_process_dead(pid: int = None):
+    """Drop the live values of an exited process (Celery pool child, gunicorn worker)"""
+    if prometheus_client and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(_process_id(pid), MULTIPROC_DIR)
+
+
+def child_exit(server, worker):
+    """gunicorn hook, for running the API with several workers: `gunicorn -c python:metrics ...`"""
+    mark_process_dead(worker.pid)
+
+
+class LiveCollector:
+    """Gauges read when Prometheus scrapes, rather than recorded by a process"""
+
+    def __init__(self, db, queue_keys: Dict[str, List[str]], broker_url: str):
+        self.db = db
+        self.queue_keys = queue_keys     # queue -> Redis lists holding its waiting messages
+        self.broker_url = broker_url
+        self._redis = None
+
+    def _queue_depths(self) -> Dict[str, int]:
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(self.broker_url)
+        pipe = self._redis.pipeline(transaction=False)
+        for keys in self.queue_keys.values():
+            for key in keys:
+                pipe.llen(key)
+        lengths = iter(pipe.execute())
+        return {queue: sum(next(lengths) for _ in keys) for queue, keys in self.queue_keys.items()}
+
+    def collect(self):
+        depth = GaugeMetricFamily("cyberguard_queue_depth", "Tasks waiting in each Celery queue", labels=["queue"])
+        if redis is not None:
+            try:
+                for queue, count in self._queue_depths().items():
+                    depth.add_metric([queue], count)
+            except Exception as e:
+                logger.warning(f"Could not read queue depth: {e}")
+        yield depth
+
+        labs = GaugeMetricFamily("cyberguard_labs", "Labs by status and scenario (destroyed ones left out)",
+                                 labels=["status", "scenario"])
+        for status, scenario, count in self.db.count_labs():
+            labs.add_metric([status, scenario or ""], count)
+        yield labs
+
+
+class _ProcessCollector:
+    """This process's own metrics, when there is no multiprocess directory to read"""
+
+    def collect(self):
+        return prometheus_client.REGISTRY.collect()
+
+
+def render(live: LiveCollector) -> tuple:
+    """(body, content type) of a scrape; blocking, run it off the event loop"""
+    registry = CollectorRegistry()
+    if MULTIPROC_DIR:
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(_ProcessCollector())
+    registry.register(live)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -5,27 +5,95 @@ import json
 import os
 import time
 import random
+import threading
 from pathlib import Path
-from config import BASE_TERRAFORM_TEMPLATE, RUNS_DIR
+from config import (
+    BASE_TERRAFORM_TEMPLATE, RUNS_DIR, TF_PLUGIN_CACHE_DIR, TF_INIT_CACHE_DIR,
+    WORKSPACE_POOL_SIZE, WORKSPACE_POOL_REFILL_INTERVAL, LAB_TTL_HOURS, TOFU_BIN, MOCK_BACKEND
+)
+from workspace_pool import WorkspacePool, TEMPLATE_IGNORE
+from init_cache import InitCache
+from image_selector import ImageSelector
+from scenario_registry import get_registry
+from apply_stream import stream_apply
+from tfstate import read_outputs, redact_outputs, StateError
+from metrics import PHASE_SECONDS, timed
+import timeline
 
 
 BASE_DIR = Path(__file__).resolve().parent
-TF_SOURCE_DIR = BASE_DIR.parent.parent / "infra" / "terraform"
-RUNS_DIR = BASE_DIR.parent.parent / "runs"
+SIM_TOFU = BASE_DIR / "sim_tofu.py"
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class Orchestrator:
+    _pool = None
+    _pool_lock = threading.Lock()
+    _selector = None
+
     def __init__(self):
         RUNS_DIR.mkdir(parents=True, exist_ok=True)
+        Path(TF_PLUGIN_CACHE_DIR).mkdir(parents=True, exist_ok=True)
         self.mock_mode = os.getenv("MOCK_MODE", "false").lower() == "true"
+        # Simulated: the whole workspace/init/apply/output path runs against sim_tofu.py
+        self.simulated = self.mock_mode and MOCK_BACKEND == "sim"
+        self.tofu = str(SIM_TOFU) if self.simulated else TOFU_BIN
+        self.init_cache = InitCache(TF_INIT_CACHE_DIR)
+
+    def _tofu_env(self) -> dict:
+        """Environment for tofu subprocesses: share provider binaries across workspaces"""
+        env = os.environ.copy()
+        env["TF_PLUGIN_CACHE_DIR"] = str(TF_PLUGIN_CACHE_DIR)
+        env["TF_IN_AUTOMATION"] = "1"
+        return env
+
+    def get_workspace_pool(self):
+        """Shared pool of pre-initialized workspaces (None when disabled or with canned mocks)"""
+        if (self.mock_mode and not self.simulated) or WORKSPACE_POOL_SIZE <= 0:
+            return None
+        with Orchestrator._pool_lock:
+            if Orchestrator._pool is None:
+                Orchestrator._pool = WorkspacePool(
+                    BASE_TERRAFORM_TEMPLATE,
+                    RUNS_DIR,
+                    size=WORKSPACE_POOL_SIZE,
+                    build_fn=self._build_pool_workspace,
+                    refill_interval=WORKSPACE_POOL_REFILL_INTERVAL
+                )
+        return Orchestrator._pool
 
-    def _prepare_workspace(self, instance_id: str) -> Path:
+    def get_image_selector(self) -> ImageSelector:
+        """Process-wide selector for placeholder images such as `vulnhub-random`"""
+        with Orchestrator._pool_lock:
+            if Orchestrator._selector is None:
+                Orchestrator._selector = ImageSelector()
+        return Orchestrator._selector
+
+    def _prepare_workspace(self, instance_id: str):
+        """
+        Returns (work_dir, initialized). A pooled workspace is already initialized,
+        a freshly copied one still needs `tofu init`.
+        """
         work_dir = RUNS_DIR / instance_id
+        if (work_dir / "terraform.tfstate").exists():
+            # Redelivered task (acks_late): converge the existing state instead of orphaning its resources
+            logger.warning(f"[{instance_id}] Workspace already has state, resuming the previous apply")
+            return work_dir, (work_dir / ".terraform").is_dir()
         if work_dir.exists(): 
             shutil.rmtree(work_dir)
-        shutil.copytree(TF_SOURCE_DIR, work_dir)
+
+        pool = self.get_workspace_pool()
+        if pool and pool.claim(work_dir):
+            logger.info(f"[{instance_id}] Workspace claimed from pool at {work_dir}")
+            return work_dir, True
+
+        self._copy_template(work_dir)
+        logger.info(f"[{instance_id}] Workspace prepared at {work_dir}")
+        return work_dir, False
+
+    def _copy_template(self, work_dir: Path):
+        shutil.copytree(BASE_TERRAFORM_TEMPLATE, work_dir, ignore=shutil.ignore_patterns(*TEMPLATE_IGNORE))
         
         # Backend ovveride ensures each lab has its own terraform.tfstate file
         backend_override = work_dir / "backend_override.tf"
@@ -36,14 +104,87 @@ class Orchestrator:
     }}
     }}
     ''')
-    
-        logger.info(f"[{instance_id}] Workspace prepared at {work_dir}")
-        return work_dir
 
-    def deploy(self, scenario_name: str, instance_id: str, user_vars: dict = None):
+    @staticmethod
+    def _record(on_event, event: str, detail: dict = None):
+        """Report a timeline entry (reporting must never break the deploy itself)"""
+        if not on_event:
+            return
+        try:
+            on_event([timeline.entry(event, detail)])
+        except Exception as e:
+            logger.warning(f"Timeline callback failed: {e}")
+
+    @staticmethod
+    def _resource_entries(finished: list) -> list:
+        """Timeline entries for resources finished during an apply"""
+        return [
+            timeline.entry("resource", {"addr": addr, "s": elapsed}, at=at) if state == "complete"
+            else timeline.entry("resource_failed", {"addr": addr}, at=at)
+            for at, addr, state, elapsed in finished
+        ]
+
+    def _build_pool_workspace(self, work_dir: Path):
+        self._copy_template(work_dir)
+        self._init_workspace("pool", work_dir)
+
+    def _init_workspace(self, instance_id: str, work_dir: Path, on_event=None):
+        """
+        Initialize a workspace, reusing a cached `.terraform` tree when the
+        configuration hash matches. Falls back to `tofu init` with retry.
+        """
+        key = self.init_cache.key(work_dir)
+        if self.init_cache.restore(work_dir, key):
+            logger.info(f"[{instance_id}] Init cache hit ({key}), skipping terraform init")
+            self._record(on_event, "init_cached")
+            return
+
+        with self.init_cache.lock(key):
+            # Another worker may have filled the cache while we waited for the lock
+            if self.init_cache.restore(work_dir, key):
+                logger.info(f"[{instance_id}] Init cache hit ({key}), skipping terraform init")
+                self._record(on_event, "init_cached", {"waited": True})
+                return
+
+            logger.info(f"[{instance_id}] Running terraform init...")
+            for attempt in range(3):
+                try:
+                    result = subprocess.run(
+                        [self.tofu, "init", "-input=false"], 
+                        cwd=work_dir, 
+                        check=True, 
+                        capture_output=True,
+                        text=True,
+                        env=self._tofu_env(),
+                        timeout=300  # 5 min timeout
+                    )
+                    logger.info(f"[{instance_id}] Init successful")
+                    break
+
+                except subprocess.TimeoutExpired:
+                    if attempt == 2:
+                        raise RuntimeError("Terraform init timed out after 3 attempts")
+                    logger.warning(f"[{instance_id}] Init timeout, retry {attempt+1}/3")
+                    self._record(on_event, "init_retry", {"attempt": attempt + 1, "error": "timeout"})
+                    time.sleep(5)
+                except subprocess.CalledProcessError as e:
+                    if attempt == 2:
+                        raise RuntimeError(f"Init failed: {e.stderr}")
+                    self._record(on_event, "init_retry", {"attempt": attempt + 1, "error": f"exit {e.returncode}"})
+                    time.sleep(5)
+
+            self.init_cache.store(work_dir, key)
+
+    def deploy(self, scenario_name: str, instance_id: str, user_vars: dict = None, on_progress=None,
+               user_id: str = None, on_event=None):
+        """
+        on_progress(percent, summary) is called periodically while tofu apply runs.
+        on_event(entries) receives timeline entries as phases start and resources finish.
+        user_id keeps random image picks from repeating for the same user.
+        """
         logger.info(f"[{instance_id}] Starting deployment of scenario '{scenario_name}' (Mock Mode: {self.mock_mode})")        
         
-        if self.mock_mode:
+        if self.mock_mode and not self.simulated:
             logger.info(f"[{instance_id}] 🎭 SIMULATING DEPLOY...")
             time.sleep(2)
             
@@ -68,47 +209,40 @@ class Orchestrator:
 
         # REAL LOGIC
         work_dir = None
+        applying = False
         try:
-            # READ SCENARIO CONFIGURATION
-            scenario_config = self._load_scenario(scenario_name)
-            if not scenario_config:
+            # READ SCENARIO CONFIGURATION (parsed once, cached by the registry)
+            registry = get_registry()
+            scenario = registry.get(scenario_name)
+            if not scenario:
+                invalid = registry.error(scenario_name)
                 return {
                     "success": False,
-                    "error": f"Scenario '{scenario_name}' not found"
+                    "error": f"Scenario '{scenario_name}' is invalid: {invalid}" if invalid
+                             else f"Scenario '{scenario_name}' not found"
                 }
-            work_dir = self._prepare_workspace(instance_id)
+            scenario_config = scenario.config
 
-            # STEP 1: TERRAFORM INIT (with retry)
-            logger.info(f"[{instance_id}] Running terraform init...")
-            for attempt in range(3):
-                try:
-                    result = subprocess.run(
-                        ["tofu", "init"], 
-                        cwd=work_dir, 
-                        check=True, 
-                        capture_output=True,
-                        text=True,
-                        timeout=300  # 5 min timeout
-                    )
-                    logger.info(f"[{instance_id}] Init successful")
-                    break
+            # Resolve scenario vars (incl. random images) before touching the workspace
+            scenario_vars = dict(scenario.tf_vars)
+            if "victim_image_name" not in (user_vars or {}):
+                self._resolve_images(scenario_vars, scenario_config, user_id)
 
-                except subprocess.TimeoutExpired:
-                    if attempt == 2:
-                        raise RuntimeError("Terraform init timed out after 3 attempts")
-                    logger.warning(f"[{instance_id}] Init timeout, retry {attempt+1}/3")
-                    time.sleep(5)
-                except subprocess.CalledProcessError as e:
-                    if attempt == 2:
-                        raise RuntimeError(f"Init failed: {e.stderr}")
-                    time.sleep(5)
+            self._record(on_event, "prepare")
+            with timed(PHASE_SECONDS, phase="prepare"):
+                work_dir, initialized = self._prepare_workspace(instance_id)
+
+            # STEP 1: TERRAFORM INIT (skipped for pooled workspaces)
+            if not initialized:
+                self._record(on_event, "init")
+                with timed(PHASE_SECONDS, phase="init"):
+                    self._init_workspace(instance_id, work_dir, on_event)
             
             # STEP 2: TERRAFORM APPLY
             logger.info(f"[{instance_id}] Applying scenario: {scenario_name}")
-            cmd = ["tofu", "apply", "-auto-approve", "-json"]
+            cmd = [self.tofu, "apply", "-auto-approve", "-json"]
             
             # Inject scenario specific vars
-            scenario_vars = self._extract_terraform_vars(scenario_config)
             for key, value in scenario_vars.items():
                 cmd.extend(["-var", f"{key}={value}"])
 
@@ -120,45 +254,54 @@ class Orchestrator:
             # instance-specific naming...
             cmd.extend(["-var", f"vm_name=att-{instance_id[:8]}"])
             
-            result = subprocess.run(
-                cmd,
-                cwd=work_dir,
-                capture_output=True,
-                text=True,
-                timeout=1800  # 30 min max
-            )
+            self._record(on_event, "apply")
+            applying = True
+            with timed(PHASE_SECONDS, phase="apply"):
+                returncode, progress = stream_apply(
+                    cmd,
+                    cwd=work_dir,
+                    env=self._tofu_env(),
+                    timeout=1800,  # 30 min max
+                    on_progress=on_progress,
+                    on_resources=(lambda finished: on_event(self._resource_entries(finished))) if on_event else None
+                )
             
-            if result.returncode != 0:
-                # Capture last 2000 chars of error for debugging
-                error_msg = result.stderr[-2000:] if result.stderr else "Unknown error"
+            if returncode != 0:
+                # Keep only the last error diagnostics for debugging
+                error_msg = progress.error_message()
                 logger.error(f"[{instance_id}] Apply failed: {error_msg}")
-                
-                # CLEANUP FAILED WORKSPACE
-                if work_dir.exists():
-                    shutil.rmtree(work_dir)
-                
-                return {
-                    "success": False, 
-                    "error": f"Terraform apply failed: {error_msg}"
-                }
+                return self._fail_applied(instance_id, f"Terraform apply failed: {error_msg}")
             
             logger.info(f"[{instance_id}] Deployment successful")
+            self._record(on_event, "output")
+            try:
+                with timed(PHASE_SECONDS, phase="output"):
+                    outputs = self._get_outputs(work_dir)
+            except (OSError, ValueError, subprocess.SubprocessError) as e:
+                # The lab exists but is unusable
+                logger.error(f"[{instance_id}] Could not read outputs: {e}")
+                return self._fail_applied(instance_id, f"Could not read outputs: {e}")
             return {
                 "success": True, 
-                "outputs": self._get_outputs(work_dir)
+                "outputs": outputs
             }
             
         except subprocess.TimeoutExpired:
             logger.error(f"[{instance_id}] Deployment timed out")
+            error = "Deployment timed out (exceeded 30 minutes)"
+            if applying:
+                return self._fail_applied(instance_id, error)
             if work_dir and work_dir.exists():
                 shutil.rmtree(work_dir)
             return {
                 "success": False,
-                "error": "Deployment timed out (exceeded 30 minutes)"
+                "error": error
             }
             
         except Exception as e:
             logger.error(f"[{instance_id}] Unexpected error: {str(e)}")
+            if applying:
+                return self._fail_applied(instance_id, str(e))
             if work_dir and work_dir.exists():
                 shutil.rmtree(work_dir)
             return {
@@ -166,8 +309,29 @@ class Orchestrator:
                 "error": str(e)
             }
 
+    def _fail_applied(self, instance_id: str, error: str):
+        """
+        Failure once `tofu apply` has started: part of the lab may exist, so
+        destroy it from the kept workspace (and state) before reporting the
+        deploy as failed, which gives its quota back to admission. If the
+        destroy fails the lab is reported as error_destroying and keeps
+        holding its quota until a retried destroy succeeds.
+        """
+        logger.info(f"[{instance_id}] Destroying what the failed deploy created")
+        destroyed = self.destroy(instance_id)
+        if not destroyed["success"]:
+            return {
+                "success": False,
+                "status": "error_destroying",
+                "error": f"{error}; destroy failed: {destroyed['error']}"
+            }
+        return {
+            "success": False,
+            "error": error
+        }
+
     def destroy(self, instance_id: str):
-        if self.mock_mode: 
+        if self.mock_mode and not self.simulated:
             logger.info(f"[{instance_id}] 🎭 SIMULATING DESTROY...")
             return {"success": True}
         
@@ -179,13 +343,15 @@ class Orchestrator:
         
         try:
             logger.info(f"[{instance_id}] Running terraform destroy...")
-            result = subprocess.run(
-                ["tofu", "destroy", "-auto-approve"],
-                cwd=work_dir,
-                capture_output=True,
-                text=True,
-                timeout=900  # 15 min
-            )
+            with timed(PHASE_SECONDS, phase="destroy"):
+                result = subprocess.run(
+                    [self.tofu, "destroy", "-auto-approve"],
+                    cwd=work_dir,
+                    capture_output=True,
+                    text=True,
+                    env=self._tofu_env(),
+                    timeout=900  # 15 min
+                )
             
             if result.returncode != 0:
                 logger.error(f"[{instance_id}] Destroy failed: {result.stderr}")
@@ -205,66 +371,39 @@ class Orchestrator:
             return {"success": False, "error": str(e)}
     
 
-    def _get_outputs(self, work_dir: Path):
+    def _get_outputs(self, work_dir: Path, redact: bool = False):
+        """
+        Outputs as `tofu output -json` prints them, read from the local state file.
+        tofu itself is only run for states the reader can't parse (e.g. encrypted ones).
+        """
         try:
-            res = subprocess.run(["tofu", "output", "-json"], cwd=work_dir, capture_output=True, text=True)
-            return json.loads(res.stdout)
-        except: return {}
+            return read_outputs(work_dir, redact=redact)
+        except StateError as e:
+            logger.warning(f"Reading outputs with tofu ({work_dir.name}: {e})")
+        res = subprocess.run([self.tofu, "output", "-json"], cwd=work_dir, capture_output=True, text=True,
+                             env=self._tofu_env(), check=True, timeout=120)
+        outputs = json.loads(res.stdout)
+        return redact_outputs(outputs) if redact else outputs
 
 
     def _load_scenario(self, scenario_name: str) -> dict:
-        """Load scenario YAML configuration"""
-        import yaml
-        
-        scenario_file = BASE_DIR.parent.parent / "services" / "scenario-orchestrator" / "templates" / f"{scenario_name}.yaml"
-        
-        if not scenario_file.exists():
-            logger.error(f"Scenario file not found: {scenario_file}")
-            return None
-        
-        try:
-            with open(scenario_file, 'r') as f:
-                return yaml.safe_load(f)
-        except Exception as e:
-            logger.error(f"Failed to load scenario {scenario_name}: {e}")
-            return None
+        """Scenario YAML configuration from the registry (None if missing or invalid)"""
+        scenario = get_registry().get(scenario_name)
+        return scenario.config if scenario else None
 
-    def _extract_terraform_vars(self, scenario_config: dict) -> dict:
-        """
-        Extract Terraform variables from scenario YAML
-        
-        Maps scenario.yaml values to terraform variables:
-        - vms[0].image → victim_image_name
-        - vms[1].image → image_name (attacker)
-        - vms[2].image → log_image_name (monitor)
-        """
-        vars = {}
-        
-        # Map VM definitions to Terraform variables
-        for vm in scenario_config.get('vms', []):
-            role = vm.get('role')
-            
-            if role == 'victim':
-                vars['victim_image_name'] = vm.get('image', 'mrrobot-fixed')
-                vars['victim_vm_name'] = vm.get('name', 'cyber_guard_victim')
-                if 'flavor' in vm:
-                    vars['flavor_name'] = vm['flavor']
-            
-            elif role == 'attacker':
-                vars['image_name'] = vm.get('image', 'kali-linux-2025-cloud')
-                vars['vm_name'] = vm.get('name', 'cyber_guard_attack')
-            
-            elif role == 'monitor':
-                vars['log_image_name'] = vm.get('image', 'ubuntu_cloud')
-                vars['log_vm_name'] = vm.get('name', 'cyber_guard_log')
-                if 'flavor' in vm:
-                    vars['soc_flavor_name'] = vm['flavor']
-        
-        # Network configuration
-        if 'network' in scenario_config:
-            net = scenario_config['network']
-            if 'cidr' in net:
-                vars['private_cidr'] = net['cidr']
-        
-        logger.info(f"Extracted Terraform vars: {vars}")
-        return vars
\ No newline at end of file
+    def lab_ttl_hours(self, scenario_name: str) -> float:
+        """Lifetime of a lab: the scenario's estimated_duration_hours, else LAB_TTL_HOURS (0 = never)"""
+        scenario_config = self._load_scenario(scenario_name) or {}
+        hours = (scenario_config.get('metadata') or {}).get('estimated_duration_hours')
+        return float(hours) if hours is not None else LAB_TTL_HOURS
+
+    def _resolve_images(self, scenario_vars: dict, scenario_config: dict, user_id: str = None):
+        """Replace placeholder images (e.g. `vulnhub-random`) with concrete catalog images"""
+        victim = next((vm for vm in scenario_config.get('vms', []) if vm.get('role') == 'victim'), {})
+        image = scenario_vars.get('victim_image_name')
+        if image and self.simulated:
+            # No Glance behind the simulator: the placeholder is as good as any image name
+            return
+        if image:
+            difficulty = victim.get('difficulty', scenario_config.get('difficulty'))
+            scenario_vars['victim_image_name'] = self.get_image_selector().resolve(image, difficulty, user_id)
@@ -0,0 +1,223 @@
+"""
+Scenario Registry - Parsed and validated scenario templates kept in memory
+Every `templates/*.yaml` is parsed and validated once, together with the
+Terraform variables derived from it. Afterwards a lookup only re-stats the
+directory (at most every SCENARIO_RELOAD_SECONDS) and re-parses the files
+whose mtime or size changed, so deploys and `GET /scenarios` never touch YAML.
+"""
+import ipaddress
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+from config import TEMPLATES_DIR, SCENARIO_RELOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("victim", "attacker", "monitor")
+SUFFIXES = (".yaml", ".yml")
+
+
+def terraform_vars(scenario_config: dict) -> dict:
+    """
+    Extract Terraform variables from scenario YAML
+
+    Maps scenario.yaml values to terraform variables:
+    - vms[role=victim].image → victim_image_name
+    - vms[role=attacker].image → image_name
+    - vms[role=monitor].image → log_image_name
+    """
+    vars = {}
+
+    # Map VM definitions to Terraform variables
+    for vm in scenario_config.get('vms', []):
+        role = vm.get('role')
+
+        if role == 'victim':
+            vars['victim_image_name'] = vm.get('image', 'mrrobot-fixed')
+            vars['victim_vm_name'] = vm.get('name', 'cyber_guard_victim')
+            if 'flavor' in vm:
+                vars['flavor_name'] = vm['flavor']
+
+        elif role == 'attacker':
+            vars['image_name'] = vm.get('image', 'kali-linux-2025-cloud')
+            vars['vm_name'] = vm.get('name', 'cyber_guard_attack')
+
+        elif role == 'monitor':
+            vars['log_image_name'] = vm.get('image', 'ubuntu_cloud')
+            vars['log_vm_name'] = vm.get('name', 'cyber_guard_log')
+            if 'flavor' in vm:
+                vars['soc_flavor_name'] = vm['flavor']
+
+    # Network configuration
+    if 'network' in scenario_config:
+        net = scenario_config['network']
+        if 'cidr' in net:
+            vars['private_cidr'] = net['cidr']
+
+    return vars
+
+
+def validate(scenario_config) -> List[str]:
+    """Problems that would make a deploy of this scenario fail (empty list = valid)"""
+    if not isinstance(scenario_config, dict):
+        return ["top level must be a mapping"]
+
+    errors = []
+    vms = scenario_config.get('vms')
+    if not isinstance(vms, list) or not vms:
+        errors.append("'vms' must be a non-empty list")
+        vms = []
+    roles = []
+    for i, vm in enumerate(vms):
+        if not isinstance(vm, dict):
+            errors.append(f"vms[{i}] must be a mapping")
+            continue
+        if vm.get('role') not in ROLES:
+            errors.append(f"vms[{i}].role must be one of {', '.join(ROLES)}")
+        roles.append(vm.get('role'))
+        if not vm.get('image'):
+            errors.append(f"vms[{i}].image is required")
+        for key in ('disk_gb', 'vcpus', 'ram_gb'):
+            if key in vm and (not isinstance(vm[key], (int, float)) or vm[key] <= 0):
+                errors.append(f"vms[{i}].{key} must be a positive number")
+    for role in set(roles):
+        if role in ROLES and roles.count(role) > 1:
+            errors.append(f"only one VM per role is supported ({role} appears {roles.count(role)} times)")
+
+    cidr = (scenario_config.get('network') or {}).get('cidr')
+    if cidr is not None:
+        try:
+            ipaddress.ip_network(cidr)
+        except ValueError:
+            errors.append(f"network.cidr '{cidr}' is not a valid network")
+
+    hours = (scenario_config.get('metadata') or {}).get('estimated_duration_hours')
+    if hours is not None and (not isinstance(hours, (int, float)) or hours < 0):
+        errors.append("metadata.estimated_duration_hours must be a non-negative number")
+    return errors
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str                     # File stem, used as the scenario id in deploy requests
+    path: Path
+    stamp: tuple                  # (mtime_ns, size) the entry was parsed from
+    config: dict                  # Parsed YAML: shared, never mutate
+    tf_vars: Dict[str, str] = field(default_factory=dict)
+
+    def summary(self) -> dict:
+        metadata = self.config.get('metadata') or {}
+        return {
+            "id": self.name,
+            "name": self.config.get('name', self.name),
+            "description": (self.config.get('description') or metadata.get('description') or "").strip(),
+            "difficulty": self.config.get('difficulty'),
+            "estimated_duration_hours": metadata.get('estimated_duration_hours'),
+            "tags": metadata.get('tags', []),
+            "vms": [{"name": vm.get('name'), "role": vm.get('role'), "image": vm.get('image')}
+                    for vm in self.config.get('vms', [])],
+        }
+
+
+class ScenarioRegistry:
+    """In-memory scenario templates, reloaded per file on change"""
+
+    def __init__(self, directory: Path = TEMPLATES_DIR, reload_seconds: float = SCENARIO_RELOAD_SECONDS):
+        self.directory = Path(directory)
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._scenarios: Dict[str, Scenario] = {}
+        self._errors: Dict[str, tuple] = {}       # name -> (stamp, message) for invalid templates
+        self._checked = None
+        self._summaries = None
+        self.version = 0
+
+    def _load(self, name: str, path: Path, stamp: tuple):
+        try:
+            with open(path, 'r') as f:
+                scenario_config = yaml.safe_load(f)
+            errors = validate(scenario_config)
+        except Exception as e:
+            errors = [f"cannot parse: {e}"]
+        if errors:
+            logger.error(f"Invalid scenario {name} ({path}): {'; '.join(errors)}")
+            self._scenarios.pop(name, None)
+            self._errors[name] = (stamp, "; ".join(errors))
+            return
+        self._errors.pop(name, None)
+        self._scenarios[name] = Scenario(name, path, stamp, scenario_config, terraform_vars(scenario_config))
+        logger.info(f"Loaded scenario {name}: {self._scenarios[name].tf_vars}")
+
+    def refresh(self, force: bool = False):
+        """Re-stat the templates (throttled) and re-parse only added or changed files"""
+        now = time.monotonic()
+        if not force and self._checked is not None and now - self._checked < self.reload_seconds:
+            return
+        with self._lock:
+            seen = {}
+            try:
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        if entry.is_file() and entry.name.endswith(SUFFIXES):
+                            st = entry.stat()
+                            seen[Path(entry.name).stem] = (Path(entry.path), (st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                logger.error(f"Scenario directory not found: {self.directory}")
+
+            changed = False
+            for name, (path, stamp) in seen.items():
+                known = self._scenarios.get(name)
+                if (known and known.stamp == stamp) or self._errors.get(name, (None,))[0] == stamp:
+                    continue
+                self._load(name, path, stamp)
+                changed = True
+            for name in (set(self._scenarios) | set(self._errors)) - set(seen):
+                self._scenarios.pop(name, None)
+                self._errors.pop(name, None)
+                changed = True
+
+            if changed:
+                self.version += 1
+                self._summaries = None
+            self._checked = now
+
+    def get(self, name: str) -> Optional[Scenario]:
+        self.refresh()
+        return self._scenarios.get(name)
+
+    def error(self, name: str) -> Optional[str]:
+        """Why a template was rejected (None if it is valid or unknown)"""
+        entry = self._errors.get(name)
+        return entry[1] if entry else None
+
+    def summaries(self) -> dict:
+        """`GET /scenarios` body, rebuilt only when a template changed"""
+        self.refresh()
+        summaries = self._summaries
+        if summaries is None:
+            with self._lock:
+                summaries = self._summaries = {
+                    "scenarios": [self._scenarios[n].summary() for n in sorted(self._scenarios)],
+                    "invalid": {n: self._errors[n][1] for n in sorted(self._errors)},
+                }
+        return summaries
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ScenarioRegistry:
+    """Process-wide registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ScenarioRegistry()
+        return _registry
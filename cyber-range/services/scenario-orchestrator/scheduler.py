@@ -0,0 +1,210 @@
+"""
+Admission Scheduler - Quota-aware gate between deploy requests and Celery
+Every lab reserves what its scenario needs (instances, cores, RAM, boot
+volumes, gigabytes, floating IPs) from the scenario YAML. Deploys that would
+not fit the project quota are held as `queued` instead of failing minutes
+into `tofu apply`, and are released in arrival order as destroys (or failed
+deploys) give the capacity back.
+"""
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import QUOTA_SOURCE, QUOTA_LIMITS, QUOTA_FLAVORS, QUOTA_REFRESH_SECONDS, OS_PROJECT_ID
+from scenario_registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ("instances", "cores", "ram_mb", "volumes", "gigabytes", "floating_ips")
+
+# Statuses whose labs hold (or are about to hold) cloud resources
+HOLDING_STATUSES = ("pending", "deploying", "active", "destroying", "error_destroying")
+
+# Sizes of common flavors, used when a scenario names a flavor instead of vcpus/ram_gb
+DEFAULT_FLAVORS = {
+    "m1.tiny": {"vcpus": 1, "ram_mb": 512},
+    "m1.small": {"vcpus": 1, "ram_mb": 2048},
+    "m1.medium": {"vcpus": 2, "ram_mb": 4096},
+    "m1.large": {"vcpus": 4, "ram_mb": 8192},
+    "m1.xlarge": {"vcpus": 8, "ram_mb": 16384},
+    "t3.small": {"vcpus": 2, "ram_mb": 2048},
+    "t3.medium": {"vcpus": 2, "ram_mb": 4096},
+    "t3.large": {"vcpus": 2, "ram_mb": 8192},
+}
+
+
+class QuotaExceeded(ValueError):
+    """A single lab of this scenario needs more than the whole quota"""
+
+
+def _json_setting(name: str, value: str) -> dict:
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError as e:
+        logger.error(f"Ignoring invalid {name}: {e}")
+        return {}
+
+
+class StaticQuotaSource:
+    """Local stand-in for the cloud: limits and flavor sizes from QUOTA_LIMITS / QUOTA_FLAVORS"""
+
+    def __init__(self, limits: Dict[str, int] = None, flavors: Dict[str, dict] = None):
+        self._limits = limits if limits is not None else _json_setting("QUOTA_LIMITS", QUOTA_LIMITS)
+        self._flavors = {**DEFAULT_FLAVORS, **(flavors if flavors is not None else
+                                               _json_setting("QUOTA_FLAVORS", QUOTA_FLAVORS))}
+
+    def limits(self) -> Dict[str, int]:
+        """resource -> maximum; resources left out are unlimited"""
+        return {k: int(v) for k, v in self._limits.items() if k in RESOURCES and v is not None and int(v) >= 0}
+
+    def flavor(self, name: str) -> Optional[dict]:
+        return self._flavors.get(name)
+
+
+class OpenStackQuotaSource(StaticQuotaSource):
+    """
+    Project quotas from Nova, Cinder and Neutron (cached for QUOTA_REFRESH_SECONDS).
+    QUOTA_LIMITS still applies as a cap, e.g. to leave room for non-range servers.
+    """
+
+    def __init__(self, conn, ttl: int = QUOTA_REFRESH_SECONDS):
+        super().__init__()
+        self.conn = conn
+        self.ttl = ttl
+        self._cached: Optional[Dict[str, int]] = None
+        self._fetched = 0.0
+
+    def _fetch(self) -> Dict[str, int]:
+        limits = {}
+        try:
+            absolute = self.conn.compute.get_limits().absolute
+            limits.update(instances=absolute.instances, cores=absolute.total_cores, ram_mb=absolute.total_ram)
+        except Exception as e:
+            logger.warning(f"Could not read compute limits: {e}")
+        try:
+            quota = self.conn.block_storage.get_quota_set(OS_PROJECT_ID)
+            limits.update(volumes=quota.volumes, gigabytes=quota.gigabytes)
+        except Exception as e:
+            logger.warning(f"Could not read block storage quota: {e}")
+        try:
+            limits["floating_ips"] = self.conn.network.get_quota(OS_PROJECT_ID).floating_ips
+        except Exception as e:
+            logger.warning(f"Could not read network quota: {e}")
+        # -1 means unlimited in every OpenStack service
+        return {k: int(v) for k, v in limits.items() if v is not None and int(v) >= 0}
+
+    def limits(self) -> Dict[str, int]:
+        if self._cached is None or time.monotonic() - self._fetched > self.ttl:
+            self._cached, self._fetched = self._fetch(), time.monotonic()
+        limits = dict(self._cached)
+        for name, cap in super().limits().items():
+            limits[name] = min(cap, limits.get(name, cap))
+        return limits
+
+    def flavor(self, name: str) -> Optional[dict]:
+        known = super().flavor(name)
+        if known:
+            return known
+        try:
+            found = self.conn.compute.find_flavor(name)
+        except Exception as e:
+            logger.warning(f"Could not look up flavor {name}: {e}")
+            return None
+        if found is None:
+            return None
+        self._flavors[name] = {"vcpus": found.vcpus, "ram_mb": found.ram}
+        return self._flavors[name]
+
+
+def get_quota_source():
+    """Quota source selected by QUOTA_SOURCE (falls back to the static one)"""
+    if QUOTA_SOURCE == "openstack":
+        from image_selector import ImageSelector
+        conn = ImageSelector._connect()
+        if conn is not None:
+            return OpenStackQuotaSource(conn)
+        logger.warning("QUOTA_SOURCE=openstack but no OpenStack connection, using QUOTA_LIMITS")
+    return StaticQuotaSource()
+
+
+def scenario_demand(scenario_config: dict, flavor: Callable[[str], Optional[dict]]) -> Dict[str, int]:
+    """Resources one lab of this scenario reserves"""
+    demand = dict.fromkeys(RESOURCES, 0)
+    for vm in scenario_config.get("vms", []):
+        demand["instances"] += 1
+        size = flavor(vm["flavor"]) if vm.get("flavor") else None
+        if vm.get("flavor") and size is None:
+            logger.warning(f"Unknown flavor {vm['flavor']} for {vm.get('name')}: cores/RAM not counted "
+                           f"(add it to QUOTA_FLAVORS)")
+        size = size or {}
+        demand["cores"] += int(vm.get("vcpus", size.get("vcpus", 0)))
+        demand["ram_mb"] += int(vm["ram_gb"] * 1024) if "ram_gb" in vm else int(size.get("ram_mb", 0))
+        # Each VM boots from its own volume and gets a floating IP (infra/terraform/compute.tf)
+        demand["volumes"] += 1
+        demand["gigabytes"] += int(vm.get("disk_gb", 0))
+        demand["floating_ips"] += 1 if vm.get("public_ip", True) else 0
+    return demand
+
+
+class AdmissionScheduler:
+    """Reserves capacity per lab and holds deploys that would not fit"""
+
+    def __init__(self, db=None, source=None, registry=None):
+        if db is None:
+            from database import Database
+            db = Database()
+        self.db = db
+        self.source = source or get_quota_source()
+        self.registry = registry or get_registry()
+        self._demand: Dict[str, tuple] = {}      # name -> (template stamp, demand)
+
+    def demand(self, scenario: str) -> Dict[str, int]:
+        """Per-lab demand of a scenario (unknown scenarios reserve nothing and fail in the worker)"""
+        entry = self.registry.get(scenario)
+        if entry is None:
+            return {}
+        cached = self._demand.get(scenario)
+        if cached is None or cached[0] != entry.stamp:
+            cached = self._demand[scenario] = (entry.stamp, scenario_demand(entry.config, self.source.flavor))
+        return cached[1]
+
+    def request(self, scenario: str, variables: dict, priority: int, ttl_hours: float = None) -> dict:
+        """
+        What is stored with a queued lab so it can be dispatched later.
+        Raises QuotaExceeded if the lab could never fit, even with nothing else running.
+        """
+        resources = self.demand(scenario)
+        limits = self.source.limits()
+        too_big = {name: f"{amount}/{limits[name]}" for name, amount in resources.items()
+                   if name in limits and amount > limits[name]}
+        if too_big:
+            raise QuotaExceeded(f"Scenario '{scenario}' needs more than the project quota: {too_big}")
+        return {"resources": resources, "variables": variables, "priority": priority, "ttl_hours": ttl_hours}
+
+    def admit(self) -> List[dict]:
+        """Move queued labs that now fit to pending; returns them for dispatch"""
+        admitted = self.db.admit_queued(self.source.limits(), HOLDING_STATUSES)
+        if admitted:
+            logger.info(f"Admitted {len(admitted)} queued deployment(s)")
+        return admitted
+
+    def snapshot(self) -> dict:
+        reserved, queued = self.db.reserved_resources(HOLDING_STATUSES)
+        return {"limits": self.source.limits(), "reserved": reserved, "queued": queued}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> AdmissionScheduler:
+    """Process-wide scheduler (quota and flavor lookups are cached on it)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AdmissionScheduler()
+        return _scheduler
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Simulated tofu - Stand-in `tofu` executable for MOCK_MODE
+Implements the subset of the CLI the orchestrator uses (init, apply -json,
+output -json, destroy) against the real workspace: the resource graph is read
+from the workspace's .tf files, every resource takes a latency drawn from a
+per-type log-normal distribution, resources run in dependency order with
+tofu's parallelism, and a version 4 terraform.tfstate is written. The
+workspace pool, init cache, apply streaming and output code therefore run
+exactly as in production, only without a cloud.
+
+Tuned through the environment (inherited from the worker):
+  SIM_TIME_SCALE            wall-clock seconds per simulated second (default 0.1)
+  SIM_LATENCY               JSON overrides, {"<resource type>|init|output": [median, p95]}
+  SIM_FAILURE_RATE          probability that an apply fails on a resource (default 0)
+  SIM_TIMEOUT_RATE          probability that an apply hangs until it is killed (default 0)
+  SIM_DESTROY_FAILURE_RATE  probability that a destroy fails (default 0)
+  SIM_SEED                  reproducible runs (seeded per workspace and command)
+"""
+import heapq
+import ipaddress
+import itertools
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+VERSION = "1.6.0"
+
+# (median, p95) seconds per operation, roughly what a mid-size OpenStack cloud shows
+LATENCY = {
+    "init": (8.0, 20.0),
+    "output": (0.3, 0.8),
+    "openstack_compute_instance_v2": (45.0, 120.0),
+    "openstack_compute_keypair_v2": (1.0, 2.0),
+    "openstack_networking_network_v2": (2.0, 5.0),
+    "openstack_networking_subnet_v2": (2.5, 6.0),
+    "openstack_networking_router_v2": (4.0, 10.0),
+    "openstack_networking_router_interface_v2": (5.0, 12.0),
+    "openstack_networking_port_v2": (2.0, 5.0),
+    "openstack_networking_secgroup_v2": (1.0, 3.0),
+    "openstack_networking_secgroup_rule_v2": (0.5, 2.0),
+    "openstack_networking_floatingip_v2": (3.0, 8.0),
+    "openstack_networking_floatingip_associate_v2": (3.0, 8.0),
+    "*": (0.2, 0.5),                    # Local resources (tls, local files)
+}
+DESTROY_FACTOR = 0.5                    # Deletes are faster than creates
+PROGRESS_EVERY = 10.0                   # Simulated seconds between "Still creating..." events
+PARALLELISM = 10
+FLOATING_NET = ipaddress.ip_network("172.24.4.0/24")
+
+# Resources whose failures are realistic, with the error OpenStack would return
+FAILURES = {
+    "openstack_compute_instance_v2": ("Error creating OpenStack server",
+                                      "No valid host was found. There are not enough hosts available."),
+    "openstack_networking_floatingip_v2": ("Error creating openstack_networking_floatingip_v2",
+                                           "Quota exceeded for resources: ['floatingip']."),
+}
+
+BLOCK_RE = re.compile(r'^(resource|output|variable)\s+"([^"]+)"(?:\s+"([^"]+)")?\s*\{', re.M)
+REF_RE = re.compile(r'\b([a-z][a-z0-9_]*)\.([a-z0-9_]+)\b')
+INTERP_RE = re.compile(r'\$\{([^}]*)\}')
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).astimezone().isoformat(timespec="microseconds")
+
+
+def _emit(event_type: str, message: str, level: str = "info", **fields):
+    print(json.dumps({"@level": level, "@message": message, "@module": "tofu.ui",
+                      "@timestamp": _now(), "type": event_type, **fields}), flush=True)
+
+
+# --- CONFIGURATION (an HCL subset: enough for the block structure and simple expressions) ---
+
+def _matching_brace(text: str, start: int) -> int:
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == "{":
+            depth += 1
+        elif text[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(text)
+
+
+class Workspace:
+    """Resources, outputs and variables declared by the .tf files of a workspace"""
+
+    def __init__(self, cwd: Path, cli_vars: dict):
+        self.resources, self.outputs, self.defaults = {}, {}, {}
+        for path in sorted(cwd.glob("*.tf")):
+            text = re.sub(r'(?m)^\s*(#|//).*$', "", path.read_text(errors="replace"))
+            for m in BLOCK_RE.finditer(text):
+                brace = m.end() - 1
+                body = text[brace + 1:_matching_brace(text, brace)]
+                kind, first, second = m.groups()
+                if kind == "resource":
+                    self.resources[f"{first}.{second}"] = {"type": first, "name": second, "body": body}
+                elif kind == "output":
+                    self.outputs[first] = body
+                else:
+                    default = re.search(r'^\s*default\s*=\s*"([^"]*)"', body, re.M)
+                    if default:
+                        self.defaults[first] = default.group(1)
+        self.vars = {**self.defaults, **cli_vars}
+        for addr, res in self.resources.items():
+            res["deps"] = {f"{t}.{n}" for t, n in REF_RE.findall(res["body"])
+                           if f"{t}.{n}" in self.resources and f"{t}.{n}" != addr}
+
+    # Expressions: string literals with ${} interpolation, var.x, resource.attr[i], maps, heredocs
+
+    def ref(self, expr: str, attrs: dict):
+        expr = expr.strip()
+        m = re.fullmatch(r'var\.([a-z0-9_]+)', expr)
+        if m:
+            return self.vars.get(m.group(1), "")
+        m = re.fullmatch(r'([a-z0-9_]+\.[a-z0-9_]+)\.([a-z0-9_]+)(?:\[(\d+)\])?', expr)
+        if m and m.group(1) in attrs:
+            value = attrs[m.group(1)].get(m.group(2))
+            if m.group(3) is not None and isinstance(value, list):
+                value = value[int(m.group(3))] if int(m.group(3)) < len(value) else None
+            if value is not None:
+                return value
+        return f"(simulated {expr})"
+
+    def interpolate(self, text: str, attrs: dict) -> str:
+        return INTERP_RE.sub(lambda m: str(self.ref(m.group(1), attrs)), text)
+
+    def evaluate(self, expr: str, attrs: dict):
+        expr = expr.strip()
+        if expr.startswith("<<"):
+            m = re.match(r'<<-?(\w+)\n(.*?)\n\s*\1\s*$', expr, re.S)
+            return self.interpolate(m.group(2) if m else "", attrs)
+        if expr.startswith('"'):
+            m = re.match(r'"((?:[^"\\]|\\.)*)"', expr)
+            return self.interpolate(m.group(1) if m else "", attrs)
+        if expr.startswith("{"):
+            return {k: self.evaluate(v, attrs)
+                    for k, v in re.findall(r'^\s*([A-Za-z0-9_]+)\s*=\s*(.+?)\s*$', expr[1:-1], re.M)}
+        return self.ref(expr, attrs)
+
+    @staticmethod
+    def attribute(body: str, key: str):
+        """Raw expression assigned to a top-level attribute (heredocs and maps included)"""
+        m = re.search(rf'^\s*{key}\s*=\s*', body, re.M)
+        if not m:
+            return None
+        rest = body[m.end():]
+        if rest.startswith("<<"):
+            tag = re.match(r'<<-?(\w+)', rest).group(1)
+            end = re.search(rf'\n\s*{tag}\s*$', rest, re.M)
+            return rest[:end.end()] if end else rest
+        if rest.startswith("{"):
+            return rest[:_matching_brace(rest, 0) + 1]
+        return rest.split("\n", 1)[0]
+
+
+# --- STATE ---
+
+def _load_state(cwd: Path) -> dict:
+    try:
+        return json.loads((cwd / "terraform.tfstate").read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(cwd: Path, previous: dict, resources: dict, outputs: dict):
+    path = cwd / "terraform.tfstate"
+    if path.exists():
+        path.replace(cwd / "terraform.tfstate.backup")
+    state = {
+        "version": 4,
+        "terraform_version": VERSION,
+        "serial": previous.get("serial", 0) + 1,
+        "lineage": previous.get("lineage") or str(uuid.uuid4()),
+        "outputs": outputs,
+        "resources": [
+            {
+                "mode": "managed",
+                "type": addr.split(".")[0],
+                "name": addr.split(".")[1],
+                "provider": f'provider["registry.opentofu.org/{_provider(addr)}"]',
+                "instances": [{"schema_version": 0, "attributes": attrs, "sensitive_attributes": []}],
+            }
+            for addr, attrs in resources.items()
+        ],
+        "check_results": None,
+    }
+    tmp = cwd / f".terraform.tfstate.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, path)
+
+
+def _provider(addr: str) -> str:
+    prefix = addr.split("_")[0]
+    return {"openstack": "terraform-provider-openstack/openstack"}.get(prefix, f"hashicorp/{prefix}")
+
+
+def _state_resources(state: dict) -> dict:
+    return {f"{r['type']}.{r['name']}": r["instances"][0]["attributes"]
+            for r in state.get("resources", []) if r.get("mode") == "managed" and r.get("instances")}
+
+
+# --- SIMULATION ---
+
+class Simulator:
+    def __init__(self, cwd: Path, command: str):
+        self.cwd = cwd
+        seed = os.getenv("SIM_SEED")
+        self.rng = random.Random(f"{seed}:{cwd.name}:{command}") if seed else random.Random()
+        self.scale = max(_env_float("SIM_TIME_SCALE", 0.1), 0.0)
+        self.latency = dict(LATENCY)
+        try:
+            self.latency.update({k: tuple(v) for k, v in json.loads(os.getenv("SIM_LATENCY") or "{}").items()})
+        except (ValueError, TypeError):
+            print("Warning: ignoring invalid SIM_LATENCY", file=sys.stderr)
+
+    def sample(self, kind: str) -> float:
+        """Simulated seconds for one operation (log-normal through the median and p95)"""
+        median, p95 = self.latency.get(kind, self.latency["*"])
+        sigma = math.log(max(p95, median) / median) / 1.645 if median > 0 else 0
+        return median * math.exp(self.rng.gauss(0, sigma)) if median > 0 else 0.0
+
+    def sleep_until(self, started: float, sim_seconds: float):
+        delay = started + sim_seconds * self.scale - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def schedule(deps: dict, durations: dict, parallelism: int) -> dict:
+        """addr -> (start, end): dependency order, at most `parallelism` at a time"""
+        timeline, done, running = {}, set(), []
+        pending = set(durations)
+        now = 0.0
+        while pending or running:
+            ready = sorted(a for a in pending if deps[a] & set(durations) <= done)
+            if not ready and not running:
+                ready = sorted(pending)         # Dependency cycle: tofu would refuse, just run them
+            for addr in ready[:parallelism - len(running)]:
+                pending.discard(addr)
+                timeline[addr] = (now, now + durations[addr])
+                heapq.heappush(running, (now + durations[addr], addr))
+            end, addr = heapq.heappop(running)
+            now = end
+            done.add(addr)
+        return timeline
+
+
+def _allocate(network, used: set, rng: random.Random = None, first: int = 10) -> str:
+    """Next free host from `first` on (DHCP-like), or a random free one when rng is given"""
+    hosts = [str(h) for h in itertools.islice(network.hosts(), first - 1, first + 4096)]
+    free = [h for h in hosts if h not in used] or hosts
+    ip = rng.choice(free) if rng else free[0]
+    used.add(ip)
+    return ip
+
+
+def _attributes(ws: Workspace, addr: str, attrs: dict, used_ips: set, rng: random.Random) -> dict:
+    """Plausible provider attributes for a newly created resource"""
+    res = ws.resources[addr]
+    name = ws.attribute(res["body"], "name")
+    out = {"id": str(uuid.UUID(int=rng.getrandbits(128))),
+           "name": ws.evaluate(name, attrs) if name else res["name"]}
+    subnet = next((d for d in sorted(res["deps"]) if d.startswith("openstack_networking_subnet_v2.")), None)
+    if res["type"] == "openstack_networking_subnet_v2":
+        cidr = ws.attribute(res["body"], "cidr")
+        out["cidr"] = ws.evaluate(cidr, attrs) if cidr else "192.168.0.0/24"
+    elif res["type"] == "openstack_networking_port_v2":
+        try:
+            network = ipaddress.ip_network(attrs.get(subnet, {}).get("cidr") or ws.vars.get("private_cidr", "192.168.0.0/24"))
+        except ValueError:
+            network = ipaddress.ip_network("192.168.0.0/24")
+        out["all_fixed_ips"] = [_allocate(network, used_ips)]
+    elif res["type"] == "openstack_compute_instance_v2":
+        port = next((d for d in sorted(res["deps"]) if d.startswith("openstack_networking_port_v2.")), None)
+        out["access_ip_v4"] = (attrs.get(port, {}).get("all_fixed_ips") or [""])[0]
+        out["power_state"] = "active"
+    elif res["type"] == "openstack_networking_floatingip_v2":
+        out["address"] = _allocate(FLOATING_NET, used_ips, rng, first=2)
+    return out
+
+
+def _resource_json(addr: str) -> dict:
+    rtype, rname = addr.split(".", 1)
+    return {"addr": addr, "module": "", "resource": addr, "implied_provider": rtype.split("_")[0],
+            "resource_type": rtype, "resource_name": rname, "resource_key": None}
+
+
+def cmd_init(cwd: Path, args: list) -> int:
+    sim = Simulator(cwd, "init")
+    started = time.monotonic()
+    print("Initializing the backend...\nInitializing provider plugins...", flush=True)
+    sim.sleep_until(started, sim.sample("init"))
+    plugin_cache = os.getenv("TF_PLUGIN_CACHE_DIR")
+    for provider in ("terraform-provider-openstack/openstack", "hashicorp/tls", "hashicorp/local"):
+        rel = Path("registry.opentofu.org") / provider / "0.0.0-sim" / "linux_amd64"
+        target = cwd / ".terraform" / "providers" / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if plugin_cache:
+            # Like the real thing: the binary lives in the plugin cache, the workspace links to it
+            cached = Path(plugin_cache) / rel
+            cached.mkdir(parents=True, exist_ok=True)
+            (cached / f"terraform-provider-{provider.split('/')[1]}").write_text("simulated provider\n")
+            if not target.exists():
+                target.symlink_to(cached, target_is_directory=True)
+        else:
+            target.mkdir(parents=True, exist_ok=True)
+            (target / f"terraform-provider-{provider.split('/')[1]}").write_text("simulated provider\n")
+    lock = cwd / ".terraform.lock.hcl"
+    if not lock.exists():
+        lock.write_text("# Simulated dependency lock file\n")
+    print("\nOpenTofu has been successfully initialized!", flush=True)
+    return 0
+
+
+def _parse_vars(args: list) -> dict:
+    values, it = {}, iter(args)
+    for arg in it:
+        if arg == "-var":
+            arg = "-var=" + next(it, "")
+        if arg.startswith("-var="):
+            key, _, value = arg[5:].partition("=")
+            values[key] = value
+    return values
+
+
+def _parallelism(args: list) -> int:
+    for arg in args:
+        if arg.startswith("-parallelism="):
+            return max(1, int(arg.split("=", 1)[1]))
+    return PARALLELISM
+
+
+def _outputs(ws: Workspace, attrs: dict) -> dict:
+    outputs = {}
+    for name, body in ws.outputs.items():
+        expr = ws.attribute(body, "value")
+        value = ws.evaluate(expr, attrs) if expr else None
+        outputs[name] = {
+            "value": value,
+            "type": ["object", {k: "string" for k in value}] if isinstance(value, dict) else "string",
+            "sensitive": bool(re.search(r'^\s*sensitive\s*=\s*true', body, re.M)),
+        }
+    return outputs
+
+
+def cmd_apply(cwd: Path, args: list) -> int:
+    sim = Simulator(cwd, "apply")
+    ws = Workspace(cwd, _parse_vars(args))
+    state = _load_state(cwd)
+    previous = _state_resources(state)
+    attrs = dict(previous)
+    todo = [a for a in ws.resources if a not in previous]     # Resumed applies only create what's missing
+
+    started = time.monotonic()
+    _emit("version", f"OpenTofu {VERSION}", terraform=VERSION, ui="1.2")
+    for addr in todo:
+        _emit("planned_change", f"{addr}: Plan to create",
+              change={"resource": _resource_json(addr), "action": "create"})
+    _emit("change_summary", f"Plan: {len(todo)} to add, 0 to change, 0 to destroy.",
+          changes={"add": len(todo), "change": 0, "import": 0, "remove": 0, "operation": "plan"})
+
+    durations = {a: sim.sample(ws.resources[a]["type"]) for a in todo}
+    timeline = sim.schedule({a: ws.resources[a]["deps"] for a in todo}, durations, _parallelism(args))
+
+    # Failure injection: one resource errors (in-flight ones still finish, nothing new starts)
+    fail_at, hang_at, culprit = math.inf, math.inf, None
+    candidates = sorted(a for a in todo if ws.resources[a]["type"] in FAILURES) or sorted(todo)
+    if candidates and sim.rng.random() < _env_float("SIM_TIMEOUT_RATE", 0):
+        culprit = sim.rng.choice(candidates)
+        hang_at = timeline[culprit][0]
+    elif candidates and sim.rng.random() < _env_float("SIM_FAILURE_RATE", 0):
+        culprit = sim.rng.choice(candidates)
+        fail_at = timeline[culprit][1]
+
+    events = []
+    for addr, (start, end) in timeline.items():
+        if addr != culprit and start >= min(fail_at, hang_at):
+            continue
+        events.append((start, 0, "start", addr))
+        if addr == culprit and hang_at < math.inf:
+            continue
+        ticks = int((end - start) // PROGRESS_EVERY)
+        events.extend((start + PROGRESS_EVERY * i, 1, "progress", addr) for i in range(1, ticks + 1))
+        events.append((end, 2, "error" if addr == culprit else "complete", addr))
+    events.sort()
+
+    used_ips = {v for a in attrs.values() for v in (a.get("all_fixed_ips") or []) + [a.get("address")] if v}
+    created = {}
+    for at, _, kind, addr in events:
+        sim.sleep_until(started, at)
+        resource, rtype = _resource_json(addr), ws.resources[addr]["type"]
+        elapsed = round((at - timeline[addr][0]) * sim.scale)
+        if kind == "start":
+            _emit("apply_start", f"{addr}: Creating...", hook={"resource": resource, "action": "create"})
+        elif kind == "progress":
+            _emit("apply_progress", f"{addr}: Still creating... [{elapsed}s elapsed]",
+                  hook={"resource": resource, "action": "create", "elapsed_seconds": elapsed})
+        elif kind == "complete":
+            attrs[addr] = created[addr] = _attributes(ws, addr, attrs, used_ips, sim.rng)
+            _emit("apply_complete", f"{addr}: Creation complete after {elapsed}s [id={attrs[addr]['id']}]",
+                  hook={"resource": resource, "action": "create", "id_key": "id",
+                        "id_value": attrs[addr]["id"], "elapsed_seconds": elapsed})
+        else:
+            summary, detail = FAILURES.get(rtype, (f"Error creating {rtype}", "Simulated provider error"))
+            _emit("apply_errored", f"{addr}: Creation errored after {elapsed}s", level="error",
+                  hook={"resource": resource, "action": "create", "elapsed_seconds": elapsed})
+            _emit("diagnostic", f"Error: {summary}", level="error",
+                  diagnostic={"severity": "error", "summary": summary, "detail": detail, "address": addr})
+
+    if hang_at < math.inf:
+        # Stuck on the culprit (e.g. a server that never leaves BUILD) until the caller kills us
+        _save_state(cwd, state, attrs, state.get("outputs", {}))
+        elapsed = 0
+        while True:
+            time.sleep(max(PROGRESS_EVERY * sim.scale, 0.05))
+            elapsed += PROGRESS_EVERY
+            _emit("apply_progress", f"{culprit}: Still creating... [{int(elapsed * sim.scale)}s elapsed]",
+                  hook={"resource": _resource_json(culprit), "action": "create",
+                        "elapsed_seconds": int(elapsed * sim.scale)})
+
+    failed = fail_at < math.inf
+    outputs = state.get("outputs", {}) if failed else _outputs(ws, attrs)
+    _save_state(cwd, state, attrs, outputs)
+    if failed:
+        return 1
+    _emit("change_summary", f"Apply complete! Resources: {len(created)} added, 0 changed, 0 destroyed.",
+          changes={"add": len(created), "change": 0, "import": 0, "remove": 0, "operation": "apply"})
+    _emit("outputs", "Outputs: " + str(len(outputs)),
+          outputs={k: {kk: vv for kk, vv in v.items() if not (kk == "value" and v["sensitive"])}
+                   for k, v in outputs.items()})
+    return 0
+
+
+def cmd_output(cwd: Path, args: list) -> int:
+    sim = Simulator(cwd, "output")
+    started = time.monotonic()
+    sim.sleep_until(started, sim.sample("output"))
+    outputs = _load_state(cwd).get("outputs", {})
+    if "-json" in args:
+        print(json.dumps({k: {"sensitive": v.get("sensitive", False), "type": v.get("type", "string"),
+                              "value": v.get("value")} for k, v in outputs.items()}, indent=2))
+    else:
+        for name, out in sorted(outputs.items()):
+            print(f"{name} = {'<sensitive>' if out.get('sensitive') else json.dumps(out.get('value'))}")
+    return 0
+
+
+def cmd_destroy(cwd: Path, args: list) -> int:
+    sim = Simulator(cwd, "destroy")
+    state = _load_state(cwd)
+    attrs = _state_resources(state)
+    if not attrs:
+        print("No changes. No objects need to be destroyed.", flush=True)
+        return 0
+
+    ws = Workspace(cwd, _parse_vars(args))
+    # Reverse dependencies: a resource goes once everything that uses it is gone
+    deps = {a: {b for b in attrs if a in ws.resources.get(b, {}).get("deps", ())} for a in attrs}
+    durations = {a: sim.sample(a.split(".")[0]) * DESTROY_FACTOR for a in attrs}
+    timeline = sim.schedule(deps, durations, _parallelism(args))
+
+    fail = None
+    if sim.rng.random() < _env_float("SIM_DESTROY_FAILURE_RATE", 0):
+        fail = sim.rng.choice(sorted(a for a in attrs if a.startswith("openstack_networking")) or sorted(attrs))
+
+    started = time.monotonic()
+    remaining = dict(attrs)
+    for at, kind, addr in sorted([(s, 0, a) for a, (s, e) in timeline.items()] +
+                                 [(e, 1, a) for a, (s, e) in timeline.items()]):
+        if fail and at > timeline[fail][1]:
+            break
+        sim.sleep_until(started, at)
+        if kind == 0:
+            print(f"{addr}: Destroying... [id={attrs[addr]['id']}]", flush=True)
+        elif addr == fail:
+            print(f"\nError: Error deleting {addr}: Conflict: resource is still in use", file=sys.stderr, flush=True)
+        else:
+            remaining.pop(addr)
+            print(f"{addr}: Destruction complete after {round(durations[addr] * sim.scale)}s", flush=True)
+
+    _save_state(cwd, state, remaining, {} if not remaining else state.get("outputs", {}))
+    if fail:
+        return 1
+    print(f"\nDestroy complete! Resources: {len(attrs)} destroyed.", flush=True)
+    return 0
+
+
+COMMANDS = {"init": cmd_init, "apply": cmd_apply, "output": cmd_output, "destroy": cmd_destroy}
+
+
+def main(argv: list) -> int:
+    if not argv or argv[0] in ("version", "-version", "--version"):
+        print(f"OpenTofu v{VERSION} (simulated)")
+        return 0
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(f"sim_tofu: unsupported command '{argv[0]}'", file=sys.stderr)
+        return 1
+    return command(Path.cwd(), argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
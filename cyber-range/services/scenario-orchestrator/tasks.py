@@ -1,8 +1,19 @@
 import os
+import json
 import logging
-from celery import Celery
+import time
+from datetime import datetime, timedelta
+from celery import Celery, group
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, task_prerun, task_postrun
+from config import (
+    WORKER_CONCURRENCY, CELERY_VISIBILITY_TIMEOUT,
+    REAPER_INTERVAL_SECONDS, REAPER_BATCH_SIZE
+)
 from database import Database
 from orchestrator import Orchestrator
+from scheduler import get_scheduler
+import events
+import metrics
 
 # Broker Configuration
 # Connects to Redis running on localhost by default
@@ -11,22 +22,151 @@ REDIS_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 # Initialize Celery app
 app = Celery('cyberguard', broker=REDIS_URL, backend=REDIS_URL)
 
+# Queues: 30-minute deploys must never starve destroys (which free cloud
+# capacity), so each kind of work has its own queue and worker pool:
+#   celery -A tasks worker -Q deploy --concurrency=$WORKER_CONCURRENCY
+#   celery -A tasks worker -Q destroy --concurrency=$DESTROY_CONCURRENCY
+# The size has to be given on the command line: Celery resolves --concurrency
+# (defaulting to worker_concurrency below) before any worker signal fires.
+
+# Priorities within a queue (Redis: 0 is served first)
+PRIORITY_INTERACTIVE = 0    # A single lab requested from the UI/API
+PRIORITY_BATCH = 6          # Labs of a class-wide batch
+
 # Celery Optimization Settings
 app.conf.update(
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
     task_track_started=True, # Allows tracking "started" state in addition to "pending/success"
-    worker_concurrency=4,    # Number of concurrent worker threads (CPU)
+    worker_concurrency=WORKER_CONCURRENCY,  # Default when --concurrency is not given
+    task_routes={
+        'deploy_lab': {'queue': 'deploy'},
+        'destroy_lab': {'queue': 'destroy'},
+        'reap_expired_labs': {'queue': 'destroy'},
+        'import_*': {'queue': 'import'},
+    },
+    task_default_queue='deploy',
+    task_default_priority=PRIORITY_BATCH,
+    # Long tasks: take one at a time and ack on completion, so a lost worker's
+    # task is redelivered instead of vanishing and idle workers aren't bypassed
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    broker_transport_options={
+        'visibility_timeout': CELERY_VISIBILITY_TIMEOUT,
+        'queue_order_strategy': 'priority',
+        'priority_steps': list(range(10)),
+        'sep': ':',
+    },
+    # Run with `celery -A tasks beat` (one instance)
+    beat_schedule={
+        'reap-expired-labs': {'task': 'reap_expired_labs', 'schedule': REAPER_INTERVAL_SECONDS},
+    },
 )
 
 logger = logging.getLogger(__name__)
 
+QUEUES = ("deploy", "destroy", "import")
+
+def queue_keys(queue):
+    """Redis lists holding a queue's waiting messages (one per priority step)"""
+    options = app.conf.broker_transport_options
+    return [f"{queue}{options['sep']}{step}" if step else queue for step in options['priority_steps']]
+
+@worker_init.connect
+def _clear_stale_metrics(**kwargs):
+    # Main process, before the pool forks: no child has recorded anything yet
+    metrics.clear_stale()
+
+@worker_process_shutdown.connect
+def _mark_metrics_dead(pid=None, **kwargs):
+    metrics.mark_process_dead(pid)
+
+# task_id -> perf_counter at start, for the runtime histogram
+_task_started = {}
+
+@task_prerun.connect
+def _start_task_timer(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def _observe_task_runtime(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is None:
+        return
+    if state != "SUCCESS":
+        outcome = "error"
+    elif isinstance(retval, dict) and retval.get("success") is False:
+        outcome = "failed"
+    else:
+        outcome = "ok"
+    metrics.TASK_SECONDS.labels(task=task.name, outcome=outcome).observe(time.perf_counter() - started)
+
+def _set_status(db, instance_id, status, outputs=None, error=None, expires_at=None, detail=None):
+    """Persist a status change (detail goes to the timeline) and push it to live dashboards"""
+    db.update_deployment(instance_id, status=status, outputs=outputs, error=error, expires_at=expires_at,
+                         detail=detail)
+    events.publish(instance_id, status=status, outputs=outputs, error=error, expires_at=expires_at)
+
+def release_capacity():
+    """
+    Dispatch queued deploys that fit the quota now. Called after every submit
+    and whenever a lab gives its resources back. Everything admitted in one
+    pass (e.g. a whole batch) is published as a single Celery group.
+    Returns the admitted ids.
+    """
+    admitted = get_scheduler().admit()
+    if not admitted:
+        return []
+
+    signatures = []
+    for row in admitted:
+        request = json.loads(row["request"] or "{}")
+        # Before dispatch, so it can't arrive after the worker's "deploying"
+        events.publish(row["id"], status="pending")
+        signatures.append(deploy_lab.s(
+            instance_id=row["id"],
+            scenario_name=row["scenario"],
+            user_id=row["user_id"],
+            variables=request.get("variables", {}),
+            ttl_hours=request.get("ttl_hours"),
+        ).set(priority=request.get("priority", PRIORITY_BATCH)))
+    group(signatures).apply_async()
+    return [row["id"] for row in admitted]
+
+def _pickup(request):
+    """Timeline detail of a task start: which worker took it, and whether it is a redelivery"""
+    detail = {"worker": request.hostname}
+    if (request.delivery_info or {}).get("redelivered"):
+        detail["redelivered"] = True
+    return detail
+
+def dispatch_destroys(instance_ids, priority=PRIORITY_BATCH):
+    """Queue destroys for labs already claimed (marked 'destroying') in the DB"""
+    for instance_id in instance_ids:
+        events.publish(instance_id, status="destroying")
+        destroy_lab.apply_async(args=(instance_id,), priority=priority)
+
+@worker_process_init.connect
+def start_workspace_pool(**kwargs):
+    """
+    Keep pre-initialized workspaces and the image catalog warm in every worker process.
+    Started after fork; the pool's file lock makes sure only one process builds at a time.
+    """
+    orch = Orchestrator()
+    pool = orch.get_workspace_pool()
+    if pool:
+        pool.start()
+    if not orch.mock_mode:
+        # Load the image catalog now so the first random pick doesn't wait on Glance
+        orch.get_image_selector().warm()
+
 @app.task(name="deploy_lab", bind=True)
-def deploy_lab(self, instance_id, scenario_name, user_id, variables=None):
+def deploy_lab(self, instance_id, scenario_name, user_id, variables=None, ttl_hours=None):
     """
     Async Task: Deploys a laboratory environment.
     bind=True allows access to the task instance (e.g., self.request.id).
+    ttl_hours overrides the scenario's lifetime (0 = never expires).
     """
     db = Database()
     orch = Orchestrator()
@@ -34,23 +174,39 @@ def deploy_lab(self, instance_id, scenario_name, user_id, variables=None):
     logger.info(f"[{instance_id}] Task received. Scenario: {scenario_name}")
     
     # 1. Update DB: Set status to deploying
-    db.update_deployment(instance_id, status="deploying")
+    _set_status(db, instance_id, "deploying", detail=_pickup(self.request))
     
     # 2. Execute Deployment
-    result = orch.deploy(scenario_name, instance_id, variables)
+    def report_progress(percent, summary):
+        db.update_progress(instance_id, percent, summary)
+        events.publish(instance_id, status="deploying", progress=percent, progress_detail=summary)
+
+    def record_events(entries):
+        db.add_events(instance_id, entries)
+
+    result = orch.deploy(scenario_name, instance_id, variables, on_progress=report_progress, user_id=user_id,
+                         on_event=record_events)
     
     # 3. Handle Result
     if result["success"]:
         logger.info(f"[{instance_id}] Deployment successful. Updating DB.")
-        db.update_deployment(instance_id, status="active", outputs=result["outputs"])
+        # The lifetime starts once the lab is usable, not when it was requested
+        if ttl_hours is None:
+            ttl_hours = orch.lab_ttl_hours(scenario_name)
+        expires_at = datetime.now() + timedelta(hours=ttl_hours) if ttl_hours > 0 else None
+        _set_status(db, instance_id, "active", outputs=result["outputs"], expires_at=expires_at)
     else:
         logger.error(f"[{instance_id}] Deployment failed. Error: {result['error']}")
-        db.update_deployment(instance_id, status="failed", error=result["error"])
+        # error_destroying: resources were created and could not be removed
+        status = result.get("status", "failed")
+        _set_status(db, instance_id, status, error=result["error"])
+        if status == "failed":
+            release_capacity()
         
     return result
 
-@app.task(name="destroy_lab")
-def destroy_lab(instance_id):
+@app.task(name="destroy_lab", bind=True)
+def destroy_lab(self, instance_id):
     """
     Async Task: Destroys a laboratory environment.
     """
@@ -60,13 +216,27 @@ def destroy_lab(instance_id):
     logger.info(f"[{instance_id}] Destroy task received.")
     
     # Update DB status before starting operation
-    db.update_deployment(instance_id, status="destroying")
+    _set_status(db, instance_id, "destroying", detail=_pickup(self.request))
     
     result = orch.destroy(instance_id)
     
     if result["success"]:
-        db.update_deployment(instance_id, status="destroyed")
+        _set_status(db, instance_id, "destroyed")
+        release_capacity()
     else:
-        db.update_deployment(instance_id, status="error_destroying", error=result["error"])
+        _set_status(db, instance_id, "error_destroying", error=result["error"])
         
-    return result
\ No newline at end of file
+    return result
+
+@app.task(name="reap_expired_labs")
+def reap_expired_labs():
+    """
+    Periodic task: destroy active labs past their expires_at.
+    Claims at most REAPER_BATCH_SIZE per run, so a backlog drains over a few
+    runs instead of flooding the destroy queue ahead of user destroys.
+    """
+    expired, _ = Database().claim_for_destroy(("active",), expired_before=datetime.now(), limit=REAPER_BATCH_SIZE)
+    if expired:
+        logger.info(f"Reaping {len(expired)} expired lab(s): {', '.join(expired)}")
+        dispatch_destroys(expired)
+    return expired
@@ -0,0 +1,103 @@
+"""
+TF State - Read outputs straight from a workspace's terraform.tfstate
+Same result as `tofu output -json` ({name: {"value", "type", "sensitive"}})
+without starting tofu and loading its providers. Only the top-level keys up to
+`outputs` are decoded (tofu writes them before the much larger `resources`).
+Results are cached per workspace and keyed by the state's lineage and serial,
+which tofu bumps on every write: an unchanged file (same mtime and size) is
+not even read again, a rewritten one with the same serial is not decoded again.
+"""
+import json
+from collections import OrderedDict
+from pathlib import Path
+
+STATE_FILE = "terraform.tfstate"
+SUPPORTED_VERSION = 4
+CACHE_SIZE = 1024
+
+_decoder = json.JSONDecoder()
+_cache = OrderedDict()     # state path -> (mtime_ns, size, lineage, serial, outputs)
+
+
+class StateError(ValueError):
+    """The state file cannot be read here (malformed, encrypted or an unknown version)"""
+
+
+def _top_level(text: str):
+    """Yield (key, value) of the top-level JSON object in file order, decoding one pair at a time"""
+    ws = json.decoder.WHITESPACE.match
+    pos = ws(text, 0).end()
+    if text[pos:pos + 1] != "{":
+        raise StateError("State is not a JSON object")
+    pos = ws(text, pos + 1).end()
+    while text[pos:pos + 1] not in ("}", ""):
+        key, pos = _decoder.raw_decode(text, pos)
+        pos = ws(text, pos).end()
+        if text[pos:pos + 1] != ":":
+            raise StateError(f"Malformed state near offset {pos}")
+        value, pos = _decoder.raw_decode(text, ws(text, pos + 1).end())
+        yield key, value
+        pos = ws(text, pos).end()
+        if text[pos:pos + 1] == ",":
+            pos = ws(text, pos + 1).end()
+
+
+def _normalize(outputs: dict) -> dict:
+    # The state leaves out "sensitive" when it is false; `tofu output -json` always has it
+    return {
+        name: {"sensitive": bool(body.get("sensitive")), "type": body.get("type"), "value": body.get("value")}
+        for name, body in outputs.items()
+    }
+
+
+def _parse(text: str, cached) -> tuple:
+    """(lineage, serial, outputs), reusing `cached` when lineage and serial match it"""
+    fields = {}
+    try:
+        for key, value in _top_level(text):
+            fields[key] = value
+            if "lineage" in fields and "serial" in fields:
+                if cached and cached[2:4] == (fields["lineage"], fields["serial"]):
+                    return cached[2:]
+                if "outputs" in fields:
+                    break
+    except json.JSONDecodeError as e:
+        raise StateError(f"Malformed state: {e}")
+
+    if "encrypted_data" in fields:
+        raise StateError("State is encrypted")
+    if fields.get("version") != SUPPORTED_VERSION:
+        raise StateError(f"Unsupported state version {fields.get('version')}")
+    return fields.get("lineage"), fields.get("serial"), _normalize(fields.get("outputs") or {})
+
+
+def redact_outputs(outputs: dict) -> dict:
+    """Copy of `tofu output -json` style outputs with sensitive values replaced by None"""
+    return {name: {**body, "value": None} if body.get("sensitive") else dict(body)
+            for name, body in outputs.items()}
+
+
+def read_outputs(work_dir, redact: bool = False) -> dict:
+    """
+    Outputs of the workspace's local state, as `tofu output -json` prints them.
+    redact=True replaces sensitive values with None (for logs and terminals).
+    Raises FileNotFoundError without a state file, StateError if it can't be parsed.
+    """
+    path = Path(work_dir) / STATE_FILE
+    key = str(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        _cache.pop(key, None)
+        raise
+
+    cached = _cache.get(key)
+    if not cached or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+        cached = (stat.st_mtime_ns, stat.st_size, *_parse(path.read_text(), cached))
+    _cache[key] = cached
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    outputs = cached[4]
+    return redact_outputs(outputs) if redact else {name: dict(body) for name, body in outputs.items()}
@@ -0,0 +1,74 @@
+"""
+Timeline - Timestamped phases and sub-events of one deployment
+Stored in the `timeline` column as a compact JSON array of
+[epoch seconds, event] or [epoch seconds, event, detail] entries, appended to
+as the lab moves along:
+
+    queued      accepted by the API (held by admission until the quota fits it)
+    pending     admitted and sent to the deploy queue
+    deploying   picked up by a worker
+    prepare     workspace copied or claimed from the pool
+    init        `tofu init` (only for workspaces that are not initialized yet)
+    apply       `tofu apply`
+    output      outputs read from the state
+    active / failed, then destroying / destroyed / error_destroying
+
+Status events are written by the Database itself; the others come from the
+worker. Sub-events (init retries, cache hits, resources) happen inside a phase
+and do not end it.
+"""
+import time
+from datetime import datetime
+
+SUB_EVENTS = ("init_cached", "init_retry", "resource", "resource_failed")
+
+# Phases are summed up to the point where the deploy is over (error_destroying:
+# the deploy failed and so did tearing down what it had created)
+END_EVENTS = ("active", "failed", "error_destroying")
+
+
+def entry(event: str, detail: dict = None, at: float = None) -> list:
+    """One timeline entry; `at` defaults to now"""
+    item = [round(time.time() if at is None else at, 3), event]
+    if detail:
+        item.append(detail)
+    return item
+
+
+def describe(row: dict, entries: list) -> dict:
+    """
+    API view of a timeline: every event with its offset from the first one,
+    seconds spent in each phase (a phase lasts until the next non-sub-event,
+    repeats such as a redelivered task are added up) and the total time from
+    accept to active/failed (None while the deploy is still running).
+    """
+    started = entries[0][0] if entries else None
+    phases, total = {}, None
+    current = None
+    for at, event, *_ in entries:
+        if event in SUB_EVENTS:
+            continue
+        if current:
+            phases[current[1]] = round(phases.get(current[1], 0) + at - current[0], 3)
+        if event in END_EVENTS:
+            total = round(at - started, 3)
+            break
+        current = (at, event)
+
+    return {
+        "id": row["id"],
+        "scenario": row["scenario"],
+        "status": row["status"],
+        "started_at": datetime.fromtimestamp(started).isoformat(timespec="milliseconds") if entries else None,
+        "total_seconds": total,
+        "phases": phases,
+        "events": [
+            {
+                "at": datetime.fromtimestamp(at).isoformat(timespec="milliseconds"),
+                "t": round(at - started, 3),
+                "event": event,
+                **({"detail": rest[0]} if rest else {}),
+            }
+            for at, event, *rest in entries
+        ],
+    }
@@ -0,0 +1,210 @@
+"""
+Workspace Pool - Pre-initialized Terraform workspaces
+Keeps a few copies of the terraform template already copied and `tofu init`-ed,
+so a deploy can claim one with a single rename instead of paying for
+copytree + init on the critical path.
+
+Layout (under RUNS_DIR/.pool):
+    <revision>/<token>.building   workspace being prepared (never claimed)
+    <revision>/<token>.ready      initialized workspace, claimable
+    .lock                         flock held by the process currently refilling
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Local artefacts that must never be copied into (or hashed as part of) a template
+TEMPLATE_IGNORE = (".terraform", "*.tfstate", "*.tfstate.*", ".terraform.tfstate.lock.info")
+
+
+def _is_ignored(rel: Path) -> bool:
+    return any(part == ".terraform" for part in rel.parts) or ".tfstate" in rel.name
+
+
+# source_dir -> (fingerprint, revision): files are only read again when one changes
+_revisions = {}
+_revisions_lock = threading.Lock()
+
+
+def _template_files(source_dir: Path) -> list:
+    """(relative path, path) of every template file that is part of the revision, sorted"""
+    return sorted(
+        (path.relative_to(source_dir), path)
+        for path in Path(source_dir).rglob("*")
+        if path.is_file() and not _is_ignored(path.relative_to(source_dir))
+    )
+
+
+def template_revision(source_dir: Path) -> str:
+    """
+    Content hash of every file under the terraform template directory.
+    Cached per directory and keyed on the files' names, mtimes and sizes, so
+    the deploy path (claim) only pays for a stat of each file.
+    """
+    files = _template_files(source_dir)
+    fingerprint = tuple((str(rel), st.st_mtime_ns, st.st_size) for rel, st in ((rel, path.stat()) for rel, path in files))
+    with _revisions_lock:
+        cached = _revisions.get(str(source_dir))
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    for rel, path in files:
+        digest.update(str(rel).encode())
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+    revision = digest.hexdigest()[:16]
+    with _revisions_lock:
+        _revisions[str(source_dir)] = (fingerprint, revision)
+    return revision
+
+
+class WorkspacePool:
+    """Background-maintained pool of ready-to-apply workspaces.
+
+    Claims are a single os.rename(), so they are atomic across Celery worker
+    processes sharing the same RUNS_DIR. Refilling is serialized with a flock
+    so only one process builds workspaces at a time.
+    """
+
+    def __init__(self, source_dir: Path, runs_dir: Path, size: int,
+                 build_fn: Callable[[Path], None], refill_interval: float = 30.0):
+        self.source_dir = Path(source_dir)
+        self.pool_dir = Path(runs_dir) / ".pool"
+        self.size = size
+        self.build_fn = build_fn
+        self.refill_interval = refill_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._counter_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.pool_dir.mkdir(parents=True, exist_ok=True)
+
+    # --- CLAIM ---
+
+    def claim(self, target: Path) -> bool:
+        """Move a ready workspace to `target`. Returns False on a pool miss."""
+        rev_dir = self.pool_dir / template_revision(self.source_dir)
+        candidates = sorted(rev_dir.glob("*.ready")) if rev_dir.exists() else []
+
+        for entry in candidates:
+            try:
+                os.rename(entry, target)
+            except OSError:
+                # Claimed by another worker in the meantime
+                continue
+            with self._counter_lock:
+                self.hits += 1
+            logger.info(f"Workspace pool hit ({self.hits} hits / {self.misses} misses)")
+            self._wake.set()
+            return True
+
+        with self._counter_lock:
+            self.misses += 1
+        logger.info(f"Workspace pool miss ({self.hits} hits / {self.misses} misses)")
+        self._wake.set()
+        return False
+
+    # --- REFILL ---
+
+    def refill(self):
+        """Top up the pool for the current template revision (no-op if another process is refilling)"""
+        lock_file = open(self.pool_dir / ".lock", "w")
+        try:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            revision = template_revision(self.source_dir)
+            rev_dir = self.pool_dir / revision
+            self._purge(revision)
+            rev_dir.mkdir(parents=True, exist_ok=True)
+
+            while not self._stop.is_set() and len(list(rev_dir.glob("*.ready"))) < self.size:
+                building = rev_dir / f"{uuid.uuid4().hex}.building"
+                try:
+                    self.build_fn(building)
+                except Exception as e:
+                    logger.warning(f"Workspace pool build failed: {e}")
+                    shutil.rmtree(building, ignore_errors=True)
+                    return
+
+                if template_revision(self.source_dir) != revision:
+                    # Template changed while we were initializing: this copy is already stale
+                    shutil.rmtree(building, ignore_errors=True)
+                    return
+
+                os.rename(building, building.with_suffix(".ready"))
+                logger.info(f"Workspace pool: warmed workspace for revision {revision}")
+        finally:
+            lock_file.close()
+
+    def _purge(self, revision: str):
+        """Remove workspaces built from older template revisions and abandoned builds"""
+        for entry in self.pool_dir.iterdir():
+            if not entry.is_dir():
+                continue
+            if entry.name != revision:
+                shutil.rmtree(entry, ignore_errors=True)
+                with self._counter_lock:
+                    self.invalidations += 1
+                logger.info(f"Workspace pool: invalidated stale revision {entry.name}")
+                continue
+            # We hold the refill lock, so any in-progress build is a leftover from a crash
+            for building in entry.glob("*.building"):
+                shutil.rmtree(building, ignore_errors=True)
+
+    # --- BACKGROUND THREAD ---
+
+    def start(self):
+        """Start the background refill thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="workspace-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refill()
+            except Exception as e:
+                logger.error(f"Workspace pool refill error: {e}")
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+
+    # --- REPORTING ---
+
+    def stats(self) -> dict:
+        revision = template_revision(self.source_dir)
+        rev_dir = self.pool_dir / revision
+        ready = len(list(rev_dir.glob("*.ready"))) if rev_dir.exists() else 0
+        total = self.hits + self.misses
+        return {
+            "revision": revision,
+            "size": self.size,
+            "ready": ready,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
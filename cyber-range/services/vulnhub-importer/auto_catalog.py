@@ -4,43 +4,95 @@ VulnHub Catalog Manager
 Wrapper around auto_importer to fetch images and tag them for the Cyber Range Randomizer.
 """
 import argparse
+import json
 import logging
 import sys
 # Import your existing importer class
-from auto_importer import VulnHubImporter
+from auto_importer import VulnHubImporter, serve_metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("CatalogManager")
 
+def catalog_properties(difficulty, desc):
+    """Glance properties that make an image visible to the Randomizer"""
+    return {
+        "cyber_range_image": "true",          # Marker for the Orchestrator
+        "vulnhub_difficulty": difficulty,     # 'easy', 'medium', 'hard'
+        "description": desc,
+        "hw_disk_bus": "scsi",                # Optimization for compat
+        "hw_scsi_model": "virtio-scsi"
+    }
+
+def import_catalog(path, workers):
+    """
+    Import every entry of a JSON catalog concurrently.
+    Format: [{"url": ..., "name": ..., "difficulty": ..., "desc": ..., "sha256": ...}, ...]
+    """
+    with open(path) as f:
+        entries = json.load(f)
+
+    jobs = [{
+        "url": entry["url"],
+        "image_name": entry["name"],
+        "sha256": entry.get("sha256", "SKIP"),
+        "metadata": catalog_properties(entry["difficulty"], entry.get("desc", "VulnHub Image"))
+    } for entry in entries]
+
+    logger.info(f"🚀 Starting Catalog Import: {len(jobs)} images")
+    importer = VulnHubImporter()
+    results = importer.import_many(jobs, workers=workers)
+
+    failed = [r for r in results if not r['success']]
+    for r in results:
+        if r['success']:
+            logger.info(f"✅ {r['image_name']}: {r.get('openstack_image_id')}")
+        else:
+            logger.error(f"❌ {r['image_name']}: {r.get('error')}")
+    logger.info(f"Imported {len(results) - len(failed)}/{len(results)} images")
+    if failed:
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser(description="Import VulnHub VM into Cyber Range Catalog")
-    parser.add_argument("url", help="Direct download URL of the VulnHub image (zip/7z/ova)")
-    parser.add_argument("--name", required=True, help="Internal name (e.g., 'mr-robot')")
-    parser.add_argument("--difficulty", choices=["easy", "medium", "hard"], required=True, help="Difficulty level")
+    parser.add_argument("url", nargs="?", help="Direct download URL of the VulnHub image (zip/7z/ova)")
+    parser.add_argument("--name", help="Internal name (e.g., 'mr-robot')")
+    parser.add_argument("--difficulty", choices=["easy", "medium", "hard"], help="Difficulty level")
     parser.add_argument("--desc", default="VulnHub Image", help="Short description")
+    parser.add_argument("--sha256", default="SKIP", help="Expected SHA-256 of the download (default: not verified)")
+    parser.add_argument("--catalog", help="JSON file with many images to import concurrently")
+    parser.add_argument("--download-workers", type=int, default=3)
+    parser.add_argument("--convert-workers", type=int, default=2)
+    parser.add_argument("--upload-workers", type=int, default=2)
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus stage metrics on this port while importing")
     
     args = parser.parse_args()
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    if args.catalog:
+        import_catalog(args.catalog, workers={
+            "download": args.download_workers,
+            "convert": args.convert_workers,
+            "upload": args.upload_workers,
+        })
+        return
+
+    if not (args.url and args.name and args.difficulty):
+        parser.error("url, --name and --difficulty are required (or use --catalog)")
 
     # 1. Define Metadata (The "Catalog" Entry)
     # These properties are what makes the Randomizer work!
-    glance_properties = {
-        "cyber_range_image": "true",          # Marker for the Orchestrator
-        "vulnhub_difficulty": args.difficulty, # 'easy', 'medium', 'hard'
-        "description": args.desc,
-        "hw_disk_bus": "scsi",                # Optimization for compat
-        "hw_scsi_model": "virtio-scsi"
-    }
-
+    glance_properties = catalog_properties(args.difficulty, args.desc)
     # 2. Run the Import
     logger.info(f"🚀 Starting Catalog Import: {args.name} [{args.difficulty}]")
     importer = VulnHubImporter()
     
-    # We pass 'SKIP' to checksum if you don't have it handy, 
-    # BUT you must update auto_importer.py to handle "SKIP" as discussed before.
+    # 'SKIP' accepts any checksum; re-tagging an image already in the
+    # download cache (same URL or same sha256) does not download it again
     result = importer.import_from_url(
         url=args.url,
         image_name=args.name,
-        sha256="SKIP", 
+        sha256=args.sha256,
         metadata=glance_properties
     )
 
@@ -5,14 +5,25 @@ Simple version with essential functionality only.
 """
 
 import os
+import re
 import json
+import fcntl
+import struct
+import shutil
+import socket
 import subprocess
 import hashlib
 import logging
+import queue
+import threading
+import time
+import tempfile
 from pathlib import Path
-from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Callable, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import tarfile
 import zipfile
 
@@ -26,8 +37,39 @@ try:
 except ImportError:
     openstack = None
 
+try:
+    from prometheus_client import Counter, Histogram, start_http_server
+except ImportError:
+    Counter = Histogram = start_http_server = None
+
+from image_catalog import ImageCatalog, SHA256_PROPERTY
+
 logger = logging.getLogger(__name__)
 
+# Stage throughput for Prometheus: served by `auto_catalog.py --metrics-port`, or
+# by the orchestrator's /metrics when PROMETHEUS_MULTIPROC_DIR is shared with it
+if Histogram is not None:
+    STAGE_SECONDS = Histogram("cyberguard_import_stage_seconds", "Time one image spent in each import stage",
+                              ["stage", "outcome"], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+    STAGE_BYTES = Counter("cyberguard_import_stage_bytes", "Bytes that went through each import stage", ["stage"])
+
+
+def export_stage(stage: str, seconds: float, nbytes: int, ok: bool):
+    if Histogram is None:
+        return
+    STAGE_SECONDS.labels(stage=stage, outcome="ok" if ok else "failed").observe(seconds)
+    if ok:
+        STAGE_BYTES.labels(stage=stage).inc(nbytes)
+
+
+def serve_metrics(port: int):
+    """Expose the stage metrics while a long import runs"""
+    if start_http_server is None:
+        logger.warning("prometheus_client is not installed, not serving metrics")
+        return
+    start_http_server(port)
+    logger.info(f"Serving import metrics on :{port}/metrics")
+
 
 @dataclass
 class VulnHubMetadata:
@@ -50,80 +92,710 @@ class VulnHubMetadata:
         })
 
 
+class DownloadProgress:
+    """Thread-safe byte counter with a bytes/sec rate, logged periodically"""
+
+    LOG_INTERVAL = 5.0
+
+    def __init__(self, label: str, total: Optional[int], callback: Optional[Callable] = None):
+        self.label = label
+        self.total = total
+        self.callback = callback
+        self.done = 0
+        self.bytes_per_sec = 0.0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._last_log = 0.0
+
+    def add(self, nbytes: int):
+        with self._lock:
+            self.done += nbytes
+            self._window_bytes += nbytes
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed >= 1.0:
+                self.bytes_per_sec = self._window_bytes / elapsed
+                self._window_start, self._window_bytes = now, 0
+            if now - self._last_log < self.LOG_INTERVAL:
+                return
+            self._last_log = now
+            done, total, rate = self.done, self.total, self.bytes_per_sec
+
+        pct = f" ({done * 100 // total}%)" if total else ""
+        logger.info(f"{self.label}: {done / 1e6:.1f} MB{pct} at {rate / 1e6:.2f} MB/s")
+        if self.callback:
+            self.callback(done, total, rate)
+
+
+# Disk image extensions -> qemu-img format (None: let qemu-img probe it)
+DISK_FORMATS = {
+    '.vmdk': 'vmdk',
+    '.vdi': 'vdi',
+    '.qcow2': 'qcow2',
+    '.vhd': 'vpc',
+    '.vhdx': 'vhdx',
+    '.raw': 'raw',
+    '.img': None,
+}
+MIN_DISK_SIZE = 1024 * 1024         # Smaller "disks" are icons, samples, etc.
+VMDK_DESCRIPTOR_MAX = 64 * 1024     # Split VMDK descriptors are small text files
+VMDK_EXTENT_RE = re.compile(r'^\s*(?:RW|RDONLY|NOACCESS)\s+\d+\s+\S+\s+"([^"]+)"', re.M)
+CACHE_PIN_MAX_AGE = 24 * 3600       # Older pins are left over from a killed importer
+
+
+@dataclass
+class DiskSource:
+    """
+    A VM disk for qemu-img: either a file on disk, or a member stored
+    uncompressed inside an archive (OVA/tar, zip 'stored') that qemu-img reads
+    in place through the raw driver's offset/size window. root is the
+    directory the disk was extracted to: the only place its VMDK extents may
+    live (the disk's own directory when not set).
+    """
+    path: Path
+    fmt: Optional[str] = None
+    offset: int = 0
+    size: Optional[int] = None
+    root: Optional[Path] = None
+
+    @property
+    def in_place(self) -> bool:
+        return self.size is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self.size if self.in_place else self.path.stat().st_size
+
+    def qemu_filename(self) -> str:
+        if not self.in_place:
+            return str(self.path)
+        return 'json:' + json.dumps({
+            'driver': self.fmt,
+            'file': {
+                'driver': 'raw',
+                'offset': self.offset,
+                'size': self.size,
+                'file': {'driver': 'file', 'filename': str(self.path)},
+            },
+        })
+
+
+def disk_extension(name: str) -> Optional[str]:
+    ext = os.path.splitext(name)[1].lower()
+    return ext if ext in DISK_FORMATS else None
+
+
+class RangeNotSupported(RuntimeError):
+    """Server ignored a Range request"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def checksum_required(sha256: Optional[str]) -> bool:
+    """'SKIP' (or no value) means: accept whatever the server sends"""
+    return bool(sha256) and sha256.upper() != 'SKIP'
+
+
+class DownloadCache:
+    """
+    Content-addressed store of downloaded archives.
+    Blobs live at <root>/<sha[:2]>/<sha>/<filename> (the filename keeps the
+    extension extract_archive dispatches on); index.json maps digests to their
+    size and last use, and source URLs to digests, so a re-import is a cache hit
+    by checksum or, for 'SKIP' entries, by URL. Least recently used blobs are
+    evicted once the cache grows past max_bytes.
+
+    lookup() and store() pin the blob they return until release(): jobs
+    extract from cached archives (or read disks in place) long after the
+    download, so a pinned blob is never evicted. Pins are kept in the index
+    by host:pid, so they also hold against other importer processes sharing
+    the cache.
+    """
+
+    INDEX = 'index.json'
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        default_root = Path.home() / '.cache' / 'cyberguard' / 'vulnhub'
+        self.root = Path(root or os.getenv('VULNHUB_CACHE_DIR', default_root))
+        self.root.mkdir(parents=True, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('VULNHUB_CACHE_GB', '50')) * 1024 ** 3)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pins: Dict[str, int] = {}     # digest -> jobs of this process using it
+
+    @contextmanager
+    def _locked(self):
+        """Serialize index updates across threads and importer processes"""
+        with self._lock, open(self.root / '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield self._load()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            return json.loads((self.root / self.INDEX).read_text())
+        except (FileNotFoundError, ValueError):
+            return {'blobs': {}, 'urls': {}, 'pins': {}}
+
+    def _save(self, index: Dict[str, Any]):
+        tmp = self.root / f"{self.INDEX}.tmp"
+        tmp.write_text(json.dumps(index))
+        tmp.replace(self.root / self.INDEX)
+
+    def _blob_dir(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    @staticmethod
+    def _owner() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _pin(self, index: Dict[str, Any], digest: str):
+        self._pins[digest] = self._pins.get(digest, 0) + 1
+        index.setdefault('pins', {}).setdefault(digest, {})[self._owner()] = time.time()
+
+    def release(self, digest: str):
+        """Unpin a blob from lookup()/store() once its job is done with it, then evict if over budget"""
+        with self._locked() as index:
+            count = self._pins.get(digest, 0) - 1
+            if count > 0:
+                self._pins[digest] = count
+            else:
+                self._pins.pop(digest, None)
+                owners = index.setdefault('pins', {}).get(digest, {})
+                owners.pop(self._owner(), None)
+                if not owners:
+                    index['pins'].pop(digest, None)
+            self._evict(index)
+            self._save(index)
+
+    def _pinned(self, index: Dict[str, Any]) -> set:
+        """Digests still in use, dropping pins of dead processes on this host and stale ones"""
+        host, now = socket.gethostname(), time.time()
+        pins = index.setdefault('pins', {})
+        for digest, owners in list(pins.items()):
+            for owner, since in list(owners.items()):
+                owner_host, _, pid = owner.rpartition(':')
+                if now - since > CACHE_PIN_MAX_AGE or (owner_host == host and not _pid_alive(int(pid))):
+                    del owners[owner]
+            if not owners:
+                del pins[digest]
+        return set(pins)
+
+    def lookup(self, url: str, sha256: Optional[str] = None) -> Optional[Tuple[Path, str]]:
+        """Return (path, digest) of a cached archive, pinned until release(digest), or None on a miss"""
+        with self._locked() as index:
+            digest = sha256.lower() if checksum_required(sha256) else index['urls'].get(url)
+            entry = index['blobs'].get(digest) if digest else None
+            if not entry:
+                return None
+            path = self._blob_dir(digest) / entry['filename']
+            if not path.exists() or path.stat().st_size != entry['size']:
+                logger.warning(f"Download cache: dropping damaged entry {digest[:12]}")
+                shutil.rmtree(self._blob_dir(digest), ignore_errors=True)
+                del index['blobs'][digest]
+                self._save(index)
+                return None
+            entry['last_used'] = time.time()
+            index['urls'][url] = digest
+            self._pin(index, digest)
+            self._save(index)
+        return path, digest
+
+    def store(self, path: Path, url: str, sha256: str) -> Path:
+        """Move a verified download into the cache (pinned until release(sha256)) and evict LRU blobs over budget"""
+        digest = sha256.lower()
+        with self._locked() as index:
+            entry = index['blobs'].get(digest)
+            existing = self._blob_dir(digest) / entry['filename'] if entry else None
+            if existing and existing.exists():
+                # Same bytes under another URL: keep the copy we already have
+                path.unlink()
+                target = existing
+            else:
+                self._blob_dir(digest).mkdir(parents=True, exist_ok=True)
+                target = self._blob_dir(digest) / path.name
+                shutil.move(str(path), str(target))
+                index['blobs'][digest] = {'filename': target.name, 'size': target.stat().st_size}
+            index['blobs'][digest]['last_used'] = time.time()
+            index['urls'][url] = digest
+            self._pin(index, digest)
+            self._evict(index)
+            self._save(index)
+        return target
+
+    def _evict(self, index: Dict[str, Any]):
+        total = sum(entry['size'] for entry in index['blobs'].values())
+        pinned = self._pinned(index)
+        for digest, entry in sorted(index['blobs'].items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if digest in pinned:
+                continue
+            shutil.rmtree(self._blob_dir(digest), ignore_errors=True)
+            del index['blobs'][digest]
+            total -= entry['size']
+            logger.info(f"Download cache: evicted {entry['filename']} ({entry['size'] / 1e6:.0f} MB)")
+        index['urls'] = {url: digest for url, digest in index['urls'].items() if digest in index['blobs']}
+
+
 class VulnHubDownloader:
-    """Download VulnHub images with retry and validation"""
+    """Download VulnHub images with resume, optional segmented transfer and validation"""
 
-    def __init__(self, temp_dir: Optional[str] = None):
+    CHUNK_MIN = 64 * 1024
+    CHUNK_MAX = 4 * 1024 * 1024
+    SEGMENT_MIN_SIZE = 64 * 1024 * 1024     # Smaller files use a single stream
+    STATE_SAVE_BYTES = 8 * 1024 * 1024      # Persist segment progress every 8 MB
+
+    def __init__(self, temp_dir: Optional[str] = None, segments: int = 4,
+                 progress_callback: Optional[Callable[[int, Optional[int], float], None]] = None,
+                 cache: Optional[DownloadCache] = None):
         self.temp_dir = Path(temp_dir or '/tmp/vulnhub')
         self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.segments = segments
+        self.progress_callback = progress_callback
+        self.cache = cache
+
+    def download(self, url: str, expected_sha256: str, max_retries: int = 5) -> Path:
+        """Download file with checksum validation ('SKIP' disables the check); a cached file stays pinned"""
+        return self.fetch(url, expected_sha256, max_retries)[0]
+
+    def fetch(self, url: str, expected_sha256: str, max_retries: int = 5,
+              dest_dir: Optional[Path] = None) -> Tuple[Path, str]:
+        """
+        Download file with checksum validation, returning (path, sha256).
+        The digest is computed while the bytes arrive, so nothing is read twice.
+        Interrupted transfers resume from the partial `.part` file instead of
+        starting over; servers that support ranges are fetched in parallel segments.
+        dest_dir defaults to temp_dir. With a cache the file ends up in the cache,
+        pinned until cache.release(sha256).
+        """
+        filename = url.split('/')[-1]
+        if self.cache:
+            cached = self.cache.lookup(url, expected_sha256)
+            if cached:
+                logger.info(f"✓ Cache hit: {filename} ({cached[1][:12]}), skipping download")
+                return cached
 
-    def download(self, url: str, expected_sha256: str, max_retries: int = 3) -> Path:
-        """Download file with checksum validation"""
         if not requests:
             raise RuntimeError("requests library required for downloads")
 
-        filename = url.split('/')[-1]
-        filepath = self.temp_dir / filename
+        filepath = Path(dest_dir or self.temp_dir) / filename
+        part_path = filepath.with_name(filename + '.part')
+
+        size, accepts_ranges = self._probe(url)
+        segmented = bool(accepts_ranges and size and size >= self.SEGMENT_MIN_SIZE and self.segments > 1)
 
         for attempt in range(max_retries):
+            progress = DownloadProgress(filename, size, self.progress_callback)
             try:
-                logger.info(f"Downloading {filename} (attempt {attempt + 1}/{max_retries})")
-                response = requests.get(url, timeout=300, stream=True)
-                response.raise_for_status()
+                logger.info(f"Downloading {filename} (attempt {attempt + 1}/{max_retries}"
+                            f"{f', {self.segments} segments' if segmented else ''})")
+                if segmented:
+                    digest = self._download_segmented(url, part_path, size, progress)
+                else:
+                    digest = self._download_stream(url, part_path, size, progress)
 
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                if checksum_required(expected_sha256) and digest != expected_sha256.lower():
+                    # Corrupt content cannot be resumed: start from scratch
+                    logger.error(f"Checksum mismatch for {filename}: got {digest}")
+                    part_path.unlink()
+                    self._state_path(part_path).unlink(missing_ok=True)
+                    continue
+                if not checksum_required(expected_sha256):
+                    logger.info(f"{filename} sha256: {digest} (not verified)")
 
-                if self._validate_checksum(filepath, expected_sha256):
-                    logger.info(f"✓ Download complete: {filepath}")
-                    return filepath
-                else:
-                    logger.error(f"Checksum mismatch for {filename}")
-                    filepath.unlink()
+                part_path.replace(filepath)
+                if self.cache:
+                    filepath = self.cache.store(filepath, url, digest)
+                logger.info(f"✓ Download complete: {filepath}")
+                return filepath, digest
+            except RangeNotSupported as e:
+                logger.warning(f"{e}; falling back to a single stream")
+                segmented = False
             except Exception as e:
-                logger.error(f"Download failed: {e}")
-                if filepath.exists():
-                    filepath.unlink()
+                kept = part_path.stat().st_size if part_path.exists() else 0
+                logger.error(f"Download failed: {e} (keeping {kept / 1e6:.1f} MB for resume)")
+                time.sleep(min(2 ** attempt, 30))
 
         raise RuntimeError(f"Failed to download {url} after {max_retries} attempts")
 
-    def _validate_checksum(self, filepath: Path, expected_sha256: str) -> bool:
-        """Validate file checksum"""
-        sha256_hash = hashlib.sha256()
-        with open(filepath, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b''):
-                sha256_hash.update(chunk)
-        return sha256_hash.hexdigest().lower() == expected_sha256.lower()
-
-    def extract_archive(self, archive_path: Path) -> Path:
-        """Extract tar or zip archive"""
-        extract_dir = self.temp_dir / archive_path.stem
-        extract_dir.mkdir(parents=True, exist_ok=True)
+    def _probe(self, url: str):
+        """Return (size, accepts_ranges); (None, False) if the server won't say"""
+        try:
+            resp = requests.head(url, allow_redirects=True, timeout=30)
+            resp.raise_for_status()
+        except Exception as e:
+            logger.debug(f"HEAD failed for {url}: {e}")
+            return None, False
+        size = int(resp.headers.get('Content-Length') or 0) or None
+        return size, resp.headers.get('Accept-Ranges', '').lower() == 'bytes'
 
+    def _read_adaptive(self, response, limit: Optional[int] = None):
+        """Yield body chunks, growing the read size on fast links and shrinking it on slow ones"""
+        chunk = self.CHUNK_MIN
+        remaining = limit
+        while remaining is None or remaining > 0:
+            want = chunk if remaining is None else min(chunk, remaining)
+            started = time.monotonic()
+            data = response.raw.read(want, decode_content=True)
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+
+            elapsed = time.monotonic() - started
+            if elapsed < 0.05 and chunk < self.CHUNK_MAX:
+                chunk *= 2
+            elif elapsed > 0.5 and chunk > self.CHUNK_MIN:
+                chunk //= 2
+
+    def _download_stream(self, url: str, part_path: Path, size: Optional[int], progress: DownloadProgress) -> str:
+        """Single connection, resuming from the end of the partial file; returns the sha256"""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if size and offset > size:
+            offset = 0
+        hasher = hashlib.sha256()
+
+        if size and offset == size:
+            self._hash_file(part_path, hasher)
+            return hasher.hexdigest()
+
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with requests.get(url, headers=headers, stream=True, timeout=(30, 300)) as response:
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                logger.warning(f"Server ignored Range request, restarting {part_path.name} from byte 0")
+                offset = 0
+            if offset:
+                # Only the resumed prefix is read back; new bytes are hashed in flight
+                logger.info(f"Resuming {part_path.name} at {offset / 1e6:.1f} MB")
+                self._hash_file(part_path, hasher, limit=offset)
+            progress.add(offset)
+
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                for data in self._read_adaptive(response):
+                    f.write(data)
+                    hasher.update(data)
+                    progress.add(len(data))
+
+        received = part_path.stat().st_size
+        if size and received < size:
+            raise RuntimeError(f"Connection closed early: {received}/{size} bytes")
+        return hasher.hexdigest()
+
+    def _hash_file(self, path: Path, hasher, limit: Optional[int] = None):
+        """Feed the first `limit` bytes of path (all of it by default) into hasher"""
+        remaining = limit
+        with open(path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                data = f.read(self.CHUNK_MAX if remaining is None else min(self.CHUNK_MAX, remaining))
+                if not data:
+                    break
+                hasher.update(data)
+                if remaining is not None:
+                    remaining -= len(data)
+
+    def _state_path(self, part_path: Path) -> Path:
+        return part_path.with_name(part_path.name + '.state')
+
+    def _download_segmented(self, url: str, part_path: Path, size: int, progress: DownloadProgress) -> str:
+        """
+        Parallel Range requests into a preallocated file; per-segment progress
+        survives restarts. Segments finish out of order, so a follower thread
+        hashes the contiguous downloaded prefix as it grows, reading back bytes
+        that were just written (still in the page cache) instead of re-reading
+        the whole archive from disk at the end. Returns the sha256.
+        """
+        state_path = self._state_path(part_path)
+        state = None
+        if state_path.exists() and part_path.exists():
+            try:
+                state = json.loads(state_path.read_text())
+            except ValueError:
+                state = None
+        if not state or state.get('size') != size:
+            step = -(-size // self.segments)
+            state = {
+                'size': size,
+                'segments': [[start, min(start + step, size) - 1] for start in range(0, size, step)],
+            }
+            state['done'] = [0] * len(state['segments'])
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            state_path.write_text(json.dumps(state))
+        else:
+            logger.info(f"Resuming {part_path.name} at {sum(state['done']) / 1e6:.1f} MB")
+
+        progress.add(sum(state['done']))
+        lock = threading.Lock()
+
+        def save_state():
+            with lock:
+                state_path.write_text(json.dumps(state))
+
+        def fetch(index: int):
+            start, end = state['segments'][index]
+            offset = start + state['done'][index]
+            if offset > end:
+                return
+            headers = {'Range': f'bytes={offset}-{end}'}
+            with requests.get(url, headers=headers, stream=True, timeout=(30, 300)) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise RangeNotSupported("Server does not honour Range requests")
+                unsaved = 0
+                # Unbuffered: bytes must be in the file before `done` claims them
+                with open(part_path, 'r+b', buffering=0) as f:
+                    f.seek(offset)
+                    for data in self._read_adaptive(response, limit=end - offset + 1):
+                        f.write(data)
+                        with lock:
+                            state['done'][index] += len(data)
+                        progress.add(len(data))
+                        unsaved += len(data)
+                        if unsaved >= self.STATE_SAVE_BYTES:
+                            save_state()
+                            unsaved = 0
+
+        hasher = hashlib.sha256()
+        hashed = 0
+        finished = threading.Event()
+
+        def frontier() -> int:
+            """End of the contiguous downloaded prefix"""
+            with lock:
+                for (start, end), done in zip(state['segments'], state['done']):
+                    if start + done <= end:
+                        return start + done
+            return size
+
+        def follow():
+            nonlocal hashed
+            # Unbuffered too: read-ahead would cache not-yet-written zeros past the frontier
+            with open(part_path, 'rb', buffering=0) as f:
+                while hashed < size:
+                    limit = frontier()
+                    if limit == hashed:
+                        if finished.wait(0.2) and frontier() == hashed:
+                            return
+                        continue
+                    f.seek(hashed)
+                    while hashed < limit:
+                        data = f.read(min(self.CHUNK_MAX, limit - hashed))
+                        hasher.update(data)
+                        hashed += len(data)
+
+        follower = threading.Thread(target=follow, name=f"hash-{part_path.name}", daemon=True)
+        follower.start()
         try:
-            if archive_path.suffix == '.gz' or archive_path.name.endswith('.tar.gz'):
-                with tarfile.open(archive_path, 'r:gz') as tar:
-                    tar.extractall(path=extract_dir)
-            elif archive_path.suffix == '.zip':
-                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                    zip_ref.extractall(path=extract_dir)
+            with ThreadPoolExecutor(max_workers=len(state['segments'])) as pool:
+                for future in [pool.submit(fetch, i) for i in range(len(state['segments']))]:
+                    future.result()
+        finally:
+            save_state()
+            finished.set()
+            follower.join()
+
+        if sum(state['done']) != size or hashed != size:
+            raise RuntimeError(f"Incomplete download: {sum(state['done'])}/{size} bytes")
+        state_path.unlink(missing_ok=True)
+        return hasher.hexdigest()
+
+    def extract_archive(self, archive_path: Path, dest_dir: Optional[Path] = None) -> DiskSource:
+        """
+        Locate the VM disk in an archive and extract only that.
+        Disk members are chosen from the archive index by extension and size (a
+        split VMDK is its descriptor plus the extents it names; with several
+        disks the largest wins). A single-file disk stored uncompressed is not
+        extracted at all: qemu-img reads it straight out of the archive.
+        Files go to <dest_dir or temp_dir>/<archive stem>.
+        """
+        ext = disk_extension(archive_path.name)
+        if ext:
+            return DiskSource(archive_path, DISK_FORMATS[ext])
+
+        extract_dir = Path(dest_dir or self.temp_dir) / archive_path.stem
+        extract_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            if zipfile.is_zipfile(archive_path):
+                source = self._extract_zip(archive_path, extract_dir)
+            elif tarfile.is_tarfile(archive_path):  # .tar, .tar.gz, .tgz, .ova
+                source = self._extract_tar(archive_path, extract_dir)
             else:
                 raise ValueError(f"Unsupported archive format: {archive_path.suffix}")
-
-            logger.info(f"✓ Extracted to {extract_dir}")
-            return extract_dir
         except Exception as e:
             logger.error(f"Extraction failed: {e}")
             raise
 
+        if source.in_place:
+            logger.info(f"✓ {archive_path.name}: reading {source.fmt} disk in place ({source.size / 1e6:.0f} MB)")
+        else:
+            logger.info(f"✓ Extracted {source.path.name} to {extract_dir}")
+        return source
+
+    def _select_disk(self, members: Dict[str, int], read: Callable[[str], bytes]) -> List[str]:
+        """Member names making up the largest disk, descriptor first for a split VMDK"""
+        candidates: Dict[str, List[str]] = {}
+        extents = set()
+        for name, size in members.items():
+            if disk_extension(name) != '.vmdk' or size > VMDK_DESCRIPTOR_MAX:
+                continue
+            text = read(name).decode('utf-8', errors='ignore')
+            if 'DescriptorFile' not in text:
+                continue
+            parts = [os.path.normpath(os.path.join(os.path.dirname(name), extent))
+                     for extent in VMDK_EXTENT_RE.findall(text)]
+            if parts and all(part in members for part in parts):
+                candidates[name] = [name] + parts
+                extents.update(parts)
+
+        for name, size in members.items():
+            if name not in candidates and name not in extents and disk_extension(name) and size >= MIN_DISK_SIZE:
+                candidates[name] = [name]
+
+        if not candidates:
+            raise RuntimeError(f"No VM image found among {len(members)} archive members")
+        return max(candidates.values(), key=lambda names: sum(members[n] for n in names))
+
+    @staticmethod
+    def _is_junk(name: str) -> bool:
+        base = os.path.basename(name)
+        return name.startswith('__MACOSX/') or base.startswith('._')
+
+    @staticmethod
+    def _member_target(extract_dir: Path, name: str) -> Path:
+        """Extraction path for a member, refusing names that escape extract_dir"""
+        target = (extract_dir / name.lstrip('/')).resolve()
+        if not target.is_relative_to(extract_dir.resolve()):
+            raise ValueError(f"Unsafe member path in archive: {name}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target
+
+    def _copy_member(self, reader, target: Path):
+        with reader, open(target, 'wb') as out:
+            shutil.copyfileobj(reader, out, self.CHUNK_MAX)
+
+    def _extract_zip(self, archive_path: Path, extract_dir: Path) -> DiskSource:
+        with zipfile.ZipFile(archive_path) as archive:
+            infos = {i.filename: i for i in archive.infolist() if not i.is_dir() and not self._is_junk(i.filename)}
+            selected = self._select_disk({name: i.file_size for name, i in infos.items()},
+                                         lambda name: archive.read(name))
+            first = infos[selected[0]]
+            fmt = DISK_FORMATS[disk_extension(first.filename)]
+            if len(selected) == 1 and fmt and first.compress_type == zipfile.ZIP_STORED and not first.flag_bits & 0x1:
+                # Data starts after the local header, whose name/extra lengths may differ from the central directory
+                with open(archive_path, 'rb') as f:
+                    f.seek(first.header_offset)
+                    name_len, extra_len = struct.unpack('<HH', f.read(30)[26:30])
+                return DiskSource(archive_path, fmt, first.header_offset + 30 + name_len + extra_len, first.file_size)
+
+            for name in selected:
+                self._copy_member(archive.open(infos[name]), self._member_target(extract_dir, name))
+        return DiskSource(self._member_target(extract_dir, selected[0]), fmt, root=extract_dir)
+
+    def _extract_tar(self, archive_path: Path, extract_dir: Path) -> DiskSource:
+        try:
+            archive = tarfile.open(archive_path, 'r:')
+        except tarfile.ReadError:
+            return self._extract_tar_stream(archive_path, extract_dir)
+
+        # Uncompressed (OVA): the index is just headers, members can be read in place
+        with archive:
+            infos = {m.name: m for m in archive.getmembers() if m.isfile() and not self._is_junk(m.name)}
+            selected = self._select_disk({name: m.size for name, m in infos.items()},
+                                         lambda name: archive.extractfile(infos[name]).read())
+            first = infos[selected[0]]
+            fmt = DISK_FORMATS[disk_extension(first.name)]
+            if len(selected) == 1 and fmt and not first.issparse():
+                return DiskSource(archive_path, fmt, first.offset_data, first.size)
+
+            for name in selected:
+                self._copy_member(archive.extractfile(infos[name]), self._member_target(extract_dir, name))
+        return DiskSource(self._member_target(extract_dir, selected[0]), fmt, root=extract_dir)
+
+    def _extract_tar_stream(self, archive_path: Path, extract_dir: Path) -> DiskSource:
+        """Compressed tar: one sequential pass writing disk members only, then keep the chosen disk"""
+        members: Dict[str, int] = {}
+        with tarfile.open(archive_path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and not self._is_junk(member.name) and disk_extension(member.name):
+                    self._copy_member(archive.extractfile(member), self._member_target(extract_dir, member.name))
+                    members[member.name] = member.size
+
+        def read(name):
+            with open(self._member_target(extract_dir, name), 'rb') as f:
+                return f.read(VMDK_DESCRIPTOR_MAX)
+
+        selected = self._select_disk(members, read)
+        for name in set(members) - set(selected):
+            self._member_target(extract_dir, name).unlink()
+        return DiskSource(self._member_target(extract_dir, selected[0]), DISK_FORMATS[disk_extension(selected[0])],
+                          root=extract_dir)
+
+
+@dataclass
+class ConversionResult:
+    """Outcome of one image conversion"""
+    path: Path
+    action: str                 # 'converted' or 'skipped'
+    source_format: str
+    virtual_size: int
+    source_bytes: int
+    seconds: float
+
+    @property
+    def mb_per_s(self) -> float:
+        return round(self.source_bytes / 1e6 / self.seconds, 2) if self.seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'action': self.action,
+            'source_format': self.source_format,
+            'virtual_size': self.virtual_size,
+            'source_bytes': self.source_bytes,
+            'seconds': round(self.seconds, 2),
+            'mb_per_s': self.mb_per_s,
+        }
+
 
 class ImageConverter:
-    """Convert VM images to QCOW2 format"""
+    """
+    Convert VM images to QCOW2 format.
+    The source is probed with `qemu-img info` first: a standalone qcow2 is
+    used as is, anything else goes through `qemu-img convert` with parallel
+    coroutines and zero detection (holes stay holes). Out-of-order writes (-W)
+    are not used: they are only meant for preallocated raw or block-device
+    targets, not a qcow2 file.
 
-    def __init__(self):
+    Downloaded images are untrusted. A backing file or VMDK extent can name
+    any host path, and qemu-img would copy that file into the image sent to
+    Glance. So images with a backing file are rejected, and extents must stay
+    inside the extraction directory. Every read passes -U (no image locks
+    needed) and an explicit format, except for a disk with no known
+    extension, whose format has to be probed once.
+    """
+
+    PROGRESS_RE = re.compile(rb'\((\d+(?:\.\d+)?)/100%\)')
+    LOG_INTERVAL = 5.0
+
+    def __init__(self, coroutines: Optional[int] = None,
+                 progress_callback: Optional[Callable[[str, float], None]] = None):
         self.check_qemu_img()
+        self.coroutines = coroutines or int(os.getenv('VULNHUB_CONVERT_COROUTINES', '16'))
+        self.progress_callback = progress_callback
 
     def check_qemu_img(self):
         """Verify qemu-img is installed"""
@@ -132,26 +804,125 @@ class ImageConverter:
         except (FileNotFoundError, subprocess.CalledProcessError):
             raise RuntimeError("qemu-img not found. Install qemu-utils.")
 
-    def convert_to_qcow2(self, source_path: Path, output_path: Path) -> Path:
-        """Convert image to QCOW2"""
+    def probe(self, source: DiskSource) -> Dict[str, Any]:
+        """`qemu-img info` of the source (format, virtual-size, backing-filename, ...)"""
+        cmd = ['qemu-img', 'info', '--output=json', '-U']
+        if source.fmt and not source.in_place:
+            cmd += ['-f', source.fmt]
+        cmd.append(source.qemu_filename())
         try:
-            logger.info(f"Converting {source_path.name} to QCOW2...")
-            cmd = ['qemu-img', 'convert', '-f', 'auto', '-O', 'qcow2', str(source_path), str(output_path)]
-            subprocess.run(cmd, check=True, capture_output=True)
-            logger.info(f"✓ Conversion complete: {output_path}")
-            return output_path
+            proc = subprocess.run(cmd, check=True, capture_output=True)
         except subprocess.CalledProcessError as e:
-            logger.error(f"Conversion failed: {e.stderr.decode()}")
-            raise RuntimeError(f"Image conversion failed: {e}")
+            raise RuntimeError(f"qemu-img info failed for {source.path.name}: {e.stderr.decode().strip()}")
+        return json.loads(proc.stdout)
+
+    def convert_to_qcow2(self, source, output_path: Path) -> Path:
+        """Convert image (a Path or DiskSource) to QCOW2"""
+        return self.convert(source, output_path).path
+
+    def convert(self, source, output_path: Path) -> ConversionResult:
+        """
+        Produce a standalone QCOW2 for source. The returned path is the source
+        itself when it already is one.
+        """
+        if not isinstance(source, DiskSource):
+            source = DiskSource(Path(source), DISK_FORMATS.get(disk_extension(str(source))))
+        info = self.probe(source)
+        fmt = info['format']
+        self.check_references(source, info)
+        started = time.monotonic()
+
+        if fmt == 'qcow2' and not source.in_place:
+            logger.info(f"✓ {source.path.name} is already a standalone qcow2, skipping conversion")
+            return ConversionResult(source.path, 'skipped', fmt, info['virtual-size'], 0, 0.0)
+
+        logger.info(f"Converting {source.path.name}{' (in place)' if source.in_place else ''} "
+                    f"from {fmt} to QCOW2...")
+        cmd = ['qemu-img', 'convert', '-p', '-U', '-m', str(self.coroutines), '-S', '4k']
+        if not source.in_place:
+            cmd += ['-f', fmt]
+        cmd += ['-O', 'qcow2', source.qemu_filename(), str(output_path)]
+        self._run(cmd, source.path.name)
+        action, path = 'converted', output_path
+
+        # Allocated bytes, so sparse raw sources don't inflate the throughput figure
+        source_bytes = source.size if source.in_place else (info.get('actual-size') or source.nbytes)
+        result = ConversionResult(path, action, fmt, info['virtual-size'], source_bytes, time.monotonic() - started)
+        logger.info(f"✓ Conversion complete: {path} ({result.seconds:.1f}s, {result.mb_per_s} MB/s)")
+        return result
+
+    @staticmethod
+    def _local_path(filename: str) -> Path:
+        """Host file behind a qemu filename, unwrapping `json:` specs (in-place sources)"""
+        if filename.startswith('json:'):
+            spec = json.loads(filename[len('json:'):])
+            while isinstance(spec.get('file'), dict):
+                spec = spec['file']
+            filename = spec.get('filename', '')
+        return Path(filename).resolve()
+
+    def check_references(self, source: DiskSource, info: Dict[str, Any]):
+        """Refuse a disk that reads other host files: backing or external data files, extents outside its root"""
+        name = source.path.name
+        if info.get('backing-filename'):
+            raise RuntimeError(f"Refusing {name}: it has a backing file ({info['backing-filename']})")
+
+        specific = (info.get('format-specific') or {}).get('data') or {}
+        if specific.get('data-file'):
+            raise RuntimeError(f"Refusing {name}: its data is in an external file ({specific['data-file']})")
+
+        root = (source.root or source.path.parent).resolve()
+        own = source.path.resolve()
+        extents = specific.get('extents') or []
+        for extent in extents:
+            try:
+                path = self._local_path(extent.get('filename', ''))
+            except ValueError:
+                raise RuntimeError(f"Refusing {name}: unreadable extent {extent.get('filename')!r}")
+            # An in-place disk is a window into the archive: nothing else may be read
+            if path == own or (not source.in_place and path.is_relative_to(root)):
+                continue
+            raise RuntimeError(f"Refusing {name}: extent {path} is outside {source.path if source.in_place else root}")
+
+    def _run(self, cmd: List[str], label: str):
+        """Run a qemu-img command with -p, turning its progress line into logs/callbacks"""
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = b''
+        last_log = 0.0
+        while True:
+            data = proc.stdout.read1(4096)
+            if not data:
+                break
+            output = (output + data)[-8192:]
+            matches = self.PROGRESS_RE.findall(data)
+            if not matches:
+                continue
+            percent = float(matches[-1])
+            if self.progress_callback:
+                self.progress_callback(label, percent)
+            now = time.monotonic()
+            if now - last_log >= self.LOG_INTERVAL:
+                last_log = now
+                logger.info(f"{label}: {percent:.0f}% converted")
+
+        if proc.wait() != 0:
+            message = self.PROGRESS_RE.sub(b'', output).decode(errors='replace').strip()
+            logger.error(f"Conversion failed: {message}")
+            raise RuntimeError(f"Image conversion failed: {message}")
 
 
 class OpenStackUploader:
-    """Upload images to OpenStack Glance"""
+    """Upload images to OpenStack Glance, skipping images it already has"""
 
-    def __init__(self):
+    def __init__(self, catalog: Optional[ImageCatalog] = None):
         if not openstack:
             raise RuntimeError("openstacksdk required for uploads")
         self.conn = self._init_connection()
+        self.catalog = catalog or ImageCatalog(self.conn)
+        try:
+            self.catalog.refresh()
+        except Exception as e:
+            logger.warning(f"Image catalog sync failed, deduplicating against the cached index: {e}")
 
     def _init_connection(self):
         """Initialize OpenStack connection from environment"""
@@ -164,8 +935,24 @@ class OpenStackUploader:
             identity_api_version='3'
         )
 
-    def upload_image(self, image_path: Path, image_name: str, metadata: Dict[str, Any] = None) -> str:
-        """Upload image to Glance"""
+    def upload_image(self, image_path: Path, image_name: str, metadata: Dict[str, Any] = None,
+                     sha256: Optional[str] = None) -> str:
+        """
+        Upload image to Glance.
+        If the catalog already holds the same source archive (sha256) or the
+        same bytes (size, then md5), that image is re-tagged with metadata and
+        reused instead.
+        """
+        metadata = dict(metadata or {})
+        if checksum_required(sha256):
+            metadata[SHA256_PROPERTY] = sha256.lower()
+
+        existing = self._find_duplicate(image_path, sha256)
+        if existing:
+            logger.info(f"✓ {image_name} already in Glance as {existing['name']} ({existing['id']}), skipping upload")
+            self._retag(existing, metadata)
+            return existing['id']
+
         try:
             logger.info(f"Uploading {image_name} to Glance...")
             with open(image_path, 'rb') as f:
@@ -178,17 +965,47 @@ class OpenStackUploader:
                     **metadata or {}
                 )
             logger.info(f"✓ Upload complete: {image.id}")
+            self.catalog.record(image)
             return image.id
         except Exception as e:
             logger.error(f"Upload failed: {e}")
             raise
 
+    def _find_duplicate(self, image_path: Path, sha256: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Catalog entry with the same content, confirmed to still exist in Glance"""
+        def md5():
+            digest = hashlib.md5()
+            with open(image_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(4 * 1024 * 1024), b''):
+                    digest.update(chunk)
+            return digest.hexdigest()
+
+        self.catalog.reload_if_changed()
+        entry = (self.catalog.find_by_sha256(sha256) if checksum_required(sha256) else None) \
+            or self.catalog.find_by_content(image_path.stat().st_size, md5)
+        if not entry:
+            return None
+        image = self.conn.image.find_image(entry['id'])
+        if image is None or image.status != 'active':
+            self.catalog.forget(entry['id'])
+            return None
+        return entry
+
+    def _retag(self, entry: Dict[str, Any], metadata: Dict[str, Any]):
+        """Bring an existing image's properties in line with the requested metadata"""
+        changed = {k: v for k, v in metadata.items() if entry['properties'].get(k) != v}
+        if changed:
+            logger.info(f"Updating properties of {entry['id']}: {', '.join(sorted(changed))}")
+            self.catalog.record(self.conn.image.update_image(entry['id'], **changed))
+
 
 class VulnHubImporter:
     """Orchestrate full import pipeline: download → convert → upload"""
 
     def __init__(self):
-        self.downloader = VulnHubDownloader()
+        # VULNHUB_CACHE_GB=0 disables the download cache
+        cache_gb = float(os.getenv('VULNHUB_CACHE_GB', '50'))
+        self.downloader = VulnHubDownloader(cache=DownloadCache() if cache_gb > 0 else None)
         self.converter = ImageConverter()
         try:
             self.uploader = OpenStackUploader()
@@ -198,49 +1015,233 @@ class VulnHubImporter:
 
     def import_from_url(self, url: str, image_name: str, sha256: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
         """Download, convert, and upload image"""
+        ctx = self._new_job(url, image_name, sha256, metadata)
         try:
-            # Download
-            archive_path = self.downloader.download(url, sha256)
-
-            # Extract
-            extract_dir = self.downloader.extract_archive(archive_path)
-
-            # Find image file
-            image_file = self._find_image_file(extract_dir)
-            if not image_file:
-                raise RuntimeError(f"No VM image found in {extract_dir}")
-
-            # Convert to QCOW2
-            qcow2_path = extract_dir / f"{image_name}.qcow2"
-            self.converter.convert_to_qcow2(image_file, qcow2_path)
-
-            # Upload
-            result = {
-                'success': False,
-                'image_name': image_name,
-                'local_path': str(qcow2_path),
-                'openstack_image_id': None
-            }
-
-            if self.uploader:
-                image_id = self.uploader.upload_image(qcow2_path, image_name, metadata or {})
-                result['openstack_image_id'] = image_id
-                result['success'] = True
-            else:
-                result['success'] = True
-                logger.info("Local conversion complete (OpenStack upload skipped)")
-
-            return result
+            for name, stage in self.stages():
+                started = time.monotonic()
+                try:
+                    stage(ctx)
+                except Exception:
+                    export_stage(name, time.monotonic() - started, 0, ok=False)
+                    raise
+                export_stage(name, time.monotonic() - started, ctx.get('bytes', 0), ok=True)
+            return ctx['result']
 
         except Exception as e:
             logger.error(f"Import failed: {e}")
             return {'success': False, 'error': str(e), 'image_name': image_name}
+        finally:
+            self._finish_job(ctx)
+
+    def import_many(self, jobs: List[Dict[str, Any]], workers: Dict[str, int] = None,
+                    queue_size: int = 2) -> List[Dict[str, Any]]:
+        """
+        Import many images concurrently through the staged pipeline.
+        jobs: dicts with url, image_name, sha256 and optional metadata.
+        """
+        pipeline = ImportPipeline(self, workers=workers, queue_size=queue_size)
+        results = pipeline.run(jobs)
+        for line in pipeline.report():
+            logger.info(line)
+        return results
+
+    # --- PIPELINE STAGES (each takes and returns the job context) ---
+
+    def stages(self) -> List[tuple]:
+        return [
+            ('download', self._stage_download),
+            ('extract', self._stage_extract),
+            ('convert', self._stage_convert),
+            ('upload', self._stage_upload),
+        ]
+
+    def _new_job(self, url: str, image_name: str, sha256: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        return {
+            'url': url,
+            'image_name': image_name,
+            'sha256': sha256,
+            'metadata': metadata or {},
+            'bytes': 0
+        }
+
+    def _finish_job(self, ctx: Dict[str, Any]):
+        """
+        Remove the job's work directory (archive, extracted disk, qcow2) and
+        unpin its cached archive, whether it succeeded or not.
+        """
+        work_dir = ctx.pop('work_dir', None)
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        cached = ctx.pop('cached', None)
+        if cached:
+            self.downloader.cache.release(cached)
+
+    def _stage_download(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+        # Every job works in its own directory: archives with the same file name never collide
+        ctx['work_dir'] = Path(tempfile.mkdtemp(prefix='job-', dir=self.downloader.temp_dir))
+        # Records the real digest, also for 'SKIP' entries
+        ctx['archive_path'], ctx['sha256'] = self.downloader.fetch(ctx['url'], ctx['sha256'],
+                                                                   dest_dir=ctx['work_dir'])
+        if self.downloader.cache:
+            # Extract, convert and upload may all read the cached archive
+            ctx['cached'] = ctx['sha256']
+        ctx['bytes'] = ctx['archive_path'].stat().st_size
+        return ctx
+
+    def _stage_extract(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+        ctx['disk'] = self.downloader.extract_archive(ctx['archive_path'], dest_dir=ctx['work_dir'])
+        ctx['bytes'] = ctx['disk'].nbytes
+        return ctx
+
+    def _stage_convert(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+        qcow2_path = ctx['work_dir'] / f"{ctx['image_name']}.qcow2"
+        conversion = self.converter.convert(ctx['disk'], qcow2_path)
+        ctx['qcow2_path'] = conversion.path
+        ctx['conversion'] = conversion.to_dict()
+        ctx['bytes'] = conversion.source_bytes
+        return ctx
+
+    def _stage_upload(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+        result = {
+            'success': False,
+            'image_name': ctx['image_name'],
+            'local_path': str(ctx['qcow2_path']),
+            'openstack_image_id': None,
+            'conversion': ctx.get('conversion')
+        }
+
+        if self.uploader:
+            image_id = self.uploader.upload_image(ctx['qcow2_path'], ctx['image_name'], ctx['metadata'],
+                                                  sha256=ctx['sha256'])
+            result['openstack_image_id'] = image_id
+            result['success'] = True
+        else:
+            # Nothing else will keep the image: move it out of the job directory before it is removed
+            if ctx['work_dir'] in Path(ctx['qcow2_path']).parents:
+                local_path = self.downloader.temp_dir / f"{ctx['image_name']}.qcow2"
+                shutil.move(str(ctx['qcow2_path']), str(local_path))
+                result['local_path'] = str(local_path)
+            result['success'] = True
+            logger.info("Local conversion complete (OpenStack upload skipped)")
+
+        ctx['result'] = result
+        return ctx
+
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one pipeline stage"""
+    name: str
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    bytes: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float, nbytes: int, ok: bool):
+        export_stage(self.name, seconds, nbytes, ok)
+        with self.lock:
+            self.busy_seconds += seconds
+            if ok:
+                self.processed += 1
+                self.bytes += nbytes
+            else:
+                self.failed += 1
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'mb_per_s': round(self.bytes / 1e6 / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            'utilization': round(self.busy_seconds / (wall_seconds * self.workers), 2) if wall_seconds else 0.0,
+        }
+
+
+class ImportPipeline:
+    """
+    download -> extract -> convert -> upload, run concurrently across images.
+
+    Every stage has its own worker threads and a bounded input queue: a full
+    queue blocks the previous stage (backpressure). Each image's files live in
+    its own work directory, removed as soon as it is uploaded or fails, so at
+    most the images in flight sit on disk at once. A failing image is recorded
+    and dropped without stalling the other images.
+    """
+
+    DEFAULT_WORKERS = {'download': 3, 'extract': 2, 'convert': 2, 'upload': 2}
+    _STOP = object()
+
+    def __init__(self, importer: 'VulnHubImporter', workers: Dict[str, int] = None, queue_size: int = 2):
+        workers = {**self.DEFAULT_WORKERS, **(workers or {})}
+        self.queue_size = queue_size
+        self.stages: List[tuple] = importer.stages()
+        self.new_job = importer._new_job
+        self.finish_job = importer._finish_job
+        self.stats = {name: StageStats(name, workers[name]) for name, _ in self.stages}
+        self.wall_seconds = 0.0
+
+    def run(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results: Dict[int, Dict[str, Any]] = {}
+        results_lock = threading.Lock()
+
+        def worker(index: int, name: str, fn: Callable):
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            while True:
+                ctx = inbox.get()
+                if ctx is self._STOP:
+                    return
+                started = time.monotonic()
+                try:
+                    fn(ctx)
+                except Exception as e:
+                    self.stats[name].record(time.monotonic() - started, 0, ok=False)
+                    logger.error(f"[{ctx['image_name']}] {name} failed: {e}")
+                    self.finish_job(ctx)
+                    with results_lock:
+                        results[ctx['seq']] = {'success': False, 'error': f"{name}: {e}", 'image_name': ctx['image_name']}
+                    continue
+                self.stats[name].record(time.monotonic() - started, ctx.get('bytes', 0), ok=True)
+                if outbox is not None:
+                    outbox.put(ctx)  # blocks while the next stage is saturated
+                else:
+                    self.finish_job(ctx)
+                    with results_lock:
+                        results[ctx['seq']] = ctx['result']
+
+        started = time.monotonic()
+        pools = []
+        for index, (name, fn) in enumerate(self.stages):
+            threads = [threading.Thread(target=worker, args=(index, name, fn), name=f"import-{name}-{n}", daemon=True)
+                       for n in range(self.stats[name].workers)]
+            for t in threads:
+                t.start()
+            pools.append(threads)
+
+        for seq, job in enumerate(jobs):
+            ctx = self.new_job(job['url'], job['image_name'], job.get('sha256', 'SKIP'), job.get('metadata'))
+            ctx['seq'] = seq
+            queues[0].put(ctx)
+
+        # Drain stage by stage: a stage only stops once everything upstream has finished
+        for index, threads in enumerate(pools):
+            for _ in threads:
+                queues[index].put(self._STOP)
+            for t in threads:
+                t.join()
+
+        self.wall_seconds = time.monotonic() - started
+        return [results[seq] for seq in range(len(jobs))]
 
-    def _find_image_file(self, directory: Path) -> Optional[Path]:
-        """Find first VM image file in directory"""
-        image_extensions = ['.vmdk', '.qcow2', '.vdi', '.img', '.raw']
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if any(file.endswith(ext) for ext in image_extensions):
-                    return Path(root) / file
-        return None
+    def report(self) -> List[str]:
+        lines = [f"Pipeline finished in {self.wall_seconds:.1f}s"]
+        for stats in self.stats.values():
+            s = stats.to_dict(self.wall_seconds)
+            lines.append(f"  {s['stage']:<9} workers={s['workers']} ok={s['processed']} failed={s['failed']} "
+                         f"{s['mb_per_s']} MB/s utilization={s['utilization']:.0%}")
+        return lines
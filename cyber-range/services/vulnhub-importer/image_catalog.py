@@ -0,0 +1,186 @@
+"""
+Image Catalog - Local index of the Glance image catalog
+Persists every image's checksum, size and properties to a JSON file that is
+refreshed incrementally (only images updated since the last sync; a periodic
+full listing also drops deleted ones). Uploads use it to skip images Glance
+already has, and scenarios look up images by difficulty in O(1) instead of
+listing Glance on every call.
+
+Shared with vulnhub-importer, which keeps a copy of this file (the two
+services are built from separate Docker contexts): change both together.
+It only depends on an openstacksdk connection passed in by the caller.
+"""
+import logging
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Glance properties set by vulnhub-importer/auto_catalog.py
+CATALOG_PROPERTY = "cyber_range_image"
+DIFFICULTY_PROPERTY = "vulnhub_difficulty"
+SHA256_PROPERTY = "vulnhub_sha256"      # sha256 of the source archive
+
+DEFAULT_INDEX_PATH = os.getenv("IMAGE_CATALOG_PATH",
+                               str(Path.home() / ".cache" / "cyberguard" / "glance-index.json"))
+FULL_SYNC_SECONDS = int(os.getenv("IMAGE_CATALOG_FULL_SYNC", "3600"))
+
+GONE_STATUSES = {"deleted", "pending_delete", "killed"}
+
+
+class ImageCatalog:
+    """Glance images indexed by id, source sha256, size and difficulty"""
+
+    def __init__(self, conn=None, path: str = DEFAULT_INDEX_PATH, full_sync_seconds: int = FULL_SYNC_SECONDS):
+        self.conn = conn
+        self.path = Path(path)
+        self.full_sync_seconds = full_sync_seconds
+        self._lock = threading.RLock()
+        self._images: Dict[str, dict] = {}
+        self._synced_at = None          # Newest Glance updated_at seen (ISO 8601)
+        self._full_synced = 0.0
+        self._mtime = None
+        self.version = 0                # Bumped whenever the lookup maps are rebuilt
+        self._load()
+
+    # --- PERSISTENCE ---
+
+    def _load(self):
+        try:
+            mtime = self.path.stat().st_mtime
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            data, mtime = {}, None
+        with self._lock:
+            self._images = data.get("images", {})
+            self._synced_at = data.get("synced_at")
+            self._full_synced = data.get("full_synced", 0.0)
+            self._mtime = mtime
+            self._reindex()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps({
+            "synced_at": self._synced_at,
+            "full_synced": self._full_synced,
+            "images": self._images,
+        }))
+        os.replace(tmp, self.path)
+        self._mtime = self.path.stat().st_mtime
+
+    def reload_if_changed(self) -> bool:
+        """Pick up an index written by another process (one stat() when unchanged)"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._load()
+        return True
+
+    def _reindex(self):
+        by_sha256, by_size, by_difficulty = {}, {}, {}
+        for image_id, entry in self._images.items():
+            if entry["status"] != "active":
+                continue
+            props = entry["properties"]
+            if props.get(SHA256_PROPERTY):
+                # Lookups lowercase the digest; images tagged by hand may use uppercase hex
+                by_sha256[str(props[SHA256_PROPERTY]).lower()] = image_id
+            if entry.get("size"):
+                by_size.setdefault(entry["size"], []).append(image_id)
+            if str(props.get(CATALOG_PROPERTY, "")).lower() == "true" and props.get(DIFFICULTY_PROPERTY):
+                by_difficulty.setdefault(props[DIFFICULTY_PROPERTY], []).append(image_id)
+        self._by_sha256 = by_sha256
+        self._by_size = by_size
+        self._by_difficulty = {d: tuple(sorted(ids)) for d, ids in by_difficulty.items()}
+        self.version += 1
+
+    # --- SYNC ---
+
+    @staticmethod
+    def _entry(image) -> dict:
+        return {
+            "name": image.name,
+            "status": image.status,
+            "size": image.size,
+            "checksum": image.checksum,
+            "updated_at": image.updated_at,
+            "properties": dict(image.properties or {}),
+        }
+
+    def refresh(self, full: bool = False) -> int:
+        """Pull images changed since the last sync from Glance. Returns how many were fetched."""
+        if self.conn is None:
+            raise RuntimeError("ImageCatalog.refresh needs an OpenStack connection")
+
+        full = full or not self._synced_at or time.time() - self._full_synced > self.full_sync_seconds
+        query = {} if full else {"updated_at": f"gte:{self._synced_at}"}
+        fetched = {image.id: self._entry(image) for image in self.conn.image.images(**query)}
+
+        with self._lock:
+            if full:
+                self._images = fetched
+                self._full_synced = time.time()
+            else:
+                self._images.update(fetched)
+            for image_id in [i for i, e in self._images.items() if e["status"] in GONE_STATUSES]:
+                del self._images[image_id]
+            stamps = [e["updated_at"] for e in fetched.values() if e["updated_at"]]
+            if stamps:
+                self._synced_at = max([self._synced_at or ""] + stamps)
+            self._reindex()
+            self._save()
+
+        logger.info(f"Image catalog {'full' if full else 'incremental'} sync: {len(fetched)} image(s), "
+                    f"{len(self._images)} indexed")
+        return len(fetched)
+
+    def record(self, image):
+        """Add or update one image (e.g. right after an upload) without a Glance listing"""
+        with self._lock:
+            self._images[image.id] = self._entry(image)
+            self._reindex()
+            self._save()
+
+    def forget(self, image_id: str):
+        with self._lock:
+            if self._images.pop(image_id, None) is not None:
+                self._reindex()
+                self._save()
+
+    # --- LOOKUPS ---
+
+    def get(self, image_id: str) -> Optional[dict]:
+        entry = self._images.get(image_id)
+        return {"id": image_id, **entry} if entry else None
+
+    def find_by_sha256(self, sha256: str) -> Optional[dict]:
+        """Active image imported from the archive with this sha256"""
+        image_id = self._by_sha256.get(sha256.lower())
+        return self.get(image_id) if image_id else None
+
+    def find_by_content(self, size: int, md5: Callable[[], str]) -> Optional[dict]:
+        """Active image with identical bytes; md5() is only called when some image has the same size"""
+        candidates = self._by_size.get(size)
+        if not candidates:
+            return None
+        digest = md5()
+        for image_id in candidates:
+            if self._images[image_id]["checksum"] == digest:
+                return self.get(image_id)
+        return None
+
+    def by_difficulty(self, difficulty: str) -> tuple:
+        """Ids of active cyber range images tagged with this difficulty"""
+        return self._by_difficulty.get(difficulty, ())
+
+    def difficulties(self) -> List[str]:
+        return sorted(self._by_difficulty)
@@ -1,36 +1,47 @@
 import os
 import requests
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+
+from backend import OrchestratorClient
 
 app = Flask(__name__)
-app.secret_key = "cyber-range-secret"
-API_URL = os.getenv("ORCHESTRATOR_URL", "http://localhost:8000")
+# Must be identical across workers so flash cookies survive a multi-worker server
+app.secret_key = os.getenv("SECRET_KEY", "cyber-range-secret")
+backend = OrchestratorClient()
+
+# The lobby only renders live labs and these columns
+LOBBY_QUERY = {
+    "fields": "id,user_id,status,scenario",
+    "status": "queued,pending,deploying,active,failed,destroying,error_destroying",
+    "limit": 100,
+}
 
 @app.route('/')
 def lobby():
     """Lobby: List all active scenarios"""
     try:
         # Calls the Correct Endpoint /deployments
-        resp = requests.get(f"{API_URL}/deployments", timeout=5)
-        deployments = resp.json() if resp.status_code == 200 else {}
+        status_code, body = backend.list_deployments(LOBBY_QUERY)
+        deployments = body if status_code == 200 else {}
+        status_code, body = backend.list_scenarios()
+        scenarios = body["scenarios"] if status_code == 200 else []
     except:
         deployments = {}
+        scenarios = []
         flash("Backend Offline", "danger")
         
-    return render_template('lobby.html', deployments=deployments)
+    return render_template('lobby.html', deployments=deployments, scenarios=scenarios)
 
 @app.route('/dashboard/<instance_id>')
 def dashboard(instance_id):
     """Specific Mission Control for one lab"""
     try:
-        resp = requests.get(f"{API_URL}/status/{instance_id}", timeout=5)
+        status_code, data = backend.get_status(instance_id)
         
-        if resp.status_code != 200:
+        if status_code != 200:
             flash(f"Instance {instance_id} not found.", "warning")
             return redirect(url_for('lobby'))
         
-        data = resp.json()
-        
         # Passes Dict to template (Fixed "str object" error)
         return render_template('dashboard.html', 
                              instance_id=instance_id,
@@ -48,10 +59,7 @@ def create_lab():
     
     # Calls Correct Endpoint /deploy with Correct Keys
     try:
-        requests.post(f"{API_URL}/deploy", json={
-            "scenario": scenario, 
-            "instance_id": instance_id
-        }, timeout=5)
+        backend.deploy(scenario, instance_id)
     except Exception as e:
         flash(f"Deploy failed: {e}", "danger")
 
@@ -59,16 +67,46 @@ def create_lab():
 
 @app.route('/api/destroy/<instance_id>', methods=['POST'])
 def destroy_lab(instance_id):
-    requests.delete(f"{API_URL}/destroy/{instance_id}")
+    try:
+        resp = backend.destroy(instance_id)
+    except requests.RequestException:
+        return jsonify({"status": "offline"}), 502
+    if resp.status_code != 200:
+        return jsonify({"status": "error"}), resp.status_code
     return jsonify({"status": "ok"})
 
 @app.route('/api/poll/<instance_id>')
 def poll_status(instance_id):
     try:
-        resp = requests.get(f"{API_URL}/status/{instance_id}", timeout=5)
-        return jsonify(resp.json())
+        status_code, data = backend.get_status(instance_id)
+        return jsonify(data if status_code == 200 else {"status": "unknown"})
     except:
         return jsonify({"status": "offline"})
 
+@app.route('/api/events/<instance_id>')
+def stream_events(instance_id):
+    """Relay the orchestrator's Server-Sent Events stream to the browser"""
+    try:
+        upstream = backend.stream_events(instance_id)
+    except requests.RequestException:
+        return jsonify({"status": "offline"}), 502
+
+    if upstream.status_code != 200:
+        upstream.close()
+        return jsonify({"status": "unknown"}), upstream.status_code
+
+    def relay():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        except requests.RequestException:
+            pass
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(relay()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Orchestrator API client for the web UI
+One pooled keep-alive session per worker process, default timeouts on every
+call, and a short-TTL cache for the lobby listing and status reads that is
+invalidated explicitly on create/destroy.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.getenv("ORCHESTRATOR_URL", "http://localhost:8000")
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "32"))
+CACHE_TTL = float(os.getenv("BACKEND_CACHE_TTL", "2"))
+TIMEOUT = (3.05, 10)  # (connect, read)
+
+
+class OrchestratorClient:
+    def __init__(self, base_url: str = API_URL, cache_ttl: float = CACHE_TTL):
+        self.base_url = base_url.rstrip("/")
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+        self.session = requests.Session()
+        # Retry idempotent reads on connection hiccups only; never retry POST/DELETE
+        retry = Retry(total=2, connect=2, read=0, backoff_factor=0.1,
+                      allowed_methods=frozenset(["GET"]))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # --- CACHE ---
+
+    def _cached_get(self, path: str, params: dict = None):
+        """GET returning (status_code, json); successful bodies are cached for cache_ttl seconds"""
+        key = (path, tuple(sorted((params or {}).items())))
+        now = time.monotonic()
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] > now:
+                return hit[1], hit[2]
+
+        resp = self.session.get(f"{self.base_url}{path}", params=params, timeout=TIMEOUT)
+        body = resp.json() if resp.status_code == 200 else None
+        if resp.status_code == 200 and self.cache_ttl > 0:
+            with self._cache_lock:
+                self._cache[key] = (now + self.cache_ttl, resp.status_code, body)
+        return resp.status_code, body
+
+    def invalidate(self, instance_id: str = None):
+        """Drop cached listings (and the status of one lab, if given)"""
+        with self._cache_lock:
+            for key in list(self._cache):
+                path = key[0]
+                if path == "/deployments" or (instance_id and path == f"/status/{instance_id}"):
+                    del self._cache[key]
+
+    # --- API ---
+
+    def list_deployments(self, params: dict = None):
+        return self._cached_get("/deployments", params)
+
+    def list_scenarios(self):
+        return self._cached_get("/scenarios")
+
+    def get_status(self, instance_id: str):
+        return self._cached_get(f"/status/{instance_id}")
+
+    def deploy(self, scenario: str, instance_id: str):
+        resp = self.session.post(f"{self.base_url}/deploy", json={
+            "scenario": scenario,
+            "instance_id": instance_id
+        }, timeout=TIMEOUT)
+        self.invalidate()
+        return resp
+
+    def destroy(self, instance_id: str):
+        resp = self.session.delete(f"{self.base_url}/destroy/{instance_id}", timeout=TIMEOUT)
+        self.invalidate(instance_id)
+        return resp
+
+    def stream_events(self, instance_id: str):
+        # Read timeout must exceed the orchestrator keepalive interval (15s)
+        return self.session.get(f"{self.base_url}/events/{instance_id}", stream=True, timeout=(3.05, 60))
@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for the web UI (production server)
+Threaded workers: each SSE dashboard keeps one thread busy while it streams,
+so size WEBUI_THREADS for the number of concurrently open dashboards.
+"""
+import multiprocessing
+import os
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = "app:app"
+
+bind = os.getenv("WEBUI_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEBUI_WORKERS", str(min(4, multiprocessing.cpu_count() * 2))))
+worker_class = "gthread"
+threads = int(os.getenv("WEBUI_THREADS", "32"))
+
+# SSE relays stay open indefinitely; only kill workers that are truly stuck
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
@@ -1,43 +1,8 @@
 // Global Graph Instance
 let cy = null;
-let pollInterval = null;
 
-document.addEventListener('DOMContentLoaded', function() {
-    // 1. Check if we are on a specific dashboard page (by checking for the graph container)
-    const graphContainer = document.getElementById('cy');
-    
-    if (graphContainer) {
-        // We are on /dashboard/<instance_id>
-        const instanceId = document.body.getAttribute('data-instance-id');
-        
-        if (instanceId) {
-            console.log("Starting polling for instance:", instanceId);
-            startPolling(instanceId);
-            
-            // Initial Render if data exists (LAB_DATA is injected by Jinja2 in dashboard.html)
-            if (typeof LAB_DATA !== 'undefined' && LAB_DATA) {
-                renderTopology(LAB_DATA);
-            }
-        }
-    }
-});
-
-function startPolling(instanceId) {
-    // Poll every 5 seconds
-    pollInterval = setInterval(() => {
-        fetch(`/api/poll/${instanceId}`)
-            .then(response => response.json())
-            .then(data => {
-                updateStatusUI(data);
-
-                // If instance becomes active but graph is empty (e.g. page refresh), reload to draw it
-                if (!cy && data.status === 'active') {
-                    window.location.reload(); 
-                }
-            })
-            .catch(err => console.log("Poll error:", err));
-    }, 5000);
-}
+// Live status on /dashboard/<instance_id> comes from the page's own SSE client
+// (templates/dashboard.html); this file only holds shared helpers.
 
 function updateStatusUI(data) {
     const badge = document.getElementById('nav-status-badge');